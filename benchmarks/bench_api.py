@@ -0,0 +1,25 @@
+"""
+Macro benchmarks: Flask apps driven through the test client at fixed concurrency
+"""
+
+from flask import Flask
+
+def collect():
+    """(name, app, method, path) tuples for harness.macro()"""
+    import main
+    import main_enhanced
+    from src.routes.crypto_api import crypto_api_bp
+
+    prices_app = Flask('bench_prices')
+    prices_app.register_blueprint(crypto_api_bp, url_prefix='/api')
+
+    return [
+        ('api.classic.dashboard', main.app, 'GET', '/api/dashboard'),
+        ('api.classic.bots', main.app, 'GET', '/api/bots'),
+        ('api.enhanced.health', main_enhanced.app, 'GET', '/api/health'),
+        ('api.enhanced.bots_status', main_enhanced.app, 'GET', '/api/bots/status'),
+        ('api.enhanced.bot_performance', main_enhanced.app, 'GET', '/api/bot/1/performance'),
+        ('api.enhanced.trading_history', main_enhanced.app, 'GET', '/api/trading/history'),
+        ('api.enhanced.metrics', main_enhanced.app, 'GET', '/metrics'),
+        ('api.prices.current', prices_app, 'GET', '/api/prices/current'),
+    ]
@@ -0,0 +1,203 @@
+"""
+Microbenchmarks for the trading engine hot paths
+"""
+
+import json
+import logging
+import random
+from datetime import datetime, timedelta
+
+def _quiet_imports():
+    """Import the entry points with their engines paused and logging muted"""
+    import main
+    import main_enhanced
+    from src.routes import crypto_api
+
+    main_enhanced.trading_active = False
+    logging.getLogger().setLevel(logging.WARNING)
+    return main, main_enhanced, crypto_api
+
+def _full_history_bot(main_enhanced):
+    """An enhanced TradingBot whose history is at its 100-trade cap"""
+    bot = main_enhanced.TradingBot(99, 'Bench Bot', 'alpha_trader', 5000)
+    now = datetime.now()
+    for i in range(100):
+        bot.performance_history.append({
+            'timestamp': (now - timedelta(minutes=20 * i)).isoformat(),
+            'profit': round(random.uniform(-2, 3), 2),
+            'balance': 5000 + i,
+            'symbol': random.choice(['BTC', 'ETH', 'BNB'])
+        })
+    return bot
+
+def _depth_feed(levels=1000, updates=50000, mid=2500.0, tick=0.01):
+    """A snapshot of ``levels`` per side and a replayable diff-depth feed around ``mid``.
+
+    Each delta touches three levels near the touch, a third of them removals,
+    like a busy exchange feed.
+    """
+    rng = random.Random(42)
+    bids = [(round(mid - tick * (i + 1), 2), rng.uniform(0.1, 20)) for i in range(levels)]
+    asks = [(round(mid + tick * (i + 1), 2), rng.uniform(0.1, 20)) for i in range(levels)]
+    deltas = []
+    for update_id in range(2, updates + 2):
+        side_bids, side_asks = [], []
+        for _ in range(3):
+            offset = tick * (int(rng.expovariate(0.05)) + 1)
+            size = 0.0 if rng.random() < 0.33 else rng.uniform(0.1, 20)
+            if rng.random() < 0.5:
+                side_bids.append((round(mid - offset, 2), size))
+            else:
+                side_asks.append((round(mid + offset, 2), size))
+        deltas.append((side_bids, side_asks, update_id, update_id))
+    return (bids, asks, 1), deltas
+
+def _order_book_replay(book, snapshot, deltas):
+    """One delta per call, reloading the snapshot when the feed wraps around"""
+    state = {'i': len(deltas)}
+
+    def step():
+        i = state['i']
+        if i == len(deltas):
+            book.apply_snapshot(*snapshot)
+            i = 0
+        book.apply_delta(*deltas[i])
+        state['i'] = i + 1
+    return step
+
+def _order_book_queries(book):
+    """What the market-maker strategy asks a book every tick"""
+    def query():
+        book.spread_bps()
+        book.imbalance(5)
+        book.microprice()
+        book.volume_within(10)
+    return query
+
+def _arbitrage_graph(assets=100, venues=('binance', 'coingecko', 'kraken')):
+    """A scanner with every asset quoted against USD on every venue (300 pairs)"""
+    from src.services.arbitrage import ArbitrageScanner
+
+    rng = random.Random(7)
+    scanner = ArbitrageScanner({venue: 0.001 for venue in venues})
+    for i in range(assets):
+        for venue in venues:
+            price = (100 + i) * (1 + rng.gauss(0, 0.001))
+            scanner.update_quote(venue, f'C{i}', 'USD', price * 0.9999, price * 1.0001)
+    scanner.opportunities()  # enumerate the short cycles once
+
+    def requote():
+        i = rng.randrange(assets)
+        price = (100 + i) * (1 + rng.gauss(0, 0.001))
+        scanner.update_quote(rng.choice(venues), f'C{i}', 'USD', price * 0.9999, price * 1.0001)
+    return scanner, requote
+
+def _price_history(points=1000, step_seconds=10):
+    """EnhancedCryptoProvider-style history of correlated random-walk prices"""
+    rng = random.Random(11)
+    prices = {'btc': 45000.0, 'eth': 2800.0, 'bnb': 350.0}
+    start = datetime.now() - timedelta(seconds=points * step_seconds)
+    history = []
+    for i in range(points):
+        market = rng.gauss(0, 0.001)
+        for symbol in prices:
+            prices[symbol] *= 1 + market + rng.gauss(0, 0.0007)
+        history.append({
+            'timestamp': (start + timedelta(seconds=i * step_seconds)).isoformat(),
+            'prices': {symbol: {'price': price} for symbol, price in prices.items()}
+        })
+    return history
+
+def _chart_series(points=8760, step_seconds=3600):
+    """A year of hourly /prices/historical records as CoinGecko returns them"""
+    rng = random.Random(13)
+    price = 45000.0
+    start = datetime.now() - timedelta(seconds=points * step_seconds)
+    records = []
+    for i in range(points):
+        price *= 1 + rng.gauss(0, 0.004)
+        moment = start + timedelta(seconds=i * step_seconds)
+        records.append({
+            'timestamp': moment.timestamp() * 1000,
+            'price': price,
+            'volume': rng.uniform(1e9, 5e10),
+            'date': moment.strftime('%Y-%m-%d %H:%M')
+        })
+    return records
+
+def _risk_recompute(engine, history, holdings):
+    """A report on every call: the cache is invalidated as a new price tick would"""
+    def compute():
+        engine._cached_key = None
+        return engine.report(history, holdings)
+    return compute
+
+def collect():
+    """(name, callable) pairs for harness.micro()"""
+    main, main_enhanced, crypto_api = _quiet_imports()
+
+    market_prices = main_enhanced.crypto_provider.get_current_prices()  # offline: simulated fallback
+    enhanced_bot = main_enhanced.TradingBot(98, 'Bench Trader', 'alpha_trader', 5000)
+    history_bot = _full_history_bot(main_enhanced)
+    classic_bot = main.TradingBot('bench', 'Bench', 'high_frequency', 5000.0)
+    classic_market = main.get_market_data()
+    signal_prices = [67000 * (1 + 0.01 * random.uniform(-1, 1)) for _ in range(20)]
+    statuses = [bot.get_status() for bot in main_enhanced.trading_bots]
+    dashboard_payload = main.build_dashboard_payload(classic_market)
+
+    from src.services.downsample import lttb, minmax
+    from src.services.order_book import OrderBook
+    from src.services.risk import RiskEngine
+    from src.services.rng import SimulationRNG
+    from src.services.serialized import packet_json
+    from src.services.snapshots import encode
+    from src.services.static_assets import compress
+
+    rng = SimulationRNG(1).stream('bench')
+    arbitrage, requote = _arbitrage_graph()
+    snapshot, deltas = _depth_feed()
+    replay_book = OrderBook('bench')
+    query_book = OrderBook('bench')
+    query_book.apply_snapshot(*snapshot)
+    risk = RiskEngine(paths=200000, generator=SimulationRNG(1).generator('bench:risk'))
+    risk_history = _price_history()
+    holdings = main_enhanced.portfolio_holdings()
+    chart = _chart_series()
+    chart_x = [p['timestamp'] for p in chart]
+    chart_y = [p['price'] for p in chart]
+    chart_500 = [chart[i] for i in lttb(chart_x, chart_y, 500)]
+
+    return [
+        ('enhanced.execute_trade', lambda: enhanced_bot.execute_trade(market_prices)),
+        ('enhanced.get_status', history_bot.get_status),
+        ('enhanced._get_24h_performance', history_bot._get_24h_performance),
+        ('classic.execute_trade', lambda: classic_bot.execute_trade(classic_market)),
+        ('classic.get_market_data', main.get_market_data),
+        ('crypto_api.compute_trading_signals', lambda: crypto_api.compute_trading_signals(signal_prices)),
+        ('serialize.bots_status_json', lambda: json.dumps(statuses)),
+        ('serialize.bots_update_packet', lambda: packet_json.dumps(['bots_update', statuses], separators=(',', ':'))),
+        ('serialize.dashboard_payload_json', lambda: json.dumps(dashboard_payload, separators=(',', ':'))),
+        ('serialize.dashboard_snapshot_publish', lambda: main.dashboard.publish(classic_market)),
+        ('order_book.apply_delta', _order_book_replay(replay_book, snapshot, deltas)),
+        ('order_book.strategy_queries', _order_book_queries(query_book)),
+        ('order_book.depth_20', lambda: query_book.depth(20)),
+        ('rng.stdlib_uniform', lambda: random.uniform(0.5, 1.8)),
+        ('rng.stream_uniform', lambda: rng.uniform(0.5, 1.8)),
+        ('rng.stream_sampler', rng.sampler(0.5, 1.8)),
+        ('rng.stdlib_randint', lambda: random.randint(1000000, 5000000)),
+        ('rng.stream_randint', lambda: rng.randint(1000000, 5000000)),
+        ('rng.stdlib_choice', lambda: random.choice(('BTC', 'ETH', 'BNB'))),
+        ('rng.stream_choice', lambda: rng.choice(('BTC', 'ETH', 'BNB'))),
+        ('arbitrage.update_quote', requote),
+        ('arbitrage.opportunities', arbitrage.opportunities),
+        ('arbitrage.bellman_ford_scan', arbitrage.scan),
+        ('risk.report_200k_paths', _risk_recompute(risk, risk_history, holdings)),
+        ('risk.report_cached', lambda: risk.report(risk_history, holdings)),
+        ('downsample.lttb_8760_to_500', lambda: lttb(chart_x, chart_y, 500)),
+        ('downsample.minmax_8760_to_500', lambda: minmax(chart_y, 500)),
+        ('serialize.history_8760_json', lambda: json.dumps(chart)),
+        ('serialize.history_500_json', lambda: json.dumps(chart_500)),
+        ('serialize.history_500_gzip', lambda: compress(json.dumps(chart_500).encode(), 'gzip')),
+        ('snapshot.capture_enhanced', main_enhanced.capture_state),
+        ('snapshot.encode_enhanced', lambda: encode(main_enhanced.capture_state())),
+    ]
@@ -0,0 +1,174 @@
+"""
+Benchmark harness: timing loops, offline mode and baseline comparison
+
+Microbenchmarks time a zero-argument callable in calibrated batches and
+report per-call nanoseconds. Macro benchmarks drive a Flask app through its
+test client from a fixed number of worker threads and report latency
+percentiles and throughput. Results are plain dicts so they can be dumped
+to JSON and compared against a saved baseline.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(REPO_ROOT, 'src')
+
+# Entry points are imported as top-level modules (main, main_enhanced), the
+# shared code as the src package, exactly as when they are started as scripts
+for path in (REPO_ROOT, SRC_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Benchmark runs neither resume from nor overwrite the app's saved engine state
+os.environ.setdefault('SNAPSHOT_DIR', tempfile.mkdtemp(prefix='bench-state-'))
+
+@contextlib.contextmanager
+def offline():
+    """Fail every outgoing HTTP request immediately and swallow stdout chatter.
+
+    Providers then take their fallback paths, so runs are deterministic in
+    shape and never wait on the network.
+    """
+    import requests
+
+    def refuse(self, method, url, *args, **kwargs):
+        raise requests.ConnectionError(f'offline benchmark run: {method} {url}')
+
+    original = requests.sessions.Session.request
+    requests.sessions.Session.request = refuse
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        requests.sessions.Session.request = original
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def micro(name, fn, min_time=0.2, repeat=5):
+    """Time ``fn()``; each of ``repeat`` rounds runs for roughly ``min_time`` seconds"""
+    fn()  # warm caches and lazy initialisation
+
+    # Calibrate the batch size so one round takes about min_time
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 4 or number >= 1 << 24:
+            break
+        number *= 4
+    number = max(1, int(number * (min_time / max(elapsed, 1e-9))))
+
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - start) / number * 1e9)
+
+    median = statistics.median(per_call)
+    return {
+        'name': name,
+        'kind': 'micro',
+        'iterations': number * repeat,
+        'median_ns': round(median, 1),
+        'min_ns': round(min(per_call), 1),
+        'mean_ns': round(statistics.fmean(per_call), 1),
+        'stdev_ns': round(statistics.stdev(per_call), 1) if len(per_call) > 1 else 0.0,
+        'ops_per_sec': round(1e9 / median, 1) if median else None,
+    }
+
+def macro(name, app, method, path, concurrency=8, requests_per_worker=200, **request_kwargs):
+    """Issue ``concurrency`` x ``requests_per_worker`` requests through test clients"""
+    def worker(_):
+        client = app.test_client()
+        latencies = []
+        errors = 0
+        for _ in range(requests_per_worker):
+            start = time.perf_counter()
+            response = client.open(path, method=method, **request_kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 500:
+                errors += 1
+        return latencies, errors
+
+    app.test_client().open(path, method=method, **request_kwargs)  # warm up
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(l for worker_latencies, _ in results for l in worker_latencies)
+    errors = sum(e for _, e in results)
+    return {
+        'name': name,
+        'kind': 'macro',
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'errors': errors,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else None,
+    }
+
+# Metric compared against the baseline for each kind (lower is better)
+PRIMARY_METRIC = {'micro': 'median_ns', 'macro': 'p50_ms', 'startup': 'import_ms', 'memory': 'rss_mb'}
+
+def compare(results, baseline, threshold=0.10):
+    """Ratio of each result to its baseline entry; ratio > 1 + threshold is a regression"""
+    baseline_by_name = {r['name']: r for r in baseline.get('results', [])}
+    comparisons = []
+    for result in results:
+        previous = baseline_by_name.get(result['name'])
+        metric = PRIMARY_METRIC[result['kind']]
+        if not previous or not previous.get(metric):
+            continue
+        ratio = result[metric] / previous[metric]
+        comparisons.append({
+            'name': result['name'],
+            'metric': metric,
+            'baseline': previous[metric],
+            'current': result[metric],
+            'ratio': round(ratio, 3),
+            'regression': ratio > 1 + threshold,
+            'improvement': ratio < 1 - threshold,
+        })
+    return comparisons
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def write_results(path, results, comparisons=None):
+    payload = {'environment': environment(), 'results': results}
+    if comparisons is not None:
+        payload['comparison'] = comparisons
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    return payload
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
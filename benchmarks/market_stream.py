@@ -0,0 +1,236 @@
+"""
+Streaming market-data ingest benchmark with a local stand-in stream server
+
+Runs a small WebSocket server that speaks Binance's combined 24h-ticker
+stream format (one event per symbol per interval, stamped with the send
+time). It can stall or drop connections on a schedule. A MarketStream
+subscribes to it exactly as the app does, and the report covers:
+
+- event-to-listener latency
+- how old the quotes are when a consumer samples them (a decision)
+- gaps, reconnects and resyncs
+
+For comparison it also gives the staleness of the old 30 s REST polling:
+
+    python -m benchmarks.market_stream --duration 30 --interval 0.1 --stall-every 10 --disconnect-every 12
+
+The stand-in can also feed a running app:
+
+    python -m benchmarks.market_stream serve --port 9443
+    MARKET_STREAM_URL=ws://127.0.0.1:9443/stream python src/main_enhanced.py
+"""
+
+import argparse
+import json
+import random
+import socket
+import socketserver
+import threading
+import time
+
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import AcceptConnection, CloseConnection, Ping, Request, TextMessage
+
+from benchmarks import harness
+from src.services.coins import coin_registry
+from src.services.market_stream import MarketStream, binance_ticker_parser
+
+# ---------------------------------------------------------------- stand-in server
+
+class StandInStreamServer(socketserver.ThreadingTCPServer):
+    """Binance-style combined ticker stream for the tracked coins.
+
+    Every ``interval`` seconds each connection gets one ticker event per
+    coin, with a random-walk price. ``stall_every`` seconds the server goes
+    silent for ``stall_seconds`` (a time gap for the client to spot).
+    ``disconnect_every`` seconds it drops the connection.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port, interval=0.1, stall_every=0, stall_seconds=6, disconnect_every=0):
+        super().__init__(('127.0.0.1', port), _StreamHandler)
+        self.coins = [coin for coin in coin_registry.tracked() if coin.binance_symbol]
+        self.interval = interval
+        self.stall_every = stall_every
+        self.stall_seconds = stall_seconds
+        self.disconnect_every = disconnect_every
+        self.messages_sent = 0
+        self.connections = 0
+
+    @property
+    def url(self):
+        return f'ws://127.0.0.1:{self.server_address[1]}/stream'
+
+class _StreamHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        sock = self.request
+        ws = WSConnection(ConnectionType.SERVER)
+        if not self._handshake(sock, ws):
+            return
+        server.connections += 1
+
+        prices = {coin.symbol: coin.reference_price for coin in server.coins}
+        opened = last_stall = time.time()
+        sock.settimeout(0)
+        try:
+            while True:
+                now = time.time()
+                if server.disconnect_every and now - opened >= server.disconnect_every:
+                    return  # abrupt drop, no close frame
+                if server.stall_every and now - last_stall >= server.stall_every:
+                    time.sleep(server.stall_seconds)
+                    last_stall = time.time()
+                self._answer_pings(sock, ws)
+                for coin in server.coins:
+                    prices[coin.symbol] *= 1 + random.gauss(0, 0.0005)
+                    event = {
+                        'e': '24hrTicker', 'E': int(time.time() * 1000), 's': coin.binance_symbol,
+                        'c': f'{prices[coin.symbol]:.8f}', 'P': '0.00', 'q': '0'
+                    }
+                    message = {'stream': f'{coin.binance_symbol.lower()}@ticker', 'data': event}
+                    sock.sendall(ws.send(TextMessage(data=json.dumps(message))))
+                    server.messages_sent += 1
+                time.sleep(server.interval)
+        except OSError:
+            return
+
+    def _handshake(self, sock, ws):
+        sock.settimeout(5)
+        while True:
+            try:
+                data = sock.recv(4096)
+            except OSError:
+                return False
+            if not data:
+                return False
+            ws.receive_data(data)
+            for event in ws.events():
+                if isinstance(event, Request):
+                    sock.sendall(ws.send(AcceptConnection()))
+                    return True
+
+    def _answer_pings(self, sock, ws):
+        try:
+            data = sock.recv(4096)
+        except (BlockingIOError, socket.timeout):
+            return
+        if not data:
+            raise OSError('client went away')
+        ws.receive_data(data)
+        for event in ws.events():
+            if isinstance(event, Ping):
+                sock.sendall(ws.send(event.response()))
+            elif isinstance(event, CloseConnection):
+                raise OSError('client closed')
+
+# ---------------------------------------------------------------- measurement
+
+def run(args):
+    server = StandInStreamServer(args.port, args.interval, args.stall_every, args.stall_seconds,
+                                 args.disconnect_every)
+    threading.Thread(target=server.serve_forever, name='stand-in-stream', daemon=True).start()
+
+    parse = binance_ticker_parser()
+    event_times = {}
+
+    def timed_parse(message):
+        events = parse(message)
+        for symbol, _, event_time, _ in events:
+            event_times[symbol] = event_time
+        return events
+
+    stream = MarketStream(server.url, timed_parse, name='bench',
+                          gap_seconds=max(args.interval * 5, 1.0), idle_timeout=args.stall_seconds * 2,
+                          backoff_initial=0.1, backoff_max=2.0)
+    latencies, ages, gaps = [], [], {}
+
+    @stream.add_listener
+    def on_quotes(quotes):
+        now = time.time()
+        latencies.extend(now - event_times[symbol] for symbol in quotes)
+
+    @stream.on_gap
+    def on_gap(symbols, reason):
+        gaps[reason] = gaps.get(reason, 0) + 1
+
+    with harness.offline():
+        stream.start()
+        # A consumer deciding every 10 ms: how old is the quote it acts on?
+        deadline = time.time() + args.duration
+        while time.time() < deadline:
+            time.sleep(0.01)
+            now = time.time()
+            for symbol in [coin.symbol for coin in server.coins]:
+                if symbol in event_times:
+                    ages.append(now - event_times[symbol])
+        stream.stop()
+    server.shutdown()
+
+    latencies.sort()
+    ages.sort()
+
+    def summary(values):
+        return {
+            'count': len(values),
+            'p50_ms': round(harness._percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(harness._percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(harness._percentile(values, 0.99) * 1000, 2),
+            'max_ms': round((values[-1] if values else 0) * 1000, 2),
+        }
+
+    report = {
+        'environment': harness.environment(),
+        'config': {
+            'duration': args.duration,
+            'interval': args.interval,
+            'stall_every': args.stall_every,
+            'stall_seconds': args.stall_seconds,
+            'disconnect_every': args.disconnect_every,
+        },
+        'server': {'messages_sent': server.messages_sent, 'connections': server.connections},
+        'event_to_listener': summary(latencies),
+        'quote_age_at_decision': summary(ages),
+        'gaps': gaps,
+        'reconnects': max(stream.connects - 1, 0),
+        # A REST poll every N seconds serves quotes 0..N s old, N/2 on average (plus the request itself)
+        'polling_model': {
+            'interval_seconds': args.poll_interval,
+            'mean_age_ms': args.poll_interval / 2 * 1000,
+            'max_age_ms': args.poll_interval * 1000,
+        },
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+
+def serve(args):
+    server = StandInStreamServer(args.port, args.interval, args.stall_every, args.stall_seconds,
+                                 args.disconnect_every)
+    print(f'Stand-in ticker stream on {server.url}')
+    server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Streaming market-data ingest benchmark')
+    parser.add_argument('command', nargs='?', choices=['run', 'serve'], default='run')
+    parser.add_argument('--duration', type=float, default=20, help='seconds to measure')
+    parser.add_argument('--interval', type=float, default=0.1, help='seconds between ticker events per coin')
+    parser.add_argument('--stall-every', type=float, default=0, help='go silent every N seconds (0 = never)')
+    parser.add_argument('--stall-seconds', type=float, default=3)
+    parser.add_argument('--disconnect-every', type=float, default=0, help='drop connections after N seconds (0 = never)')
+    parser.add_argument('--poll-interval', type=float, default=30, help='REST polling interval to compare against')
+    parser.add_argument('--port', type=int, default=9443)
+    parser.add_argument('--output', help='also write the JSON report here')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args)
+    else:
+        run(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Run the benchmark suite offline and write machine-readable results
+
+    python -m benchmarks.run                       # everything -> bench_results.json
+    python -m benchmarks.run --filter enhanced     # subset by name
+    python -m benchmarks.run --baseline old.json --fail-on-regression
+"""
+
+import argparse
+import sys
+
+from benchmarks import harness
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Black Sultan OS engine and API benchmarks')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--output', default='bench_results.json', help='where to write results')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='regression threshold (0.10 = 10%%)')
+    parser.add_argument('--concurrency', type=int, default=8, help='worker threads for macro benchmarks')
+    parser.add_argument('--requests', type=int, default=200, help='requests per worker for macro benchmarks')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per microbenchmark round')
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--skip-macro', action='store_true')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = []
+    with harness.offline():
+        if not args.skip_micro:
+            from benchmarks import bench_engine
+            for name, fn in bench_engine.collect():
+                if args.filter in name:
+                    results.append(harness.micro(name, fn, min_time=args.min_time))
+                    sys.stderr.write(f"{name:45s} {results[-1]['median_ns']:>12.1f} ns\n")
+
+        if not args.skip_macro:
+            from benchmarks import bench_api
+            for name, app, method, path in bench_api.collect():
+                if args.filter in name:
+                    results.append(harness.macro(
+                        name, app, method, path,
+                        concurrency=args.concurrency, requests_per_worker=args.requests
+                    ))
+                    r = results[-1]
+                    sys.stderr.write(
+                        f"{name:45s} p50 {r['p50_ms']:8.3f} ms  p99 {r['p99_ms']:8.3f} ms  {r['throughput_rps']:9.1f} rps\n"
+                    )
+
+    comparisons = None
+    if args.baseline:
+        comparisons = harness.compare(results, harness.load_results(args.baseline), args.threshold)
+        for c in comparisons:
+            flag = 'REGRESSION' if c['regression'] else 'improved' if c['improvement'] else ''
+            sys.stderr.write(f"{c['name']:45s} x{c['ratio']:<6} {flag}\n")
+
+    harness.write_results(args.output, results, comparisons)
+    sys.stderr.write(f"Wrote {len(results)} results to {args.output}\n")
+
+    if args.fail_on_regression and comparisons and any(c['regression'] for c in comparisons):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Socket.IO broadcast fan-out load generator
+
+Starts main_enhanced in a child process (offline, with configurable tick
+rates), opens thousands of simulated dashboard clients against it and
+measures how the bots_update / system_metrics / price_update broadcasts
+hold up:
+
+    python -m benchmarks.socketio_load --clients 2000 --duration 60 --tick 1
+
+The server wraps every broadcast in an envelope carrying a per-event
+sequence number and the send time, so clients can compute emit-to-receive
+latency and spot dropped messages. Server CPU and RSS are sampled from
+/proc/<pid>. The simulated clients need aiohttp (python-socketio's asyncio
+client uses it for WebSocket transport).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks import harness
+from src.services.system_metrics import read_process_stat
+
+def _raise_fd_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+# ---------------------------------------------------------------- server side
+
+def serve(port):
+    """Child process: run main_enhanced with sequenced, timestamped broadcasts"""
+    _raise_fd_limit()
+    with harness.offline():
+        import main_enhanced
+        app = main_enhanced.create_app()
+        main_enhanced.start_background_services()
+
+    socketio = main_enhanced.socketio
+    original_emit = socketio.emit
+    sequences = defaultdict(int)
+    lock = threading.Lock()
+
+    def sequenced_emit(event, *args, **kwargs):
+        with lock:
+            sequences[event] += 1
+            seq = sequences[event]
+        data = args[0] if args else None
+        envelope = {'_seq': seq, '_t': time.time(), 'data': data}
+        return original_emit(event, envelope, *args[1:], **kwargs)
+
+    socketio.emit = sequenced_emit
+    with harness.offline():
+        socketio.run(app, host='127.0.0.1', port=port, debug=False,
+                     allow_unsafe_werkzeug=True, log_output=False)
+
+# ---------------------------------------------------------------- client side
+
+class LoadStats:
+    def __init__(self, late_after):
+        self.late_after = late_after
+        self.latencies = defaultdict(list)
+        self.received = defaultdict(int)
+        self.dropped = defaultdict(int)
+        self.late = defaultdict(int)
+        self.unsequenced = defaultdict(int)
+        self.connected = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+
+    def record(self, last_seq, event, data):
+        now = time.time()
+        self.received[event] += 1
+        if not isinstance(data, dict) or '_seq' not in data:
+            self.unsequenced[event] += 1
+            return
+        latency = now - data['_t']
+        self.latencies[event].append(latency)
+        if latency > self.late_after:
+            self.late[event] += 1
+        previous = last_seq.get(event)
+        if previous is not None and data['_seq'] > previous + 1:
+            self.dropped[event] += data['_seq'] - previous - 1
+        last_seq[event] = data['_seq']
+
+    def summary(self):
+        events = {}
+        for event, count in sorted(self.received.items()):
+            latencies = sorted(self.latencies.get(event, []))
+            events[event] = {
+                'received': count,
+                'dropped': self.dropped.get(event, 0),
+                'late': self.late.get(event, 0),
+                'unsequenced': self.unsequenced.get(event, 0),
+                'p50_ms': round(harness._percentile(latencies, 0.50) * 1000, 2),
+                'p95_ms': round(harness._percentile(latencies, 0.95) * 1000, 2),
+                'p99_ms': round(harness._percentile(latencies, 0.99) * 1000, 2),
+                'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            }
+        return {
+            'connected': self.connected,
+            'connect_failures': self.connect_failures,
+            'disconnects': self.disconnects,
+            'events': events,
+        }
+
+async def _client(url, stats, stop):
+    import socketio
+
+    sio = socketio.AsyncClient(reconnection=False)
+    last_seq = {}
+
+    @sio.on('*')
+    async def on_any(event, data=None):
+        stats.record(last_seq, event, data)
+
+    @sio.event
+    async def disconnect(*args):
+        stats.disconnects += 1
+
+    try:
+        await sio.connect(url, transports=['websocket'], wait_timeout=30)
+    except Exception:
+        stats.connect_failures += 1
+        return
+    stats.connected += 1
+    await stop.wait()
+    await sio.disconnect()
+
+async def _drive_clients(url, clients, ramp_per_second, duration, stats, on_ramped):
+    stop = asyncio.Event()
+    tasks = []
+    batch = max(1, int(ramp_per_second / 10))
+    for i in range(0, clients, batch):
+        for _ in range(min(batch, clients - i)):
+            tasks.append(asyncio.create_task(_client(url, stats, stop)))
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(2)  # let the last handshakes finish
+    on_ramped()
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+# ---------------------------------------------------------------- orchestration
+
+class ProcessSampler(threading.Thread):
+    """Samples a child process' CPU% and RSS from /proc"""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(name='load-process-sampler', daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.cpu_percent = []
+        self.rss = []
+        self.marks = {}
+        self._stop = threading.Event()
+
+    def mark(self, name):
+        self.marks[name] = read_process_stat(self.pid)[2]
+
+    def run(self):
+        previous_cpu, _, _ = read_process_stat(self.pid)
+        previous_time = time.time()
+        while not self._stop.wait(self.interval):
+            cpu, _, rss = read_process_stat(self.pid)
+            now = time.time()
+            self.cpu_percent.append((cpu - previous_cpu) / (now - previous_time) * 100)
+            self.rss.append(rss)
+            previous_cpu, previous_time = cpu, now
+
+    def stop(self):
+        self._stop.set()
+
+def _wait_until_ready(port, timeout=60):
+    import urllib.request
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1) as r:
+                if r.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def run(args):
+    try:
+        import aiohttp  # noqa: F401  (python-socketio's AsyncClient transport)
+    except ImportError:
+        sys.exit('The load generator needs aiohttp: pip install aiohttp')
+
+    _raise_fd_limit()
+    env = dict(os.environ)
+    env.update({
+        'ENGINE_TICK_SECONDS': str(args.tick),
+        'METRICS_EMIT_SECONDS': str(args.metrics_interval),
+        'PRICE_EMIT_SECONDS': str(args.price_interval),
+        'STATIC_PRECOMPRESS': '0',
+    })
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.socketio_load', 'serve', '--port', str(args.port)],
+        cwd=harness.REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not _wait_until_ready(args.port):
+            sys.exit('Server did not come up')
+
+        sampler = ProcessSampler(server.pid)
+        sampler.mark('baseline')
+        sampler.start()
+
+        stats = LoadStats(late_after=args.late_ms / 1000)
+        url = f'http://127.0.0.1:{args.port}'
+        started = time.time()
+        asyncio.run(_drive_clients(
+            url, args.clients, args.ramp, args.duration, stats,
+            on_ramped=lambda: sampler.mark('connected')
+        ))
+        sampler.stop()
+        elapsed = time.time() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    summary = stats.summary()
+    baseline_rss = sampler.marks.get('baseline', 0)
+    connected_rss = sampler.marks.get('connected', baseline_rss)
+    cpu = sorted(sampler.cpu_percent)
+    report = {
+        'environment': harness.environment(),
+        'config': {
+            'clients': args.clients,
+            'duration': args.duration,
+            'tick_seconds': args.tick,
+            'metrics_interval': args.metrics_interval,
+            'price_interval': args.price_interval,
+            'late_ms': args.late_ms,
+        },
+        'elapsed_seconds': round(elapsed, 1),
+        'clients': summary,
+        'server': {
+            'cpu_percent_mean': round(sum(cpu) / len(cpu), 1) if cpu else 0.0,
+            'cpu_percent_p95': round(harness._percentile(cpu, 0.95), 1),
+            'rss_baseline_mb': round(baseline_rss / 1048576, 1),
+            'rss_connected_mb': round(connected_rss / 1048576, 1),
+            'rss_peak_mb': round(max(sampler.rss, default=0) / 1048576, 1),
+            'rss_per_connection_kb': round(
+                (connected_rss - baseline_rss) / max(summary['connected'], 1) / 1024, 1
+            ),
+        },
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Socket.IO broadcast fan-out load test')
+    sub = parser.add_subparsers(dest='command')
+
+    serve_parser = sub.add_parser('serve', help='(internal) run the instrumented server')
+    serve_parser.add_argument('--port', type=int, default=5055)
+
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=30, help='seconds to measure once all clients are connected')
+    parser.add_argument('--ramp', type=float, default=500, help='new connections per second')
+    parser.add_argument('--tick', type=float, default=1.0, help='engine tick (bots_update) interval')
+    parser.add_argument('--metrics-interval', type=float, default=1.0)
+    parser.add_argument('--price-interval', type=float, default=5.0)
+    parser.add_argument('--late-ms', type=float, default=500, help='latency above which a message counts as late')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--output', help='also write the JSON report here')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args.port)
+    else:
+        run(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Cold-start report: import time, app build time and baseline RSS per entry point
+
+Every target is imported in a fresh interpreter, ``--runs`` times. Medians
+are reported for:
+- import wall time, plus the slowest modules from ``-X importtime``
+- RSS and live threads right after the import (nothing should be running
+  yet)
+- ``create_app()`` time and RSS, for targets that have one
+
+Results use the harness format, so a saved report works as a baseline:
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+    python -m benchmarks.startup --baseline startup.json --fail-on-regression
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import harness
+
+TARGETS = ('main', 'main_gamified', 'main_enhanced', 'src.routes.crypto_api')
+
+# Runs in the child interpreter; only stdlib modules that Python has loaded anyway
+PROBE = r'''
+import importlib, json, os, sys, threading, time
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+result = {'interpreter_rss_bytes': rss()}
+started = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+result['import_seconds'] = time.perf_counter() - started
+result['import_rss_bytes'] = rss()
+result['threads_after_import'] = threading.active_count()
+if hasattr(module, 'create_app'):
+    started = time.perf_counter()
+    module.create_app()
+    result['create_app_seconds'] = time.perf_counter() - started
+    result['app_rss_bytes'] = rss()
+    result['threads_after_app'] = threading.active_count()
+with open(sys.argv[2], 'w') as f:
+    json.dump(result, f)
+'''
+
+def _importtime(stderr, top):
+    """Slowest modules by self time from ``-X importtime`` output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append({'module': name.strip(), 'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000})
+    modules.sort(key=lambda m: m['self_ms'], reverse=True)
+    return modules[:top]
+
+def probe(target, top=10):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([harness.REPO_ROOT, harness.SRC_DIR]))
+    # The result goes to a file: anything the target prints shares stdout with the probe
+    with tempfile.NamedTemporaryFile('r', suffix='.json') as out:
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE, target, out.name],
+            cwd=harness.REPO_ROOT, env=env, capture_output=True, text=True, timeout=120
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f'{target} failed to import:\n{completed.stderr[-2000:]}')
+        result = json.load(out)
+    result['slowest_imports'] = _importtime(completed.stderr, top)
+    return result
+
+def measure(target, runs):
+    samples = [probe(target) for _ in range(runs)]
+
+    def median(key, scale=1.0):
+        values = [s[key] for s in samples if key in s]
+        return round(statistics.median(values) * scale, 3) if values else None
+
+    startup = {
+        'name': f'startup.{target}',
+        'kind': 'startup',
+        'runs': runs,
+        'import_ms': median('import_seconds', 1000),
+        'create_app_ms': median('create_app_seconds', 1000),
+        'threads_after_import': max(s['threads_after_import'] for s in samples),
+        'slowest_imports': samples[-1]['slowest_imports'],
+    }
+    memory = {
+        'name': f'startup.{target}.rss',
+        'kind': 'memory',
+        'runs': runs,
+        'interpreter_rss_mb': median('interpreter_rss_bytes', 1 / 1048576),
+        'rss_mb': median('import_rss_bytes', 1 / 1048576),
+        'app_rss_mb': median('app_rss_bytes', 1 / 1048576),
+    }
+    return [startup, memory]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Entry point cold-start time and baseline memory')
+    parser.add_argument('targets', nargs='*', default=TARGETS, help='modules to import')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per target')
+    parser.add_argument('--output', default='startup.json', help='where to write results')
+    parser.add_argument('--baseline', help='previous report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='regression threshold (0.10 = 10%%)')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    results = []
+    for target in args.targets:
+        startup, memory = measure(target, args.runs)
+        results.extend([startup, memory])
+        app = f"  create_app {startup['create_app_ms']:8.1f} ms  {memory['app_rss_mb']:6.1f} MB" \
+            if startup['create_app_ms'] is not None else ''
+        sys.stderr.write(
+            f"{target:24s} import {startup['import_ms']:8.1f} ms  {memory['rss_mb']:6.1f} MB  "
+            f"threads {startup['threads_after_import']}{app}\n"
+        )
+
+    comparisons = None
+    if args.baseline:
+        comparisons = harness.compare(results, harness.load_results(args.baseline), args.threshold)
+        for c in comparisons:
+            flag = 'REGRESSION' if c['regression'] else 'improved' if c['improvement'] else ''
+            sys.stderr.write(f"{c['name']:45s} x{c['ratio']:<6} {flag}\n")
+
+    harness.write_results(args.output, results, comparisons)
+    sys.stderr.write(f"Wrote {len(results)} results to {args.output}\n")
+
+    if args.fail_on_regression and comparisons and any(c['regression'] for c in comparisons):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -2,15 +2,22 @@
 """
 Black Sultan OS - Enhanced Backend with Real PayPal Integration & Gamification
 Version: 2.0.0 - Production Ready with Interactive Elements
+
+Importing this module builds the engine but runs nothing:
+
+    app = create_app()              # routes, sockets and static files
+    start_background_services()     # trading simulation, resets, snapshots
+
+The module's `app` attribute builds the app on first access, for WSGI servers.
 """
 
 import os
+import sys
 import json
 import time
-import random
 import threading
 from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Blueprint, Flask, current_app, render_template, jsonify, request, url_for
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 import requests
@@ -18,14 +25,38 @@ import logging
 from typing import Dict, List, Optional
 import uuid
 
+# Make the src package importable when started as `python main.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.routes.admin import admin_bp
+from src.routes.metrics import metrics_bp
+from src.routes.system import system_bp
+from src.services.metrics import (
+    SOCKETIO_CLIENTS, TRADE_EXECUTION_SECONDS, TickTimer, install_request_metrics, timed_emit
+)
+from src.services.coins import coin_registry
+from src.services.http_cache import install_compression
+from src.services.jobs import (
+    FAILED as JOB_FAILED, JOB_MAX_ATTEMPTS, JOB_WORKERS, jobs_path, QUEUED, SUCCEEDED,
+    JobPending, JobQueue, PermanentJobError
+)
+from src.services.oauth import TokenManager
+from src.services.payouts import (
+    PAYOUT_BATCH_WINDOW, PAYOUT_MAX_BATCH, PAYOUT_MAX_PENDING_SECONDS, FAILED, SUCCESS, PayoutQueue, parse_amount
+)
+from src.services.rng import simulation_rng
+from src.services.serialized import SnapshotPublisher, packet_json
+from src.services.snapshots import StateSnapshotter, capture_fields, restore_fields, state_path
+from src.services.static_assets import StaticAssetServer
+from src.services.system_metrics import system_sampler
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, static_folder='static', static_url_path='')
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'black-sultan-secret-key-2024')
-socketio = SocketIO(app, cors_allowed_origins="*")
-CORS(app)
+# Routes, socket handlers and static files are attached to an app by create_app()
+dashboard_bp = Blueprint('dashboard', __name__)
+socketio = SocketIO(cors_allowed_origins="*", json=packet_json)
+static_assets = StaticAssetServer(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
 
 # Global state management
 class GameState:
@@ -43,8 +74,13 @@ class GameState:
         self.last_spin_time = None
         self.scratch_cards_available = 3
         self.daily_bonus_claimed = False
+        self.version = 0  # bumped on every change the dashboard shows
+        
+    def touch(self):
+        self.version += 1
         
     def add_xp(self, amount: int):
+        self.touch()
         self.user_xp += amount
         # Level up every 1000 XP
         new_level = (self.user_xp // 1000) + 1
@@ -54,6 +90,7 @@ class GameState:
         return False
     
     def add_profit(self, amount: float):
+        self.touch()
         self.portfolio_value += amount
         self.daily_profit += amount
 
@@ -73,6 +110,9 @@ class TradingBot:
         self.success_rate = 0.87  # 87% success rate
         self.last_trade_time = None
         self.risk_level = "moderate"
+        self.rng = simulation_rng.stream(f'bot:{bot_id}')
+        self._win_size = self.rng.sampler(0.02, 0.08)
+        self._loss_size = self.rng.sampler(0.01, 0.05)
         
     def execute_trade(self, market_data: Dict) -> Dict:
         """Execute a trade based on strategy and market conditions"""
@@ -86,15 +126,15 @@ class TradingBot:
         market_volatility = market_data.get('volatility', 0.5)
         success_probability = self.success_rate * (1 - market_volatility * 0.3)
         
-        is_successful = random.random() < success_probability
+        is_successful = self.rng.random() < success_probability
         
         if is_successful:
-            profit = trade_amount * random.uniform(0.02, 0.08)  # 2-8% profit
+            profit = trade_amount * self._win_size()  # 2-8% profit
             self.balance += profit
             self.profit_today += profit
             game_state.add_profit(profit)
         else:
-            loss = trade_amount * random.uniform(0.01, 0.05)  # 1-5% loss
+            loss = trade_amount * self._loss_size()  # 1-5% loss
             self.balance -= loss
             self.profit_today -= loss
             game_state.add_profit(-loss)
@@ -133,46 +173,86 @@ class PayPalIntegration:
         self.client_id = os.environ.get('PAYPAL_CLIENT_ID', 'demo_client_id')
         self.client_secret = os.environ.get('PAYPAL_CLIENT_SECRET', 'demo_client_secret')
         self.base_url = os.environ.get('PAYPAL_BASE_URL', 'https://api.sandbox.paypal.com')
-        self.access_token = None
-        self.token_expires_at = None
+        # Shared across workers and renewed in the background before it expires
+        self.tokens = TokenManager(self._request_token, name='paypal')
+        self._responses = {}  # sender_batch_id -> first response, replayed for resent batches
         
-    def get_access_token(self) -> str:
-        """Get or refresh PayPal access token"""
-        if self.access_token and self.token_expires_at and datetime.now() < self.token_expires_at:
-            return self.access_token
-            
+    def _request_token(self):
+        """Fetch a new access token as (token, expires_in_seconds)"""
         # For demo purposes, return a mock token
-        # In production, implement actual OAuth flow
-        self.access_token = f"mock_token_{int(time.time())}"
-        self.token_expires_at = datetime.now() + timedelta(hours=1)
-        return self.access_token
+        # In production: client_credentials_fetcher(f"{self.base_url}/v1/oauth2/token", self.client_id, self.client_secret)
+        return f"mock_token_{int(time.time())}", 3600
+        
+    def get_access_token(self) -> str:
+        """Current PayPal access token (never refreshed on the caller's thread once started)"""
+        return self.tokens.get()
     
-    def create_payout(self, recipient_email: str, amount: float, currency: str = 'USD') -> Dict:
-        """Create a PayPal payout"""
-        payout_id = f"PAYPAL_{uuid.uuid4().hex[:8].upper()}"
+    def submit_batch(self, sender_batch_id: str, items: List) -> Dict:
+        """Create one PayPal batch payout for several queued withdrawals"""
+        # Idempotent like the real API: a batch that was already sent gets its first response back
+        if sender_batch_id in self._responses:
+            return self._responses[sender_batch_id]
+        payout_batch_id = f"PAYPAL_{uuid.uuid4().hex[:8].upper()}"
         
-        # In production, make actual API call to PayPal
-        # For demo, return realistic response
-        payout_response = {
-            'payout_batch_id': payout_id,
-            'status': 'SUCCESS',
-            'recipient_email': recipient_email,
-            'amount': amount,
-            'currency': currency,
-            'processing_time': '1-3 business days',
-            'transaction_fee': round(amount * 0.02, 2),  # 2% fee
-            'net_amount': round(amount * 0.98, 2),
-            'created_at': datetime.now().isoformat()
+        # In production, POST /v1/payments/payouts with every item in one call
+        # For demo, return a realistic per-item response
+        results = {
+            item.id: {'status': SUCCESS, 'payout_item_id': f"{payout_batch_id}_{item.id[-8:].upper()}"}
+            for item in items
         }
         
-        logger.info(f"PayPal payout created: {payout_id} for ${amount} to {recipient_email}")
-        return payout_response
+        logger.info(f"PayPal batch payout created: {payout_batch_id} ({sender_batch_id}) with {len(items)} items")
+        response = self._responses[sender_batch_id] = {
+            'payout_batch_id': payout_batch_id, 'batch_status': 'SUCCESS', 'items': results
+        }
+        return response
 
 paypal = PayPalIntegration()
+payout_queue = PayoutQueue(paypal, window=PAYOUT_BATCH_WINDOW, max_batch=PAYOUT_MAX_BATCH)
+
+# Withdrawals are accepted into a durable job queue and paid out by background workers
+jobs = JobQueue(
+    jobs_path(os.path.splitext(os.path.basename(__file__))[0]), workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS
+)
+# How long a worker waits on one payout before checking again later (well under the lease)
+PAYOUT_WAIT_SECONDS = jobs.lease_seconds / 4
+withdraw_lock = threading.Lock()
+
+def process_withdrawal(payload: Dict, job: Dict) -> Dict:
+    """Pay one accepted withdrawal out through the batched payout queue"""
+    # Keyed by the job, so every attempt (even after a restart) sends the same sender_item_id
+    amount = parse_amount(payload.get('amount'))
+    if not payload.get('email') or amount is None:
+        raise PermanentJobError(f"Invalid withdrawal payload: {payload!r}")
+    item = payout_queue.submit(
+        payload['email'], amount, idempotency_key=job['id'],
+        # The provider deduplicates per batch: an item sent before goes out again in that batch only
+        batch_id=job['checkpoint'].get('sender_batch_id'),
+        on_batched=lambda item: jobs.checkpoint(job['id'], sender_batch_id=item.batch_id)
+    )
+    # Give up waiting well inside the job's lease, so no other worker reclaims it meanwhile
+    if not item.wait(PAYOUT_WAIT_SECONDS):
+        # JobPending uses up no attempt, so an unanswered payout needs a limit of its own
+        pending_for = time.time() - job['created_at']
+        if pending_for < PAYOUT_MAX_PENDING_SECONDS or not payout_queue.abandon(
+                item, f"Payout still {item.status} after {pending_for:.0f}s"):
+            raise JobPending(f"Payout {item.id} is still {item.status}")
+    if item.status == FAILED:
+        raise PermanentJobError(item.error or 'PayPal payout failed')
+    return {
+        'payout_id': item.payout_batch_id,
+        'payout_item_id': item.id,
+        'payout_status': item.status,
+        'transaction_fee': round(payload['amount'] * 0.02, 2),  # 2% fee
+        'net_amount': round(payload['amount'] * 0.98, 2)
+    }
+
+jobs.register('paypal_withdrawal', process_withdrawal)
 
 # Gamification System
 class GamificationEngine:
     def __init__(self):
+        self.rng = simulation_rng.stream('game:rewards')
         self.achievements = [
             {'id': 'first_trade', 'name': 'First Trade', 'description': 'Complete your first trade', 'xp': 100},
             {'id': 'profit_master', 'name': 'Profit Master', 'description': 'Earn $1000 in profits', 'xp': 500},
@@ -195,7 +275,7 @@ class GamificationEngine:
         ]
         
         # Select reward based on probability
-        rand = random.random()
+        rand = self.rng.random()
         cumulative_prob = 0
         selected_reward = None
         
@@ -236,7 +316,7 @@ class GamificationEngine:
         
         # Random reward
         rewards = [25, 50, 75, 100, 150, 200]
-        reward_amount = random.choice(rewards)
+        reward_amount = self.rng.choice(rewards)
         
         game_state.add_profit(reward_amount)
         level_up = game_state.add_xp(50)
@@ -252,47 +332,45 @@ class GamificationEngine:
 gamification = GamificationEngine()
 
 # Market Data Simulation
+market_rng = simulation_rng.stream('feed:market_data')
+market_fluctuation = market_rng.sampler(-0.05, 0.05)
+market_change_24h = market_rng.sampler(-0.08, 0.08)
+market_volume_24h = market_rng.sampler(1000000, 5000001)
+
 def get_market_data():
     """Get current market data with realistic fluctuations"""
-    base_prices = {'BTC': 67000, 'ETH': 2650, 'BNB': 580}
     current_prices = {}
     
-    for symbol, base_price in base_prices.items():
+    for coin in coin_registry.tracked():
+        symbol, base_price = coin.symbol.upper(), coin.reference_price
         # Add realistic price fluctuation
-        fluctuation = random.uniform(-0.05, 0.05)  # ±5%
+        fluctuation = market_fluctuation()  # ±5%
         current_price = base_price * (1 + fluctuation)
         
         # Calculate 24h change
-        change_24h = random.uniform(-0.08, 0.08)  # ±8%
+        change_24h = market_change_24h()  # ±8%
         
         current_prices[symbol] = {
             'price': round(current_price, 2),
             'change_24h': round(change_24h * 100, 2),
-            'volume_24h': random.randint(1000000, 5000000),
+            'volume_24h': int(market_volume_24h()),
             'volatility': abs(change_24h)
         }
     
     return current_prices
 
-# Routes
-@app.route('/')
-def index():
-    return send_from_directory(app.static_folder, 'index.html')
-
-@app.route('/api/status')
-def api_status():
-    return jsonify({
-        'status': 'online',
-        'version': '2.0.0',
-        'features': ['real_paypal', 'gamification', 'live_trading'],
-        'timestamp': datetime.now().isoformat()
-    })
+# Dashboard snapshot, published once per engine tick and shared by REST and WebSocket
+_last_market_data = None
 
-@app.route('/api/dashboard')
-def dashboard_data():
-    market_data = get_market_data()
+def build_dashboard_payload(market_data: Optional[Dict] = None) -> Dict:
+    """Assemble the dashboard payload, reusing the last tick's market data"""
+    global _last_market_data
+    if market_data is None:
+        market_data = _last_market_data or get_market_data()
+    _last_market_data = market_data
+    metrics = system_sampler.latest()
     
-    return jsonify({
+    return {
         'portfolio_value': game_state.portfolio_value,
         'daily_profit': game_state.daily_profit,
         'daily_profit_percentage': round((game_state.daily_profit / game_state.portfolio_value) * 100, 2),
@@ -301,14 +379,60 @@ def dashboard_data():
         'streak_days': game_state.streak_days,
         'market_data': market_data,
         'system_metrics': {
-            'cpu_usage': random.randint(15, 45),
-            'memory_usage': random.randint(60, 85),
-            'network_usage': random.randint(20, 70),
+            'cpu_usage': round(metrics['host_cpu_percent']),
+            'memory_usage': round(metrics['memory_percent']),
+            'network_usage': round((metrics['net_rx_bytes_per_sec'] + metrics['net_tx_bytes_per_sec']) / 1024),
+            'process_cpu': metrics['process_cpu_percent'],
+            'rss_mb': round(metrics['rss_bytes'] / 1048576, 1),
+            'threads': metrics['threads'],
             'active_trades': sum(1 for bot in bots.values() if bot.is_active)
-        }
+        },
+        'timestamp': datetime.now().isoformat()
+    }
+
+dashboard = SnapshotPublisher(build_dashboard_payload, lambda: game_state.version, name='dashboard')
+
+# Engine state is snapshotted in the background and restored on boot
+def capture_state() -> Dict:
+    return {
+        'game_state': capture_fields(game_state),
+        'bots': {bot_id: capture_fields(bot) for bot_id, bot in bots.items()}
+    }
+
+def restore_state(state: Dict):
+    restore_fields(game_state, state['game_state'])
+    for bot_id, bot_state in state['bots'].items():
+        if bot_id in bots:
+            restore_fields(bots[bot_id], bot_state)
+    game_state.touch()
+
+state_snapshots = StateSnapshotter(
+    state_path(os.path.splitext(os.path.basename(__file__))[0]), capture_state, restore_state
+)
+
+# Routes
+@dashboard_bp.route('/')
+def index():
+    return static_assets.send('index.html')
+
+@dashboard_bp.route('/api/status')
+def api_status():
+    return jsonify({
+        'status': 'online',
+        'version': '2.0.0',
+        'features': ['real_paypal', 'gamification', 'live_trading'],
+        'timestamp': datetime.now().isoformat()
     })
 
-@app.route('/api/bots')
+@dashboard_bp.route('/api/dashboard')
+def dashboard_data():
+    snapshot = dashboard.current()
+    response = current_app.response_class(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@dashboard_bp.route('/api/bots')
 def get_bots():
     bot_data = []
     for bot in bots.values():
@@ -325,13 +449,14 @@ def get_bots():
         })
     return jsonify(bot_data)
 
-@app.route('/api/bot/<bot_id>/toggle', methods=['POST'])
+@dashboard_bp.route('/api/bot/<bot_id>/toggle', methods=['POST'])
 def toggle_bot(bot_id):
     if bot_id not in bots:
         return jsonify({'error': 'Bot not found'}), 404
     
     bot = bots[bot_id]
     bot.is_active = not bot.is_active
+    game_state.touch()
     
     # Add XP for bot management
     game_state.add_xp(25)
@@ -343,57 +468,93 @@ def toggle_bot(bot_id):
         'message': f'{bot.name} {"activated" if bot.is_active else "deactivated"}'
     })
 
-@app.route('/api/paypal/withdraw', methods=['POST'])
+def save_ledger():
+    """Snapshot now, not at the next interval: jobs.db already holds the withdrawal durably"""
+    try:
+        state_snapshots.save()
+    except Exception:
+        logger.exception("Error writing state snapshot after a withdrawal")
+
+@jobs.add_listener
+def on_withdrawal_update(job: Dict):
+    """Settle the portfolio as a withdrawal job moves along and push its status to clients"""
+    if job['kind'] != 'paypal_withdrawal':
+        return
+    amount = job['payload']['amount']
+    if job['status'] == QUEUED:
+        # Deduct on accept so concurrent withdrawals cannot overdraw the portfolio
+        game_state.portfolio_value -= amount
+        game_state.touch()
+        save_ledger()
+    elif job['status'] == JOB_FAILED:
+        game_state.portfolio_value += amount
+        game_state.touch()
+        save_ledger()
+        logger.error(f"Withdrawal {job['id']} failed after {job['attempts']} attempts, refunded ${amount}: {job['error']}")
+    elif job['status'] == SUCCEEDED:
+        # Add XP for withdrawal
+        game_state.add_xp(100)
+        save_ledger()
+    timed_emit(socketio, 'withdrawal_status', job)
+
+@dashboard_bp.route('/api/paypal/withdraw', methods=['POST'])
 def paypal_withdraw():
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     email = data.get('email')
-    amount = float(data.get('amount', 0))
+    amount = parse_amount(data.get('amount'))
     
-    if not email or amount <= 0:
+    if not email or amount is None:
         return jsonify({'error': 'Invalid email or amount'}), 400
     
-    if amount > game_state.portfolio_value:
-        return jsonify({'error': 'Insufficient funds'}), 400
-    
-    # Process PayPal payout
-    payout_result = paypal.create_payout(email, amount)
-    
-    if payout_result.get('status') == 'SUCCESS':
-        # Deduct from portfolio
-        game_state.portfolio_value -= amount
+    with withdraw_lock:
+        if amount > game_state.portfolio_value:
+            return jsonify({'error': 'Insufficient funds'}), 400
         
-        # Add XP for withdrawal
-        game_state.add_xp(100)
-        
-        return jsonify({
-            'success': True,
-            'payout_id': payout_result['payout_batch_id'],
-            'amount': amount,
-            'recipient': email,
-            'processing_time': payout_result['processing_time'],
-            'transaction_fee': payout_result['transaction_fee'],
-            'net_amount': payout_result['net_amount'],
-            'new_portfolio_value': game_state.portfolio_value
-        })
-    else:
-        return jsonify({'error': 'PayPal payout failed'}), 500
+        # Accept the withdrawal; the payout happens on a job worker, not on this request thread
+        job = jobs.enqueue(
+            'paypal_withdrawal', {'email': email, 'amount': amount},
+            idempotency_key=request.headers.get('Idempotency-Key')
+        )
+    
+    status_url = url_for('.paypal_withdrawal_status', job_id=job['id'])
+    return jsonify({
+        'success': True,
+        'job': job,
+        'status_url': status_url,
+        'processing_time': '1-3 business days',
+        'new_portfolio_value': game_state.portfolio_value
+    }), 202, {'Location': status_url}
+
+@dashboard_bp.route('/api/paypal/withdrawals/<job_id>')
+def paypal_withdrawal_status(job_id):
+    job = jobs.get(job_id)
+    if job is None or job['kind'] != 'paypal_withdrawal':
+        return jsonify({'error': 'Withdrawal not found'}), 404
+    return jsonify({'success': True, 'job': job})
 
-@app.route('/api/gamification/spin-wheel', methods=['POST'])
+@dashboard_bp.route('/api/paypal/payouts/<item_id>')
+def paypal_payout_status(item_id):
+    item = payout_queue.get(item_id)
+    if item is None:
+        return jsonify({'error': 'Payout not found'}), 404
+    return jsonify({'success': True, 'payout': item.to_dict()})
+
+@dashboard_bp.route('/api/gamification/spin-wheel', methods=['POST'])
 def spin_wheel_endpoint():
     result = gamification.spin_wheel()
     return jsonify(result)
 
-@app.route('/api/gamification/scratch-card', methods=['POST'])
+@dashboard_bp.route('/api/gamification/scratch-card', methods=['POST'])
 def scratch_card_endpoint():
     result = gamification.scratch_card()
     return jsonify(result)
 
-@app.route('/api/gamification/daily-bonus', methods=['POST'])
+@dashboard_bp.route('/api/gamification/daily-bonus', methods=['POST'])
 def daily_bonus():
     if game_state.daily_bonus_claimed:
         return jsonify({'error': 'Daily bonus already claimed'})
     
-    bonus_amount = random.randint(50, 200)
+    bonus_amount = gamification.rng.randint(50, 200)
     game_state.add_profit(bonus_amount)
     level_up = game_state.add_xp(100)
     game_state.daily_bonus_claimed = True
@@ -405,7 +566,7 @@ def daily_bonus():
         'level_up': level_up
     })
 
-@app.route('/api/gamification/status')
+@dashboard_bp.route('/api/gamification/status')
 def gamification_status():
     return jsonify({
         'user_level': game_state.user_level,
@@ -424,39 +585,41 @@ def gamification_status():
 @socketio.on('connect')
 def handle_connect():
     logger.info('Client connected')
+    SOCKETIO_CLIENTS.inc()
     emit('status', {'message': 'Connected to Black Sultan OS'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     logger.info('Client disconnected')
+    SOCKETIO_CLIENTS.dec()
 
 # Background Tasks
 def trading_simulation():
     """Simulate continuous trading activity"""
+    rng = simulation_rng.stream('engine:trading_simulation')
+    tick = TickTimer('trading_simulation')
     while True:
+        tick.start()
         try:
             market_data = get_market_data()
             
             # Execute trades for active bots
             for bot in bots.values():
-                if bot.is_active and random.random() < 0.3:  # 30% chance per cycle
-                    trade_result = bot.execute_trade(market_data)
+                if bot.is_active and rng.random() < 0.3:  # 30% chance per cycle
+                    with TRADE_EXECUTION_SECONDS.labels(bot.strategy).time():
+                        trade_result = bot.execute_trade(market_data)
                     if trade_result:
                         # Emit trade notification
-                        socketio.emit('trade_executed', trade_result)
+                        timed_emit(socketio, 'trade_executed', trade_result)
             
-            # Emit updated dashboard data
-            dashboard_update = {
-                'portfolio_value': game_state.portfolio_value,
-                'daily_profit': game_state.daily_profit,
-                'market_data': market_data,
-                'timestamp': datetime.now().isoformat()
-            }
-            socketio.emit('dashboard_update', dashboard_update)
+            # Publish one snapshot; REST polls and this broadcast share its bytes
+            snapshot = dashboard.publish(market_data)
+            timed_emit(socketio, 'dashboard_update', snapshot.raw)
             
         except Exception as e:
             logger.error(f"Trading simulation error: {e}")
         
+        tick.finish(30)
         time.sleep(30)  # Update every 30 seconds
 
 def reset_daily_limits():
@@ -473,6 +636,7 @@ def reset_daily_limits():
                 for bot in bots.values():
                     bot.trades_today = 0
                     bot.profit_today = 0.0
+                game_state.touch()
                 
                 logger.info("Daily limits reset")
                 
@@ -481,16 +645,62 @@ def reset_daily_limits():
         
         time.sleep(60)  # Check every minute
 
-if __name__ == '__main__':
-    # Start background threads
-    trading_thread = threading.Thread(target=trading_simulation, daemon=True)
+def create_app():
+    """Build the Flask app with every route, socket handler and static file; starts nothing"""
+    app = Flask(__name__, static_folder=static_assets.static_folder, static_url_path='')
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'black-sultan-secret-key-2024')
+    socketio.init_app(app)
+    CORS(app)
+    static_assets.init_app(app)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(system_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(admin_bp, url_prefix='/api')
+    install_request_metrics(app)
+    install_compression(app)
+    return app
+
+def __getattr__(name):
+    # `<module>.app` for WSGI servers and tools: built on first access, not on import
+    global app
+    if name == 'app':
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_services_started = False
+_services_lock = threading.Lock()
+
+def start_background_services():
+    """Resume from the last snapshot and start every background task (once per process)"""
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+    
+    # Resume where the last run stopped, then keep snapshotting
+    if state_snapshots.restore():
+        logger.info(f"Engine state restored from {state_snapshots.path} ({state_snapshots.restored_at})")
+    state_snapshots.start()
+    
+    system_sampler.start()
+    paypal.tokens.start()
+    jobs.start()
+    
+    trading_thread = threading.Thread(target=trading_simulation, name='trading-simulation', daemon=True)
     trading_thread.start()
     
-    reset_thread = threading.Thread(target=reset_daily_limits, daemon=True)
+    reset_thread = threading.Thread(target=reset_daily_limits, name='daily-reset', daemon=True)
     reset_thread.start()
+
+if __name__ == '__main__':
+    app = create_app()
+    start_background_services()
     
     logger.info("Black Sultan OS Backend v2.0.0 starting...")
     logger.info("Features: Real PayPal Integration, Gamification, Live Trading")
+    logger.info(f"Simulation seed {simulation_rng.seed} (set SIMULATION_SEED to replay)")
     
     # Run the application
     socketio.run(app, host='0.0.0.0', port=5000, debug=False)
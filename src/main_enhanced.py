@@ -2,31 +2,99 @@
 """
 Black Sultan OS - Enhanced Production Version
 Professional Cryptocurrency Trading Platform with Real Bot Logic and PayPal Integration
+
+Importing this module builds the engine but runs nothing:
+
+    app = create_app()              # routes, sockets and static files
+    start_background_services()     # engine, streams, pollers, snapshots
+
+`main_enhanced.app` builds the app on first access, for WSGI servers. A
+pre-forking server should call start_background_services() in each worker
+after the fork.
 """
 
 import os
+import sys
 import time
 import threading
 import random
-import requests
 import json
+import copy
+import logging
 from datetime import datetime, timedelta
-from flask import Flask, send_from_directory, jsonify, request
+from flask import Blueprint, Flask, jsonify, request, url_for
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-import paypalrestsdk
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'black-sultan-os-secret-key-2024'
-CORS(app, origins="*")
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Make the src package importable when started as `python main_enhanced.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models.engine import configure_database
+from src.routes import crypto_api
+from src.routes.admin import admin_bp
+from src.routes.metrics import metrics_bp
+from src.routes.system import system_bp
+from src.routes.user import user_bp
+from src.services.metrics import (
+    SOCKETIO_CLIENTS, TRADE_EXECUTION_SECONDS, TickTimer, install_request_metrics, timed_emit
+)
+from src.services.arbitrage import arbitrage_scanner
+from src.services.coins import coin_registry, fetch_coingecko_quotes
+from src.services.http_cache import conditional, install_compression, state_etag
+from src.services.jobs import (
+    FAILED as JOB_FAILED, JOB_MAX_ATTEMPTS, JOB_WORKERS, jobs_path, QUEUED as JOB_QUEUED,
+    JobPending, JobQueue, PermanentJobError
+)
+from src.services.market_stream import market_stream
+from src.services.oauth import TokenManager, client_credentials_fetcher, install_sdk_token
+from src.services.order_book import depth_stream, order_books
+from src.services.payouts import (
+    PAYOUT_BATCH_WINDOW, PAYOUT_MAX_BATCH, PAYOUT_MAX_PENDING_SECONDS, FAILED, PayPalSDKPayoutService, PayoutQueue,
+    parse_amount
+)
+from src.services.rate_limit import PRIORITY_DEFAULT
+from src.services.risk import risk_engine
+from src.services.snapshots import StateSnapshotter, capture_fields, restore_fields, state_path
+from src.services.rng import simulation_rng
+from src.services.static_assets import StaticAssetServer
+from src.services.system_metrics import system_sampler
+from src.services.upstream import fetch
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-# PayPal Configuration
-paypalrestsdk.configure({
+# Routes, socket handlers and static files are attached to an app by create_app()
+enhanced_bp = Blueprint('enhanced', __name__)
+socketio = SocketIO(cors_allowed_origins="*")
+static_assets = StaticAssetServer(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+
+# PayPal Configuration (the SDK itself is imported on the first payout)
+PAYPAL_CONFIG = {
     "mode": "sandbox",  # Change to "live" for production
     "client_id": os.environ.get('PAYPAL_CLIENT_ID', 'ATUUVEAgA_xDrjL2CtpoB...'),
     "client_secret": os.environ.get('PAYPAL_CLIENT_SECRET', 'EAe6zjBCq4TS3R4cGmRlCIG90IoBsphZ8eoD9Wmg0brh2ssYfJ0CoLxE02CFoqsc1xQjof1kKyeCmRNr')
-})
+}
+PAYPAL_ENDPOINT = 'https://api.sandbox.paypal.com' if PAYPAL_CONFIG['mode'] == 'sandbox' else 'https://api.paypal.com'
+
+# The SDK's access token is shared across workers and renewed in the background
+paypal_tokens = TokenManager(
+    client_credentials_fetcher(
+        f"{PAYPAL_ENDPOINT}/v1/oauth2/token", PAYPAL_CONFIG['client_id'], PAYPAL_CONFIG['client_secret']
+    ),
+    name='paypal-sdk'
+)
+_paypal_sdk = None
+_paypal_sdk_lock = threading.Lock()
+
+def paypal_sdk():
+    """paypalrestsdk, imported and configured with the shared token on first use"""
+    global _paypal_sdk
+    with _paypal_sdk_lock:
+        if _paypal_sdk is None:
+            import paypalrestsdk
+            install_sdk_token(paypalrestsdk.configure(PAYPAL_CONFIG), paypal_tokens)
+            _paypal_sdk = paypalrestsdk
+    return _paypal_sdk
 
 # Enhanced Bot System with Real Logic
 class TradingBot:
@@ -41,6 +109,12 @@ class TradingBot:
         self.last_trade_time = datetime.now()
         self.performance_history = []
         self.risk_level = 'moderate'
+        self.rng = simulation_rng.stream(f'bot:{bot_id}')
+        self._profit_factor = self.rng.sampler(0.5, 1.8)
+        self.version = 0  # bumped on every change the bot endpoints show
+        
+    def touch(self):
+        self.version += 1
         
     def execute_trade(self, market_data):
         """Execute a trade based on bot strategy and market conditions"""
@@ -54,6 +128,7 @@ class TradingBot:
             trade_amount = min(self.balance * 0.01, 100)  # 1% of balance, max $100
             trade_profit = self._calculate_profit(trade_signal, trade_amount, market_data)
             
+            self.touch()
             self.balance += trade_profit
             self.profit += trade_profit
             self.trades += 1
@@ -104,42 +179,100 @@ class TradingBot:
     def _alpha_strategy(self, market_data):
         """High-frequency trading with advanced algorithms"""
         # Simulate alpha trading logic
-        if random.random() > 0.7:  # 30% chance to trade
-            symbol = random.choice(['BTC', 'ETH', 'BNB'])
-            action = 'buy' if random.random() > 0.5 else 'sell'
+        if self.rng.random() > 0.7:  # 30% chance to trade
+            symbol = self.rng.choice(['BTC', 'ETH', 'BNB'])
+            action = 'buy' if self.rng.random() > 0.5 else 'sell'
             return {'symbol': symbol, 'action': action, 'confidence': 0.85}
         return None
     
     def _arbitrage_strategy(self, market_data):
         """Cross-exchange arbitrage opportunities"""
-        if random.random() > 0.8:  # 20% chance to find arbitrage
-            symbol = random.choice(['BTC', 'ETH'])
-            return {'symbol': symbol, 'action': 'arbitrage', 'confidence': 0.92}
-        return None
+        arbitrage_scanner.expire(ARBITRAGE_MAX_QUOTE_AGE)
+        if not arbitrage_scanner.venues(ARBITRAGE_MAX_QUOTE_AGE):
+            # No live venue quotes: simulated decision
+            if self.rng.random() > 0.8:  # 20% chance to find arbitrage
+                symbol = self.rng.choice(['BTC', 'ETH'])
+                return {'symbol': symbol, 'action': 'arbitrage', 'confidence': 0.92}
+            return None
+        
+        opportunity = arbitrage_scanner.best(ARBITRAGE_MIN_PROFIT_BPS)
+        if opportunity is None:
+            return None
+        return {
+            'symbol': opportunity.symbol,
+            'action': 'arbitrage',
+            'confidence': round(min(0.99, 0.90 + opportunity.profit_bps / 1000), 2),
+            'route': opportunity.to_dict()['route'],
+            'kind': opportunity.kind,
+            'profit_bps': round(opportunity.profit_bps, 3)
+        }
     
     def _trend_strategy(self, market_data):
         """Momentum-based trading strategies"""
-        if random.random() > 0.6:  # 40% chance to follow trend
-            symbol = random.choice(['BTC', 'ETH', 'BNB'])
-            action = 'buy' if random.random() > 0.4 else 'sell'
+        if self.rng.random() > 0.6:  # 40% chance to follow trend
+            symbol = self.rng.choice(['BTC', 'ETH', 'BNB'])
+            action = 'buy' if self.rng.random() > 0.4 else 'sell'
             return {'symbol': symbol, 'action': action, 'confidence': 0.75}
         return None
     
     def _risk_strategy(self, market_data):
         """Portfolio risk assessment and management"""
-        if random.random() > 0.9:  # 10% chance for risk management action
-            symbol = 'BTC'  # Focus on BTC for risk management
-            action = 'hedge'
-            return {'symbol': symbol, 'action': action, 'confidence': 0.95}
-        return None
+        report = risk_engine.report(crypto_provider.price_history, portfolio_holdings())
+        if report is None:
+            # Not enough price history yet: simulated decision
+            if self.rng.random() > 0.9:  # 10% chance for risk management action
+                symbol = 'BTC'  # Focus on BTC for risk management
+                action = 'hedge'
+                return {'symbol': symbol, 'action': action, 'confidence': 0.95}
+            return None
+        
+        # Hedge the largest tail-risk contributor while VaR is over the limit
+        var = report['monte_carlo']['var'][RISK_CONFIDENCE]
+        var_ratio = var / report['portfolio_value']
+        if var_ratio <= RISK_VAR_LIMIT:
+            return None
+        symbol, contribution = max(report['contributions'].items(), key=lambda item: item[1]['cvar'])
+        return {
+            'symbol': symbol.upper(),
+            'action': 'hedge',
+            'confidence': round(min(0.99, 0.90 + contribution['share'] * 0.09), 2),
+            'var': round(var, 2),
+            'var_ratio': round(var_ratio, 4),
+            'contribution_share': round(contribution['share'], 4)
+        }
     
     def _market_maker_strategy(self, market_data):
         """Liquidity provision and spread capture"""
-        if random.random() > 0.75:  # 25% chance to provide liquidity
-            symbol = random.choice(['ETH', 'BNB'])
-            action = 'market_make'
-            return {'symbol': symbol, 'action': action, 'confidence': 0.80}
-        return None
+        books = [order_books.get(symbol) for symbol in MARKET_MAKER_SYMBOLS]
+        books = [book for book in books if book.synced and book.mid()]
+        if not books:
+            # No live depth yet: simulated decision
+            if self.rng.random() > 0.75:  # 25% chance to provide liquidity
+                symbol = self.rng.choice(['ETH', 'BNB'])
+                action = 'market_make'
+                return {'symbol': symbol, 'action': action, 'confidence': 0.80}
+            return None
+        
+        # Quote the widest spread whose top of book is not dominated by one side
+        # (one-sided depth means the quote on the thin side is about to be run over)
+        candidates = []
+        for book in books:
+            imbalance = book.imbalance(MARKET_MAKER_DEPTH_LEVELS)
+            spread_bps = book.spread_bps()
+            if spread_bps >= MARKET_MAKER_MIN_SPREAD_BPS and abs(imbalance) <= MARKET_MAKER_MAX_IMBALANCE:
+                candidates.append((spread_bps * (1 - abs(imbalance)), book, spread_bps, imbalance))
+        if not candidates:
+            return None
+        
+        _, book, spread_bps, imbalance = max(candidates, key=lambda candidate: candidate[0])
+        return {
+            'symbol': book.symbol.upper(),
+            'action': 'market_make',
+            'confidence': round(0.80 + 0.15 * (1 - abs(imbalance) / MARKET_MAKER_MAX_IMBALANCE), 2),
+            'spread_bps': round(spread_bps, 3),
+            'imbalance': round(imbalance, 3),
+            'microprice': book.microprice()
+        }
     
     def _calculate_profit(self, trade_signal, amount, market_data):
         """Calculate realistic profit based on strategy and market conditions"""
@@ -158,12 +291,12 @@ class TradingBot:
         confidence_bonus = trade_signal.get('confidence', 0.5)
         
         # Add some randomness for realism
-        random_factor = random.uniform(0.5, 1.8)
+        random_factor = self._profit_factor()
         
         profit = base_profit * multiplier * confidence_bonus * random_factor
         
         # Sometimes trades lose money (realistic)
-        if random.random() < 0.25:  # 25% chance of loss
+        if self.rng.random() < 0.25:  # 25% chance of loss
             profit = -abs(profit) * 0.5
             
         return round(profit, 2)
@@ -204,8 +337,38 @@ trading_bots = [
     TradingBot(5, 'Market Maker', 'market_maker', 3500)
 ]
 
+def bots_version():
+    """Moves whenever any bot changes (every bot's counter only goes up)"""
+    return sum(bot.version for bot in trading_bots)
+
+def bot_by_id(bot_id):
+    return next((bot for bot in trading_bots if bot.id == bot_id), None)
+
 # Global state
 trading_active = True
+
+# Background loop intervals in seconds (ENGINE_TICK_SECONDS=0 keeps the random 5-15 s cadence)
+ENGINE_TICK_SECONDS = float(os.environ.get('ENGINE_TICK_SECONDS', 0))
+METRICS_EMIT_SECONDS = float(os.environ.get('METRICS_EMIT_SECONDS', 3))
+PRICE_EMIT_SECONDS = float(os.environ.get('PRICE_EMIT_SECONDS', 30))
+
+# Market maker quoting thresholds on the live order books
+MARKET_MAKER_SYMBOLS = ('eth', 'bnb')
+MARKET_MAKER_DEPTH_LEVELS = int(os.environ.get('MARKET_MAKER_DEPTH_LEVELS', 5))
+MARKET_MAKER_MIN_SPREAD_BPS = float(os.environ.get('MARKET_MAKER_MIN_SPREAD_BPS', 0))
+MARKET_MAKER_MAX_IMBALANCE = float(os.environ.get('MARKET_MAKER_MAX_IMBALANCE', 0.6))
+
+# performance_24h ages without a trade, so the bots status ETag also rolls over this often
+BOTS_STATUS_ETAG_SECONDS = float(os.environ.get('BOTS_STATUS_ETAG_SECONDS', 60))
+
+# Arbitrage: minimum edge after fees, and how long a venue quote stays usable
+ARBITRAGE_MIN_PROFIT_BPS = float(os.environ.get('ARBITRAGE_MIN_PROFIT_BPS', 1))
+ARBITRAGE_MAX_QUOTE_AGE = float(os.environ.get('ARBITRAGE_MAX_QUOTE_AGE', 60))
+ARBITRAGE_REFERENCE_SECONDS = float(os.environ.get('ARBITRAGE_REFERENCE_SECONDS', 30))
+
+# Risk manager: hedge while the Monte Carlo VaR at this confidence exceeds this share of the portfolio
+RISK_CONFIDENCE = 0.99
+RISK_VAR_LIMIT = float(os.environ.get('RISK_VAR_LIMIT', 0.05))
 system_data = {
     'portfolio': {
         'totalValue': 125847.32,
@@ -213,152 +376,196 @@ system_data = {
         'eth': {'amount': 5.2134, 'value': 14598.45},
         'bnb': {'amount': 2.1087, 'value': 792.09},
         'bsCoin': {'amount': 15847.23, 'value': 0}
-    }
+    },
+    'withdrawn': 0.0  # accepted PayPal withdrawals, less refunds
 }
 
+def portfolio_holdings():
+    """{symbol: amount} for the portfolio's priced coins"""
+    return {symbol: position['amount'] for symbol, position in system_data['portfolio'].items()
+            if isinstance(position, dict)}
+
 # Enhanced Cryptocurrency price provider
 class EnhancedCryptoProvider:
     def __init__(self):
-        self.base_prices = {'btc': 45000, 'eth': 2800, 'bnb': 350}
+        self.coins = coin_registry.tracked()
+        self.base_prices = {coin.symbol: coin.reference_price for coin in self.coins}
         self.last_prices = self.base_prices.copy()
         self.price_history = []
+        self.rng = simulation_rng.stream('feed:enhanced_prices')
+        self._price_change = self.rng.sampler(-0.05, 0.05)
+        self._change_24h = self.rng.sampler(-10, 10)
+        self._volume_24h = self.rng.sampler(1000000, 10000000)
+        self._supply = self.rng.sampler(18000000, 21000000)
     
     def get_current_prices(self):
         """Get real-time prices with enhanced market data"""
+        # Streamed quotes are milliseconds old; REST is only needed while the stream is down
+        if market_stream.fresh(list(self.base_prices)):
+            return self._record(market_stream.snapshot())
+        
         try:
-            response = requests.get(
-                'https://api.coingecko.com/api/v3/simple/price',
-                params={
-                    'ids': 'bitcoin,ethereum,binancecoin',
-                    'vs_currencies': 'usd',
-                    'include_24hr_change': 'true',
-                    'include_24hr_vol': 'true',
-                    'include_market_cap': 'true'
-                },
-                timeout=5
-            )
+            prices = fetch_coingecko_quotes(self.coins, timeout=5)
             
-            if response.status_code == 200:
-                data = response.json()
-                prices = {
-                    'btc': {
-                        'price': data.get('bitcoin', {}).get('usd', self.base_prices['btc']),
-                        'change_24h': data.get('bitcoin', {}).get('usd_24h_change', 0),
-                        'volume_24h': data.get('bitcoin', {}).get('usd_24h_vol', 0),
-                        'market_cap': data.get('bitcoin', {}).get('usd_market_cap', 0)
-                    },
-                    'eth': {
-                        'price': data.get('ethereum', {}).get('usd', self.base_prices['eth']),
-                        'change_24h': data.get('ethereum', {}).get('usd_24h_change', 0),
-                        'volume_24h': data.get('ethereum', {}).get('usd_24h_vol', 0),
-                        'market_cap': data.get('ethereum', {}).get('usd_market_cap', 0)
-                    },
-                    'bnb': {
-                        'price': data.get('binancecoin', {}).get('usd', self.base_prices['bnb']),
-                        'change_24h': data.get('binancecoin', {}).get('usd_24h_change', 0),
-                        'volume_24h': data.get('binancecoin', {}).get('usd_24h_vol', 0),
-                        'market_cap': data.get('binancecoin', {}).get('usd_market_cap', 0)
-                    }
-                }
-                
-                # Update price history
-                self.price_history.append({
-                    'timestamp': datetime.now().isoformat(),
-                    'prices': prices
-                })
-                
-                # Keep only last 1000 price points
-                if len(self.price_history) > 1000:
-                    self.price_history = self.price_history[-1000:]
-                
-                self.last_prices = {k: v['price'] for k, v in prices.items()}
-                return prices
+            if prices:
+                return self._record(prices)
         except Exception as e:
             print(f"Error fetching real prices: {e}")
         
         # Fallback to simulated prices with enhanced data
         prices = {}
         for coin, base_price in self.base_prices.items():
-            change = random.uniform(-0.05, 0.05)
+            change = self._price_change()
             new_price = self.last_prices[coin] * (1 + change)
             prices[coin] = {
                 'price': new_price,
-                'change_24h': random.uniform(-10, 10),
-                'volume_24h': random.uniform(1000000, 10000000),
-                'market_cap': new_price * random.uniform(18000000, 21000000)
+                'change_24h': self._change_24h(),
+                'volume_24h': self._volume_24h(),
+                'market_cap': new_price * self._supply()
             }
             self.last_prices[coin] = new_price
         
         return prices
+    
+    def _record(self, prices):
+        # Coins missing from a partial answer keep their last known price
+        for symbol, last_price in self.last_prices.items():
+            prices.setdefault(symbol, {
+                'price': last_price, 'change_24h': 0, 'volume_24h': 0, 'market_cap': 0
+            })
+        
+        # Update price history
+        self.price_history.append({
+            'timestamp': datetime.now().isoformat(),
+            'prices': prices
+        })
+        
+        # Keep only last 1000 price points
+        if len(self.price_history) > 1000:
+            self.price_history = self.price_history[-1000:]
+        
+        self.last_prices = {k: v['price'] for k, v in prices.items()}
+        return prices
 
 crypto_provider = EnhancedCryptoProvider()
 
-# PayPal Integration Functions
-def create_paypal_payout(email, amount, currency='USD'):
-    """Create a PayPal payout to user's email"""
-    try:
-        payout = paypalrestsdk.Payout({
-            "sender_batch_header": {
-                "sender_batch_id": f"batch_{int(time.time())}",
-                "email_subject": "Black Sultan OS - Withdrawal Payout"
-            },
-            "items": [{
-                "recipient_type": "EMAIL",
-                "amount": {
-                    "value": str(amount),
-                    "currency": currency
-                },
-                "receiver": email,
-                "note": f"Withdrawal from Black Sultan OS Trading Platform",
-                "sender_item_id": f"item_{int(time.time())}"
-            }]
-        })
-        
-        if payout.create():
-            return {
-                'success': True,
-                'payout_batch_id': payout.batch_header.payout_batch_id,
-                'status': payout.batch_header.batch_status
-            }
-        else:
-            return {
-                'success': False,
-                'error': payout.error
-            }
-    except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
+# Engine state is snapshotted in the background and restored on boot
+def capture_state():
+    return {
+        'trading_active': trading_active,
+        'system_data': copy.deepcopy(system_data),
+        'bots': {bot.id: capture_fields(bot) for bot in trading_bots},
+        'prices': {
+            'last_prices': crypto_provider.last_prices,
+            'price_history': list(crypto_provider.price_history)
         }
+    }
+
+def restore_state(state):
+    global trading_active
+    trading_active = state['trading_active']
+    system_data.update(state['system_data'])
+    bots = {bot.id: bot for bot in trading_bots}
+    for bot_id, bot_state in state['bots'].items():
+        if bot_id in bots:
+            restore_fields(bots[bot_id], bot_state)
+    crypto_provider.last_prices.update(state['prices']['last_prices'])
+    crypto_provider.price_history = state['prices']['price_history']
+
+state_snapshots = StateSnapshotter(state_path('main_enhanced'), capture_state, restore_state)
+
+# PayPal payouts are coalesced into multi-item batches
+payout_queue = PayoutQueue(
+    PayPalSDKPayoutService(paypal_sdk), window=PAYOUT_BATCH_WINDOW, max_batch=PAYOUT_MAX_BATCH
+)
+
+# Withdrawals are accepted into a durable job queue and paid out by background workers
+jobs = JobQueue(jobs_path('main_enhanced'), workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS)
+# How long a worker waits on one payout before checking again later (well under the lease)
+PAYOUT_WAIT_SECONDS = jobs.lease_seconds / 4
+
+def process_withdrawal(payload, job):
+    """Pay one accepted withdrawal out through the batched payout queue"""
+    # Keyed by the job, so every attempt (even after a restart) sends the same sender_item_id
+    amount = parse_amount(payload.get('amount'))
+    if not payload.get('email') or amount is None:
+        raise PermanentJobError(f"Invalid withdrawal payload: {payload!r}")
+    item = payout_queue.submit(
+        payload['email'], amount, idempotency_key=job['id'],
+        # The provider deduplicates per batch: an item sent before goes out again in that batch only
+        batch_id=job['checkpoint'].get('sender_batch_id'),
+        on_batched=lambda item: jobs.checkpoint(job['id'], sender_batch_id=item.batch_id)
+    )
+    # Give up waiting well inside the job's lease, so no other worker reclaims it meanwhile
+    if not item.wait(PAYOUT_WAIT_SECONDS):
+        # JobPending uses up no attempt, so an unanswered payout needs a limit of its own
+        pending_for = time.time() - job['created_at']
+        if pending_for < PAYOUT_MAX_PENDING_SECONDS or not payout_queue.abandon(
+                item, f"Payout still {item.status} after {pending_for:.0f}s"):
+            raise JobPending(f"Payout {item.id} is still {item.status}")
+    if item.status == FAILED:
+        raise PermanentJobError(item.error or 'PayPal payout failed')
+    return {'payout_batch_id': item.payout_batch_id, 'payout_item_id': item.id, 'payout_status': item.status}
+
+jobs.register('paypal_withdrawal', process_withdrawal)
+withdraw_lock = threading.Lock()
+
+def _adjust_withdrawn(amount):
+    system_data['withdrawn'] += amount
+    system_data['portfolio']['totalValue'] -= amount
+    # Snapshot now, not at the next interval: jobs.db already holds the withdrawal durably
+    try:
+        state_snapshots.save()
+    except Exception:
+        logger.exception("Error writing state snapshot after a withdrawal")
+
+@jobs.add_listener
+def settle_withdrawal(job):
+    """Settle the portfolio as a withdrawal job moves along and push its status to clients"""
+    if job['kind'] != 'paypal_withdrawal':
+        return
+    if job['status'] == JOB_QUEUED:
+        # Deduct on accept so concurrent withdrawals cannot overdraw the portfolio
+        _adjust_withdrawn(job['payload']['amount'])
+    elif job['status'] == JOB_FAILED:
+        _adjust_withdrawn(-job['payload']['amount'])
+    timed_emit(socketio, 'withdrawal_status', job)
 
 # Routes
-@app.route('/')
+@enhanced_bp.route('/')
 def serve_frontend():
-    return send_from_directory(app.static_folder, 'index.html')
+    return static_assets.send('index.html')
 
-@app.route('/<path:path>')
+@enhanced_bp.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory(app.static_folder, path)
+    return static_assets.send(path)
 
-@app.route('/api/health')
+@enhanced_bp.route('/api/health')
 def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
 
-@app.route('/api/bots/status')
+@enhanced_bp.route('/api/bots/status')
+@conditional(lambda: state_etag('bots', bots_version(), int(time.time() // BOTS_STATUS_ETAG_SECONDS)))
 def get_bots_status():
     """Get current status of all trading bots"""
     return jsonify([bot.get_status() for bot in trading_bots])
 
-@app.route('/api/bot/<int:bot_id>/toggle', methods=['POST'])
+@enhanced_bp.route('/api/bot/<int:bot_id>/toggle', methods=['POST'])
 def toggle_bot(bot_id):
     """Toggle bot status between active and paused"""
     for bot in trading_bots:
         if bot.id == bot_id:
+            bot.touch()
             bot.status = 'paused' if bot.status == 'active' else 'active'
             return jsonify({'success': True, 'bot': bot.get_status()})
     return jsonify({'success': False, 'error': 'Bot not found'}), 404
 
-@app.route('/api/bot/<int:bot_id>/performance')
+def _bot_performance_etag(bot_id):
+    bot = bot_by_id(bot_id)
+    return state_etag('bot', bot_id, bot.version) if bot else None
+
+@enhanced_bp.route('/api/bot/<int:bot_id>/performance')
+@conditional(_bot_performance_etag)
 def get_bot_performance(bot_id):
     """Get detailed performance data for a specific bot"""
     for bot in trading_bots:
@@ -372,36 +579,55 @@ def get_bot_performance(bot_id):
             })
     return jsonify({'success': False, 'error': 'Bot not found'}), 404
 
-@app.route('/api/wallet/withdraw/paypal', methods=['POST'])
+@enhanced_bp.route('/api/wallet/withdraw/paypal', methods=['POST'])
 def withdraw_paypal():
     """Process PayPal withdrawal"""
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     email = data.get('email')
-    amount = data.get('amount', 100)
+    amount = parse_amount(data.get('amount'))
     
     if not email:
         return jsonify({'success': False, 'error': 'Email required for PayPal withdrawal'}), 400
+    if amount is None:
+        return jsonify({'success': False, 'error': 'Amount must be a positive number'}), 400
     
-    # Create PayPal payout
-    payout_result = create_paypal_payout(email, amount)
-    
-    if payout_result['success']:
-        return jsonify({
-            'success': True,
-            'payout_batch_id': payout_result['payout_batch_id'],
-            'status': payout_result['status'],
-            'amount': amount,
-            'email': email,
-            'processing_time': '1-3 business days',
-            'message': f'PayPal payout of ${amount} initiated to {email}'
-        })
-    else:
-        return jsonify({
-            'success': False,
-            'error': payout_result['error']
-        }), 500
+    with withdraw_lock:
+        if amount > system_data['portfolio']['totalValue']:
+            return jsonify({'success': False, 'error': 'Insufficient funds'}), 400
+        
+        # Accept the withdrawal; the payout happens on a job worker, not on this request thread
+        job = jobs.enqueue(
+            'paypal_withdrawal', {'email': email, 'amount': amount},
+            idempotency_key=request.headers.get('Idempotency-Key')
+        )
+    status_url = url_for('.withdrawal_status', job_id=job['id'])
+    return jsonify({
+        'success': True,
+        'job': job,
+        'status_url': status_url,
+        'amount': amount,
+        'email': email,
+        'processing_time': '1-3 business days',
+        'message': f'PayPal payout of ${amount} accepted for {email}'
+    }), 202, {'Location': status_url}
+
+@enhanced_bp.route('/api/wallet/withdrawals/<job_id>')
+def withdrawal_status(job_id):
+    """Status of one accepted PayPal withdrawal"""
+    job = jobs.get(job_id)
+    if job is None or job['kind'] != 'paypal_withdrawal':
+        return jsonify({'success': False, 'error': 'Withdrawal not found'}), 404
+    return jsonify({'success': True, 'job': job})
 
-@app.route('/api/wallet/withdraw', methods=['POST'])
+@enhanced_bp.route('/api/wallet/payouts/<item_id>')
+def payout_status(item_id):
+    """Status of one queued PayPal payout item"""
+    item = payout_queue.get(item_id)
+    if item is None:
+        return jsonify({'success': False, 'error': 'Payout not found'}), 404
+    return jsonify({'success': True, 'payout': item.to_dict()})
+
+@enhanced_bp.route('/api/wallet/withdraw', methods=['POST'])
 def withdraw():
     """Process regular cryptocurrency withdrawal"""
     data = request.get_json()
@@ -421,7 +647,7 @@ def withdraw():
         'estimated_arrival': 'Within 72 hours'
     })
 
-@app.route('/api/wallet/deposit', methods=['POST'])
+@enhanced_bp.route('/api/wallet/deposit', methods=['POST'])
 def deposit():
     """Generate deposit address"""
     data = request.get_json()
@@ -441,7 +667,8 @@ def deposit():
         'estimated_confirmation_time': '10-30 minutes'
     })
 
-@app.route('/api/trading/history')
+@enhanced_bp.route('/api/trading/history')
+@conditional(lambda: state_etag('history', bots_version()))
 def get_trading_history():
     """Get aggregated trading history from all bots"""
     all_trades = []
@@ -459,7 +686,20 @@ def get_trading_history():
     all_trades.sort(key=lambda x: x['time'])
     return jsonify(all_trades[-24:])  # Last 24 trades
 
-@app.route('/api/analytics/notifications')
+@enhanced_bp.route('/api/risk')
+def get_risk_report():
+    """Historical and Monte Carlo VaR/CVaR, risk contributions and stress losses for the portfolio"""
+    report = risk_engine.report(crypto_provider.price_history, portfolio_holdings())
+    if report is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not enough price history yet',
+            'observations': len(crypto_provider.price_history),
+            'required': risk_engine.min_observations
+        }), 503
+    return jsonify({'success': True, **report})
+
+@enhanced_bp.route('/api/analytics/notifications')
 def get_notifications():
     """Get system notifications including bot activities"""
     notifications = []
@@ -490,12 +730,14 @@ def get_notifications():
 @socketio.on('connect')
 def handle_connect():
     print('Client connected')
+    SOCKETIO_CLIENTS.inc()
+    metrics = system_sampler.latest()
     emit('system_status', {
         'trading_active': trading_active,
         'system_metrics': {
-            'cpu': random.uniform(20, 80),
-            'memory': random.uniform(30, 70),
-            'network': random.uniform(100, 1000),
+            'cpu': metrics['host_cpu_percent'],
+            'memory': metrics['memory_percent'],
+            'network': (metrics['net_rx_bytes_per_sec'] + metrics['net_tx_bytes_per_sec']) / 1024,
             'trades': sum(bot.trades for bot in trading_bots)
         },
         'portfolio': system_data['portfolio'],
@@ -505,11 +747,15 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
+    SOCKETIO_CLIENTS.dec()
 
 # Background tasks
 def bot_trading_engine():
     """Main trading engine that runs all bots"""
+    tick = TickTimer('bot_trading_engine')
+    rng = simulation_rng.stream('engine:bot_trading_engine')
     while True:
+        tick.start()
         if trading_active:
             try:
                 # Get current market data
@@ -518,61 +764,138 @@ def bot_trading_engine():
                 # Execute trades for each active bot
                 for bot in trading_bots:
                     if bot.status == 'active':
-                        trade_result = bot.execute_trade(market_data)
+                        with TRADE_EXECUTION_SECONDS.labels(bot.strategy).time():
+                            trade_result = bot.execute_trade(market_data)
                         if trade_result:
                             # Emit trade execution to frontend
-                            socketio.emit('trade_executed', trade_result)
+                            timed_emit(socketio, 'trade_executed', trade_result)
                             
                             # Update portfolio value based on bot profits
                             total_bot_profit = sum(bot.profit for bot in trading_bots)
-                            system_data['portfolio']['totalValue'] = 125847.32 + total_bot_profit
+                            system_data['portfolio']['totalValue'] = 125847.32 + total_bot_profit - system_data['withdrawn']
                 
                 # Emit updated bot statuses
-                socketio.emit('bots_update', [bot.get_status() for bot in trading_bots])
+                timed_emit(socketio, 'bots_update', [bot.get_status() for bot in trading_bots])
                 
             except Exception as e:
                 print(f"Error in trading engine: {e}")
         
-        time.sleep(random.uniform(5, 15))  # Random interval between 5-15 seconds
+        delay = ENGINE_TICK_SECONDS or rng.uniform(5, 15)  # Random interval between 5-15 seconds
+        tick.finish(delay)
+        time.sleep(delay)
 
 def update_system_metrics():
     """Update system performance metrics"""
     while True:
         total_trades = sum(bot.trades for bot in trading_bots)
         active_bots = len([bot for bot in trading_bots if bot.status == 'active'])
+        metrics = system_sampler.latest()
         
         system_metrics = {
-            'cpu': random.uniform(20, 80),
-            'memory': random.uniform(30, 70),
-            'network': random.uniform(100, 1000),
+            'cpu': metrics['host_cpu_percent'],
+            'memory': metrics['memory_percent'],
+            'network': (metrics['net_rx_bytes_per_sec'] + metrics['net_tx_bytes_per_sec']) / 1024,
+            'process_cpu': metrics['process_cpu_percent'],
+            'rss_mb': round(metrics['rss_bytes'] / 1048576, 1),
+            'threads': metrics['threads'],
+            'open_sockets': metrics['open_sockets'],
             'trades': total_trades,
             'active_bots': active_bots,
             'total_profit': sum(bot.profit for bot in trading_bots)
         }
-        socketio.emit('system_metrics', system_metrics)
-        time.sleep(3)
+        timed_emit(socketio, 'system_metrics', system_metrics)
+        time.sleep(METRICS_EMIT_SECONDS)
 
 def update_prices():
     """Update cryptocurrency prices"""
     while True:
         try:
             prices_data = crypto_provider.get_current_prices()
-            prices = {
-                'btc': prices_data['btc']['price'],
-                'eth': prices_data['eth']['price'],
-                'bnb': prices_data['bnb']['price'],
-                'timestamp': datetime.now().isoformat()
-            }
-            socketio.emit('price_update', prices)
+            prices = {symbol: quote['price'] for symbol, quote in prices_data.items()}
+            prices['timestamp'] = datetime.now().isoformat()
+            timed_emit(socketio, 'price_update', prices)
         except Exception as e:
             print(f"Error updating prices: {e}")
-        time.sleep(30)
+        time.sleep(PRICE_EMIT_SECONDS)
 
-# Start background tasks
-threading.Thread(target=bot_trading_engine, daemon=True).start()
-threading.Thread(target=update_system_metrics, daemon=True).start()
-threading.Thread(target=update_prices, daemon=True).start()
+# The arbitrage graph sees Binance through its streams and CoinGecko through a slow poll
+@market_stream.add_listener
+def feed_arbitrage_tickers(quotes):
+    # Symbols with a live book are quoted at its bid/ask instead of the last trade
+    arbitrage_scanner.update_quotes('binance', {
+        symbol: quote for symbol, quote in quotes.items() if not order_books.get(symbol).synced
+    })
+
+@depth_stream.add_listener
+def feed_arbitrage_books(tops):
+    arbitrage_scanner.update_quotes('binance', tops)
+
+def update_arbitrage_reference():
+    """Keep a second venue's quotes in the arbitrage graph while the stream replaces REST polling"""
+    while True:
+        try:
+            arbitrage_scanner.update_quotes('coingecko', fetch_coingecko_quotes(
+                coin_registry.tracked(), timeout=10, priority=PRIORITY_DEFAULT
+            ))
+        except Exception as e:
+            print(f"Error updating arbitrage reference quotes: {e}")
+        time.sleep(ARBITRAGE_REFERENCE_SECONDS)
+
+def create_app():
+    """Build the Flask app with every route, socket handler and static file; starts nothing"""
+    app = Flask(__name__, static_folder=static_assets.static_folder)
+    app.config['SECRET_KEY'] = 'black-sultan-os-secret-key-2024'
+    configure_database(app)
+    CORS(app, origins="*")
+    socketio.init_app(app)
+    static_assets.init_app(app)
+    app.register_blueprint(enhanced_bp)
+    app.register_blueprint(crypto_api.crypto_api_bp, url_prefix='/api')
+    app.register_blueprint(system_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(admin_bp, url_prefix='/api')
+    app.register_blueprint(user_bp, url_prefix='/api')
+    install_request_metrics(app)
+    install_compression(app)
+    return app
+
+def __getattr__(name):
+    # `main_enhanced.app` for WSGI servers and tools: built on first access, not on import
+    global app
+    if name == 'app':
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_services_started = False
+_services_lock = threading.Lock()
+
+def start_background_services():
+    """Resume from the last snapshot and start every background task (once per process)"""
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+    
+    # Resume where the last run stopped, then keep snapshotting
+    if state_snapshots.restore():
+        logger.info(f"Engine state restored from {state_snapshots.path} ({state_snapshots.restored_at})")
+    state_snapshots.start()
+    
+    system_sampler.start()
+    paypal_tokens.start()
+    jobs.start()
+    crypto_api.start_price_updates()
+    market_stream.start()
+    depth_stream.start()
+    threading.Thread(target=bot_trading_engine, name='bot-trading-engine', daemon=True).start()
+    threading.Thread(target=update_system_metrics, name='system-metrics-emitter', daemon=True).start()
+    threading.Thread(target=update_prices, name='price-updater', daemon=True).start()
+    threading.Thread(target=update_arbitrage_reference, name='arbitrage-reference', daemon=True).start()
 
 if __name__ == '__main__':
+    app = create_app()
+    start_background_services()
     port = int(os.environ.get('PORT', 5000))
     socketio.run(app, host='0.0.0.0', port=port, debug=False)
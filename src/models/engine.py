@@ -0,0 +1,167 @@
+"""
+Database engine layer for the SQLite store in src/database/app.db
+
+Applies WAL journaling and tuned pragmas on every new connection, sizes the
+connection pool, enables compiled-statement caching and logs slow queries.
+Every setting can be overridden with a DB_* environment variable. The app
+factory calls it:
+
+    from src.models.engine import configure_database
+    configure_database(app)
+"""
+
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database')
+DEFAULT_DATABASE_URI = f"sqlite:///{os.path.join(DATABASE_DIR, 'app.db')}"
+
+DEFAULT_SETTINGS = {
+    'journal_mode': 'WAL',           # readers no longer block behind a writer
+    'synchronous': 'NORMAL',         # safe with WAL, one fsync per checkpoint
+    'cache_size_kib': 65536,         # page cache per connection
+    'mmap_size': 268435456,          # 256 MiB memory-mapped reads
+    'busy_timeout_ms': 5000,
+    'temp_store': 'MEMORY',
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_timeout': 10,
+    'pool_recycle': 3600,
+    'statement_cache_size': 256,     # sqlite3 prepared statements per connection
+    'query_cache_size': 1200,        # SQLAlchemy compiled-statement cache
+    'slow_query_ms': 100,
+}
+
+# Query timing counters, see get_query_stats()
+_stats_lock = threading.Lock()
+_query_stats = {'queries': 0, 'slow_queries': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+
+def load_settings(**overrides):
+    """Merge defaults, DB_* environment variables and explicit overrides"""
+    settings = dict(DEFAULT_SETTINGS)
+    for key, default in DEFAULT_SETTINGS.items():
+        value = os.environ.get(f'DB_{key.upper()}')
+        if value is not None:
+            settings[key] = type(default)(value)
+    settings.update(overrides)
+    return settings
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def build_engine_options(uri, settings):
+    """SQLAlchemy create_engine() keyword arguments for the given database URI"""
+    url = make_url(uri)
+    options = {
+        'query_cache_size': settings['query_cache_size'],
+    }
+
+    if url.get_backend_name() != 'sqlite':
+        # A local SQLite file cannot drop a connection; elsewhere, test it on checkout
+        options['pool_pre_ping'] = True
+    else:
+        options['connect_args'] = {
+            'check_same_thread': False,
+            'cached_statements': settings['statement_cache_size'],
+            'timeout': settings['busy_timeout_ms'] / 1000,
+        }
+
+    # In-memory SQLite uses a single shared connection, so there is no pool to size
+    if not _is_memory_sqlite(url):
+        options.update({
+            'pool_size': settings['pool_size'],
+            'max_overflow': settings['max_overflow'],
+            'pool_timeout': settings['pool_timeout'],
+            'pool_recycle': settings['pool_recycle'],
+        })
+
+    return options
+
+def _apply_sqlite_pragmas(settings):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA journal_mode={settings['journal_mode']}")
+            cursor.execute(f"PRAGMA synchronous={settings['synchronous']}")
+            cursor.execute(f"PRAGMA cache_size=-{int(settings['cache_size_kib'])}")
+            cursor.execute(f"PRAGMA mmap_size={int(settings['mmap_size'])}")
+            cursor.execute(f"PRAGMA busy_timeout={int(settings['busy_timeout_ms'])}")
+            cursor.execute(f"PRAGMA temp_store={settings['temp_store']}")
+            cursor.execute("PRAGMA foreign_keys=ON")
+        finally:
+            cursor.close()
+    return on_connect
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+def _log_slow_queries(threshold_ms):
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info['query_start_time'].pop()) * 1000
+        slow = elapsed_ms >= threshold_ms
+
+        with _stats_lock:
+            _query_stats['queries'] += 1
+            _query_stats['total_ms'] += elapsed_ms
+            _query_stats['max_ms'] = max(_query_stats['max_ms'], elapsed_ms)
+            if slow:
+                _query_stats['slow_queries'] += 1
+
+        if slow:
+            logger.warning(
+                "Slow query (%.1f ms%s): %s",
+                elapsed_ms, ', executemany' if executemany else '', ' '.join(statement.split())[:500]
+            )
+    return after_cursor_execute
+
+def _discard_failed_query_timer(context):
+    # A statement that raised never reaches after_cursor_execute; drop its start time
+    if context.execution_context is not None and context.connection is not None:
+        starts = context.connection.info.get('query_start_time')
+        if starts:
+            starts.pop()
+
+def install_engine_listeners(engine, settings):
+    """Attach pragma and timing listeners to an engine before it hands out connections"""
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _apply_sqlite_pragmas(settings))
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _log_slow_queries(settings['slow_query_ms']))
+    event.listen(engine, 'handle_error', _discard_failed_query_timer)
+
+def configure_database(app, create_tables=True, **overrides):
+    """Bind the shared ``db`` to ``app`` with the tuned engine configuration"""
+    settings = load_settings(**overrides)
+    uri = app.config.setdefault('SQLALCHEMY_DATABASE_URI', DEFAULT_DATABASE_URI)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **build_engine_options(uri, settings),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+    }
+
+    db.init_app(app)
+    with app.app_context():
+        install_engine_listeners(db.engine, settings)
+        if create_tables:
+            db.create_all()
+
+    logger.info(
+        "Database engine ready: %s (journal=%s, pool=%s+%s)",
+        uri, settings['journal_mode'], settings['pool_size'], settings['max_overflow']
+    )
+    return settings
+
+def get_query_stats():
+    """Snapshot of query counters since process start"""
+    with _stats_lock:
+        stats = dict(_query_stats)
+    stats['avg_ms'] = stats['total_ms'] / stats['queries'] if stats['queries'] else 0.0
+    return stats
@@ -0,0 +1,54 @@
+import hmac
+import math
+import os
+from flask import Blueprint, Response, jsonify, request
+from src.services.profiler import ProfilerBusy, StackSampler
+
+admin_bp = Blueprint('admin', __name__)
+
+def _authorized():
+    """ADMIN_TOKEN via X-Admin-Token or Bearer; nobody when no token is configured.
+
+    The client address is not trusted: behind a local reverse proxy every
+    request arrives from loopback.
+    """
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token:
+        return False
+    supplied = request.headers.get('X-Admin-Token', '')
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        supplied = auth[len('Bearer '):]
+    return hmac.compare_digest(supplied.encode(), token.encode())
+
+@admin_bp.route('/admin/profile', methods=['POST', 'GET'])
+def profile():
+    """Sample every thread's stack for ``seconds`` and return collapsed stacks.
+
+    ``format=collapsed`` (default) returns flamegraph input as text;
+    ``format=json`` returns the per-thread breakdown with the collapsed text.
+    """
+    if not _authorized():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+    seconds = request.args.get('seconds', 10, type=float)
+    interval_ms = request.args.get('interval_ms', 5, type=float)
+    fmt = request.args.get('format', 'collapsed')
+    if not (math.isfinite(seconds) and math.isfinite(interval_ms)) or seconds <= 0 or interval_ms <= 0:
+        return jsonify({'success': False, 'error': 'seconds and interval_ms must be positive numbers'}), 400
+
+    try:
+        result = StackSampler(interval=interval_ms / 1000).profile(seconds)
+    except ProfilerBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+    if fmt == 'json':
+        return jsonify({
+            'success': True,
+            'profile': result.to_dict(top=request.args.get('top', 15, type=int)),
+            'collapsed': result.collapsed()
+        })
+    return Response(result.collapsed(), mimetype='text/plain', headers={
+        'X-Profile-Samples': str(result.samples),
+        'X-Profile-Duration': f'{result.duration:.3f}'
+    })
@@ -1,9 +1,21 @@
 import requests
 import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 import threading
 import json
+import os
+import itertools
+import numpy as np
+from src.services.coins import coin_registry, fetch_binance_quotes, fetch_coingecko_quotes
+from src.services.downsample import METHODS as DOWNSAMPLE_METHODS, downsample
+from src.services.http_cache import not_modified, state_etag
+from src.services.market_stream import market_stream
+from src.services.metrics import record_cache
+from src.services.quotes import AllSourcesFailed, HedgedQuoteFetcher, QuoteSource
+from src.services.rate_limit import PRIORITY_BACKFILL, PRIORITY_DEFAULT
+from src.services.upstream import fetch
 
 crypto_api_bp = Blueprint('crypto_api', __name__)
 
@@ -16,96 +28,40 @@ class CryptoDataProvider:
     def __init__(self):
         self.coingecko_base = "https://api.coingecko.com/api/v3"
         self.binance_base = "https://api.binance.com/api/v3"
-        self.last_request_time = 0
-        self.rate_limit_delay = 1  # seconds between requests
         
-    def get_coingecko_prices(self, coins=['bitcoin', 'ethereum', 'binancecoin']):
+    def _coins(self, symbols=None):
+        if symbols is None:
+            return coin_registry.tracked()
+        return [coin for coin in map(coin_registry.get, symbols) if coin is not None]
+    
+    def fetch_coingecko_prices(self, symbols=None):
+        """Current prices from CoinGecko API (free tier); raises on failure"""
+        # Batched by URL size, rate limited in fetch() together with every other CoinGecko caller
+        return fetch_coingecko_quotes(self._coins(symbols), base_url=self.coingecko_base)
+    
+    def get_coingecko_prices(self, symbols=None):
         """Get current prices from CoinGecko API (free tier)"""
         try:
-            # Rate limiting
-            current_time = time.time()
-            if current_time - self.last_request_time < self.rate_limit_delay:
-                time.sleep(self.rate_limit_delay)
-            
-            coins_str = ','.join(coins)
-            url = f"{self.coingecko_base}/simple/price"
-            params = {
-                'ids': coins_str,
-                'vs_currencies': 'usd',
-                'include_24hr_change': 'true',
-                'include_24hr_vol': 'true',
-                'include_market_cap': 'true'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            self.last_request_time = time.time()
-            
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    'btc': {
-                        'price': data.get('bitcoin', {}).get('usd', 45000),
-                        'change_24h': data.get('bitcoin', {}).get('usd_24h_change', 0),
-                        'volume_24h': data.get('bitcoin', {}).get('usd_24h_vol', 0),
-                        'market_cap': data.get('bitcoin', {}).get('usd_market_cap', 0)
-                    },
-                    'eth': {
-                        'price': data.get('ethereum', {}).get('usd', 2800),
-                        'change_24h': data.get('ethereum', {}).get('usd_24h_change', 0),
-                        'volume_24h': data.get('ethereum', {}).get('usd_24h_vol', 0),
-                        'market_cap': data.get('ethereum', {}).get('usd_market_cap', 0)
-                    },
-                    'bnb': {
-                        'price': data.get('binancecoin', {}).get('usd', 350),
-                        'change_24h': data.get('binancecoin', {}).get('usd_24h_change', 0),
-                        'volume_24h': data.get('binancecoin', {}).get('usd_24h_vol', 0),
-                        'market_cap': data.get('binancecoin', {}).get('usd_market_cap', 0)
-                    }
-                }
-            else:
-                print(f"CoinGecko API error: {response.status_code}")
-                return self.get_fallback_prices()
-                
+            return self.fetch_coingecko_prices(symbols)
         except Exception as e:
             print(f"Error fetching CoinGecko prices: {e}")
             return self.get_fallback_prices()
     
-    def get_binance_prices(self):
+    def fetch_binance_prices(self, symbols=None):
+        """Current prices from Binance API in as few requests as possible; raises on failure"""
+        return fetch_binance_quotes(self._coins(symbols), base_url=self.binance_base)
+    
+    def get_binance_prices(self, symbols=None):
         """Get current prices from Binance API (backup)"""
         try:
-            symbols = ['BTCUSDT', 'ETHUSDT', 'BNBUSDT']
-            prices = {}
-            
-            for symbol in symbols:
-                url = f"{self.binance_base}/ticker/24hr"
-                params = {'symbol': symbol}
-                
-                response = requests.get(url, params=params, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    coin = symbol.replace('USDT', '').lower()
-                    prices[coin] = {
-                        'price': float(data.get('lastPrice', 0)),
-                        'change_24h': float(data.get('priceChangePercent', 0)),
-                        'volume_24h': float(data.get('volume', 0)),
-                        'market_cap': 0  # Not available from Binance
-                    }
-                    
-                time.sleep(0.1)  # Small delay between requests
-                
-            return prices
-            
+            return self.fetch_binance_prices(symbols)
         except Exception as e:
             print(f"Error fetching Binance prices: {e}")
             return self.get_fallback_prices()
     
     def get_fallback_prices(self):
         """Fallback prices when APIs are unavailable"""
-        return {
-            'btc': {'price': 45000, 'change_24h': 2.5, 'volume_24h': 25000000000, 'market_cap': 880000000000},
-            'eth': {'price': 2800, 'change_24h': 1.8, 'volume_24h': 15000000000, 'market_cap': 340000000000},
-            'bnb': {'price': 350, 'change_24h': -0.5, 'volume_24h': 2000000000, 'market_cap': 52000000000}
-        }
+        return coin_registry.fallback_prices()
     
     def get_historical_data(self, coin_id, days=7):
         """Get historical price data from CoinGecko"""
@@ -117,7 +73,10 @@ class CryptoDataProvider:
                 'interval': 'hourly' if days <= 7 else 'daily'
             }
             
-            response = requests.get(url, params=params, timeout=15)
+            # History is backfill: live quotes get the CoinGecko budget first
+            response = fetch(
+                'coingecko', 'market_chart', url, params=params, timeout=15, priority=PRIORITY_BACKFILL
+            )
             if response.status_code == 200:
                 data = response.json()
                 prices = data.get('prices', [])
@@ -145,29 +104,83 @@ class CryptoDataProvider:
 # Initialize crypto data provider
 crypto_provider = CryptoDataProvider()
 
+# CoinGecko first, hedged to Binance when it is slower than usual or failing
+QUOTE_TIMEOUT = float(os.environ.get('QUOTE_TIMEOUT', 3))
+quote_fetcher = HedgedQuoteFetcher([
+    QuoteSource('coingecko', crypto_provider.fetch_coingecko_prices),
+    QuoteSource('binance', crypto_provider.fetch_binance_prices)
+], timeout=QUOTE_TIMEOUT)
+price_source = None
+
+def refresh_price_cache():
+    """Fetch the fastest healthy quote into the cache (simulated prices if every source fails)"""
+    global price_cache, cache_timestamp, price_source
+    
+    try:
+        result = quote_fetcher.fetch()
+        prices, source = result.prices, result.source
+    except AllSourcesFailed as e:
+        print(f"Error fetching prices from every source: {e}")
+        prices, source = crypto_provider.get_fallback_prices(), 'fallback'
+    
+    price_cache = prices
+    price_source = source
+    cache_timestamp = time.time()
+
+@market_stream.add_listener
+def apply_stream_quotes(quotes):
+    """Merge streamed quotes into the cache as they arrive"""
+    global price_cache, cache_timestamp, price_source
+    
+    # Copy-on-write so readers never see a half-updated dict
+    price_cache = {**price_cache, **quotes}
+    price_source = 'stream'
+    cache_timestamp = time.time()
+
+resync_lock = threading.Lock()
+
+@market_stream.on_gap
+def resync_price_cache(symbols, reason):
+    """Refill the cache from REST after the stream missed updates"""
+    # Off the reader thread, and never more than one resync at a time
+    if not resync_lock.acquire(blocking=False):
+        return
+    
+    def resync():
+        try:
+            print(f"Resyncing price cache after stream {reason} gap")
+            refresh_price_cache()
+        except Exception as e:
+            print(f"Error resyncing price cache: {e}")
+        finally:
+            resync_lock.release()
+    
+    threading.Thread(target=resync, name='price-cache-resync', daemon=True).start()
+
 def update_price_cache():
     """Background task to update price cache"""
-    global price_cache, cache_timestamp
-    
     while True:
         try:
-            # Try CoinGecko first, fallback to Binance
-            prices = crypto_provider.get_coingecko_prices()
-            if not prices or all(p['price'] == 0 for p in prices.values()):
-                prices = crypto_provider.get_binance_prices()
-            
-            price_cache = prices
-            cache_timestamp = time.time()
-            
-            print(f"Updated price cache at {datetime.now()}")
-            
+            # REST polling is only the fallback while the stream is down or stale
+            if not market_stream.fresh([coin.symbol for coin in coin_registry.tracked()]):
+                refresh_price_cache()
+                print(f"Updated price cache from {price_source} at {datetime.now()}")
         except Exception as e:
             print(f"Error updating price cache: {e}")
         
         time.sleep(CACHE_DURATION)
 
-# Start background price update thread
-threading.Thread(target=update_price_cache, daemon=True).start()
+_updater = None
+_updater_lock = threading.Lock()
+
+def start_price_updates():
+    """Start the price cache updater and the streaming subscription that feeds it (idempotent)"""
+    global _updater
+    with _updater_lock:
+        if _updater is None:
+            _updater = threading.Thread(target=update_price_cache, name='price-cache-updater', daemon=True)
+            _updater.start()
+    market_stream.start()
 
 @crypto_api_bp.route('/prices/current')
 def get_current_prices():
@@ -175,49 +188,115 @@ def get_current_prices():
     global price_cache, cache_timestamp
     
     # Check if cache is fresh
-    if time.time() - cache_timestamp > CACHE_DURATION or not price_cache:
-        # Force update if cache is stale
-        prices = crypto_provider.get_coingecko_prices()
-        price_cache = prices
-        cache_timestamp = time.time()
+    fresh = time.time() - cache_timestamp <= CACHE_DURATION and bool(price_cache)
+    record_cache('price', fresh)
+    if not fresh:
+        # Force update if cache is stale (bounded by QUOTE_TIMEOUT)
+        refresh_price_cache()
     
     return jsonify({
         'success': True,
         'data': price_cache,
+        'source': price_source,
         'timestamp': datetime.now().isoformat(),
         'cache_age': time.time() - cache_timestamp
     })
 
+# Historical series: raw ones keyed by (coin_id, days), downsampled ones by
+# (coin_id, days, points, method, raw version); each fill gets a new version
+HISTORY_CACHE_TTL = float(os.environ.get('HISTORY_CACHE_TTL', 300))
+HISTORY_CACHE_SIZE = int(os.environ.get('HISTORY_CACHE_SIZE', 256))
+history_cache = OrderedDict()
+history_cache_lock = threading.Lock()
+history_versions = itertools.count(1)
+
+def _cached_history(key, build):
+    """(version, data) from an LRU with a TTL; empty results (failed fetches) are not kept"""
+    now = time.time()
+    with history_cache_lock:
+        entry = history_cache.get(key)
+        if entry is not None and now - entry[0] <= HISTORY_CACHE_TTL:
+            history_cache.move_to_end(key)
+            record_cache('history', True)
+            return entry[1], entry[2]
+    record_cache('history', False)
+    
+    data = build()
+    if not data:
+        return None, data
+    with history_cache_lock:
+        version = next(history_versions)
+        history_cache[key] = (now, version, data)
+        history_cache.move_to_end(key)
+        while len(history_cache) > HISTORY_CACHE_SIZE:
+            history_cache.popitem(last=False)
+    return version, data
+
+def get_chart_history(coin_id, days, points=None, method='lttb'):
+    """(version, data): historical data, downsampled to at most ``points`` records when given.
+    
+    Downsampling picks whole records, so every point keeps its timestamp,
+    volume and date. Every (points, method) variant shares one upstream
+    fetch and the version of that fetch (None when it failed).
+    """
+    version, raw = _cached_history((coin_id, days), lambda: crypto_provider.get_historical_data(coin_id, days))
+    if points is None or points >= len(raw):
+        return version, raw
+    
+    def build():
+        x = np.fromiter((p['timestamp'] for p in raw), dtype=float, count=len(raw))
+        y = np.fromiter((p['price'] for p in raw), dtype=float, count=len(raw))
+        return [raw[i] for i in downsample(x, y, points, method)]
+    
+    return version, _cached_history((coin_id, days, points, method, version), build)[1]
+
 @crypto_api_bp.route('/prices/historical/<coin>')
 def get_historical_prices(coin):
-    """Get historical price data for a specific coin"""
-    coin_map = {
-        'btc': 'bitcoin',
-        'eth': 'ethereum', 
-        'bnb': 'binancecoin'
-    }
+    """Get historical price data for a specific coin
     
-    coin_id = coin_map.get(coin.lower())
+    Optional ``points=N`` downsamples to at most N points for charts, with
+    ``method=lttb`` (default, keeps the line's shape) or ``method=minmax``
+    (keeps every bucket's extremes).
+    """
+    known = coin_registry.get(coin)
+    coin_id = known.coingecko_id if known else None
     if not coin_id:
         return jsonify({'success': False, 'error': 'Invalid coin symbol'}), 400
     
     days = request.args.get('days', 7, type=int)
-    historical_data = crypto_provider.get_historical_data(coin_id, days)
+    points = request.args.get('points', type=int)
+    method = request.args.get('method', 'lttb')
+    if points is not None and points < 4:
+        return jsonify({'success': False, 'error': 'points must be at least 4'}), 400
+    if method not in DOWNSAMPLE_METHODS:
+        return jsonify({'success': False, 'error': f"method must be one of {', '.join(DOWNSAMPLE_METHODS)}"}), 400
     
-    return jsonify({
+    version, historical_data = get_chart_history(coin_id, days, points, method)
+    # Validated by the cached series' version: unchanged until the next upstream fetch
+    etag = state_etag('chart', version) if version is not None else None
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    
+    response = jsonify({
         'success': True,
         'coin': coin.upper(),
         'days': days,
+        'points': len(historical_data),
+        'downsampling': method if points is not None else None,
         'data': historical_data,
         'timestamp': datetime.now().isoformat()
     })
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @crypto_api_bp.route('/market/summary')
 def get_market_summary():
     """Get overall market summary"""
     try:
         url = f"{crypto_provider.coingecko_base}/global"
-        response = requests.get(url, timeout=10)
+        response = fetch('coingecko', 'global', url, timeout=10, priority=PRIORITY_DEFAULT)
         
         if response.status_code == 200:
             data = response.json().get('data', {})
@@ -239,17 +318,45 @@ def get_market_summary():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def compute_trading_signals(prices):
+    """Moving-average trend signals and volatility for a price series (oldest first)"""
+    # Simple moving averages
+    sma_5 = sum(prices[-5:]) / 5
+    sma_10 = sum(prices[-10:]) / 10
+    sma_20 = sum(prices) / len(prices)
+    
+    # Generate signals
+    signals = []
+    if sma_5 > sma_10 > sma_20:
+        signals.append({'type': 'BUY', 'strength': 'STRONG', 'reason': 'Bullish trend - all MAs aligned'})
+    elif sma_5 > sma_10:
+        signals.append({'type': 'BUY', 'strength': 'WEAK', 'reason': 'Short-term bullish'})
+    elif sma_5 < sma_10 < sma_20:
+        signals.append({'type': 'SELL', 'strength': 'STRONG', 'reason': 'Bearish trend - all MAs aligned'})
+    elif sma_5 < sma_10:
+        signals.append({'type': 'SELL', 'strength': 'WEAK', 'reason': 'Short-term bearish'})
+    else:
+        signals.append({'type': 'HOLD', 'strength': 'NEUTRAL', 'reason': 'Sideways movement'})
+    
+    # Volatility analysis
+    price_changes = [abs(prices[i] - prices[i-1]) / prices[i-1] for i in range(1, len(prices))]
+    avg_volatility = sum(price_changes) / len(price_changes)
+    
+    analysis = {
+        'sma_5': sma_5,
+        'sma_10': sma_10,
+        'sma_20': sma_20,
+        'volatility': avg_volatility * 100,
+        'trend': 'BULLISH' if sma_5 > sma_20 else 'BEARISH' if sma_5 < sma_20 else 'NEUTRAL'
+    }
+    return analysis, signals
+
 @crypto_api_bp.route('/trading/signals/<coin>')
 def get_trading_signals(coin):
     """Generate basic trading signals based on price data"""
     try:
-        coin_map = {
-            'btc': 'bitcoin',
-            'eth': 'ethereum', 
-            'bnb': 'binancecoin'
-        }
-        
-        coin_id = coin_map.get(coin.lower())
+        known = coin_registry.get(coin)
+        coin_id = known.coingecko_id if known else None
         if not coin_id:
             return jsonify({'success': False, 'error': 'Invalid coin symbol'}), 400
         
@@ -259,42 +366,13 @@ def get_trading_signals(coin):
             return jsonify({'success': False, 'error': 'Insufficient data for analysis'}), 400
         
         prices = [item['price'] for item in historical_data[-20:]]
-        
-        # Simple moving averages
-        sma_5 = sum(prices[-5:]) / 5
-        sma_10 = sum(prices[-10:]) / 10
-        sma_20 = sum(prices) / len(prices)
-        
-        current_price = prices[-1]
-        
-        # Generate signals
-        signals = []
-        if sma_5 > sma_10 > sma_20:
-            signals.append({'type': 'BUY', 'strength': 'STRONG', 'reason': 'Bullish trend - all MAs aligned'})
-        elif sma_5 > sma_10:
-            signals.append({'type': 'BUY', 'strength': 'WEAK', 'reason': 'Short-term bullish'})
-        elif sma_5 < sma_10 < sma_20:
-            signals.append({'type': 'SELL', 'strength': 'STRONG', 'reason': 'Bearish trend - all MAs aligned'})
-        elif sma_5 < sma_10:
-            signals.append({'type': 'SELL', 'strength': 'WEAK', 'reason': 'Short-term bearish'})
-        else:
-            signals.append({'type': 'HOLD', 'strength': 'NEUTRAL', 'reason': 'Sideways movement'})
-        
-        # Volatility analysis
-        price_changes = [abs(prices[i] - prices[i-1]) / prices[i-1] for i in range(1, len(prices))]
-        avg_volatility = sum(price_changes) / len(price_changes)
+        analysis, signals = compute_trading_signals(prices)
         
         return jsonify({
             'success': True,
             'coin': coin.upper(),
-            'current_price': current_price,
-            'analysis': {
-                'sma_5': sma_5,
-                'sma_10': sma_10,
-                'sma_20': sma_20,
-                'volatility': avg_volatility * 100,
-                'trend': 'BULLISH' if sma_5 > sma_20 else 'BEARISH' if sma_5 < sma_20 else 'NEUTRAL'
-            },
+            'current_price': prices[-1],
+            'analysis': analysis,
             'signals': signals,
             'timestamp': datetime.now().isoformat()
         })
@@ -0,0 +1,9 @@
+from flask import Blueprint, Response
+from src.services.metrics import REGISTRY
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of every registered metric"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
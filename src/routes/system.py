@@ -0,0 +1,22 @@
+from flask import Blueprint, jsonify, request
+from src.services.system_metrics import system_sampler
+
+system_bp = Blueprint('system', __name__)
+
+@system_bp.route('/system/metrics', methods=['GET'])
+def get_system_metrics():
+    """Latest real process/host resource sample"""
+    return jsonify({'success': True, 'data': system_sampler.latest()})
+
+@system_bp.route('/system/metrics/history', methods=['GET'])
+def get_system_metrics_history():
+    """Sampled resource series; ``seconds`` limits the window, ``step`` thins it"""
+    seconds = request.args.get('seconds', type=float)
+    step = max(request.args.get('step', 1, type=int), 1)
+    samples = system_sampler.history(seconds)[::step]
+    return jsonify({
+        'success': True,
+        'interval': system_sampler.interval * step,
+        'count': len(samples),
+        'data': samples
+    })
@@ -1,12 +1,117 @@
-from flask import Blueprint, jsonify, request
+import csv
+import heapq
+import io
+import json
+import threading
+import time
+from flask import Blueprint, Response, jsonify, request, stream_with_context, url_for
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
 from src.models.user import User, db
+from src.services.metrics import record_cache
 
 user_bp = Blueprint('user', __name__)
 
+# Listing limits (keyset pagination on User.id)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Cached total counts per filter combination
+COUNT_CACHE_TTL = 60  # seconds
+_count_cache = {}
+_count_lock = threading.Lock()
+
+# Bulk import/export
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+EXPORT_PAGE_SIZE = 1000
+
+def _prefix_bounds(prefix):
+    """Return the half-open range [prefix, upper) holding every string that starts with prefix.
+
+    A range comparison lets SQLite walk the unique index on the column, which a
+    LIKE 'prefix%' filter does not do under the default case-insensitive LIKE.
+    """
+    upper = prefix
+    while upper and ord(upper[-1]) == 0x10FFFF:
+        upper = upper[:-1]
+    if not upper:
+        return prefix, None
+    return prefix, upper[:-1] + chr(ord(upper[-1]) + 1)
+
+def _filtered_query(username_prefix=None, email_prefix=None):
+    """Build the base user query with the optional prefix filters applied"""
+    query = User.query
+    for column, prefix in ((User.username, username_prefix), (User.email, email_prefix)):
+        if not prefix:
+            continue
+        lower, upper = _prefix_bounds(prefix)
+        query = query.filter(column >= lower)
+        if upper is not None:
+            query = query.filter(column < upper)
+    return query
+
+def _cached_count(username_prefix, email_prefix):
+    """Total number of users matching the filters, cached for COUNT_CACHE_TTL seconds"""
+    key = (username_prefix, email_prefix)
+    now = time.time()
+    with _count_lock:
+        cached = _count_cache.get(key)
+    if cached and cached[1] > now:
+        record_cache('user_count', True)
+        return cached[0]
+    record_cache('user_count', False)
+
+    total = _filtered_query(username_prefix, email_prefix).order_by(None).count()
+    with _count_lock:
+        _count_cache[key] = (total, now + COUNT_CACHE_TTL)
+    return total
+
+def _invalidate_counts():
+    with _count_lock:
+        _count_cache.clear()
+
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    """List users ordered by id, one keyset page at a time.
+
+    Query parameters: ``after`` (id cursor), ``limit``, ``username_prefix``,
+    ``email_prefix`` and ``count=1`` for the (cached) total. The next cursor is
+    returned in the ``X-Next-Cursor`` and ``Link`` headers.
+    """
+    after = request.args.get('after', 0, type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    username_prefix = request.args.get('username_prefix') or None
+    email_prefix = request.args.get('email_prefix') or None
+
+    rows = (
+        _filtered_query(username_prefix, email_prefix)
+        .with_entities(User.id, User.username, User.email)
+        .filter(User.id > after)
+        .order_by(User.id)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    response = jsonify([
+        {'id': row.id, 'username': row.username, 'email': row.email}
+        for row in rows
+    ])
+
+    if has_more:
+        next_cursor = rows[-1].id
+        args = {k: v for k, v in request.args.items() if k != 'after'}
+        next_url = url_for('user.get_users', after=next_cursor, **args)
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+
+    if request.args.get('count') in ('1', 'true', 'yes'):
+        response.headers['X-Total-Count'] = str(_cached_count(username_prefix, email_prefix))
+
+    return response
 
 @user_bp.route('/users', methods=['POST'])
 def create_user():
@@ -15,6 +120,7 @@ def create_user():
     user = User(username=data['username'], email=data['email'])
     db.session.add(user)
     db.session.commit()
+    _invalidate_counts()
     return jsonify(user.to_dict()), 201
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
@@ -29,6 +135,7 @@ def update_user(user_id):
     user.username = data.get('username', user.username)
     user.email = data.get('email', user.email)
     db.session.commit()
+    _invalidate_counts()
     return jsonify(user.to_dict())
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
@@ -36,4 +143,226 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    _invalidate_counts()
     return '', 204
+
+def _validate_row(row):
+    """Return an error message for an import row, or None if it is valid"""
+    if not isinstance(row, dict):
+        return 'row must be an object'
+    username = row.get('username')
+    email = row.get('email')
+    if not isinstance(username, str) or not username.strip():
+        return 'username is required'
+    if not isinstance(email, str) or not email.strip():
+        return 'email is required'
+    if len(username) > 80:
+        return 'username longer than 80 characters'
+    if len(email) > 120:
+        return 'email longer than 120 characters'
+    if '@' not in email:
+        return 'email is not a valid address'
+    return None
+
+class _ImportErrors:
+    """Row errors of one import: every one is counted, the first ``limit`` by line are kept"""
+
+    def __init__(self, limit=IMPORT_MAX_REPORTED_ERRORS):
+        self.limit = limit
+        self.count = 0
+        self._kept = []  # max-heap on line number
+
+    def append(self, error):
+        self.count += 1
+        entry = (-error['line'], self.count, error)
+        if len(self._kept) < self.limit:
+            heapq.heappush(self._kept, entry)
+        elif entry > self._kept[0]:
+            heapq.heapreplace(self._kept, entry)
+
+    def reported(self):
+        return [error for _, _, error in sorted(self._kept, reverse=True)]
+
+def _iter_import_rows(fmt):
+    """Yield (line_number, row_or_error) pairs straight from the request stream"""
+    lines = (raw.decode('utf-8-sig') for raw in request.stream)
+
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f'invalid JSON: {e}')
+
+def _insert_chunk(chunk, errors):
+    """Insert one chunk of validated rows; returns the number of rows inserted.
+
+    Rows that collide with existing users are reported up front so the rest of
+    the chunk can go in as a single executemany. If a concurrent writer still
+    causes a conflict, the chunk is retried row by row under savepoints.
+    """
+    usernames = [row['username'] for _, row in chunk]
+    emails = [row['email'] for _, row in chunk]
+    existing = db.session.execute(
+        db.select(User.username, User.email)
+        .where(or_(User.username.in_(usernames), User.email.in_(emails)))
+    ).all()
+    taken_usernames = {r.username for r in existing}
+    taken_emails = {r.email for r in existing}
+
+    rows = []
+    for line_number, row in chunk:
+        if row['username'] in taken_usernames:
+            errors.append({'line': line_number, 'error': 'username already exists'})
+        elif row['email'] in taken_emails:
+            errors.append({'line': line_number, 'error': 'email already exists'})
+        else:
+            rows.append((line_number, row))
+
+    if not rows:
+        return 0
+
+    try:
+        db.session.execute(insert(User), [row for _, row in rows])
+        db.session.commit()
+        return len(rows)
+    except IntegrityError:
+        db.session.rollback()
+
+    inserted = 0
+    for line_number, row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(User), [row])
+            inserted += 1
+        except IntegrityError:
+            errors.append({'line': line_number, 'error': 'username or email already exists'})
+    db.session.commit()
+    return inserted
+
+@user_bp.route('/users/import', methods=['POST'])
+def import_users():
+    """Bulk-create users from an NDJSON (default) or CSV request body.
+
+    The body is read line by line and inserted in chunks of IMPORT_CHUNK_SIZE,
+    so memory stays bounded regardless of upload size. Invalid or conflicting
+    rows are skipped and reported with their line number; a body that is not
+    UTF-8 stops the import with a 400 (chunks already inserted stay).
+    """
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'csv' if request.mimetype in ('text/csv', 'application/csv') else 'ndjson'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+
+    errors = _ImportErrors()
+    inserted = 0
+    total = 0
+    seen_usernames = set()
+    seen_emails = set()
+    chunk = []
+
+    rows = _iter_import_rows(fmt)
+    while True:
+        try:
+            line_number, row = next(rows)
+        except StopIteration:
+            break
+        except UnicodeDecodeError:
+            if inserted:
+                _invalidate_counts()
+            return jsonify({
+                'error': 'request body must be UTF-8 text',
+                'total_rows': total,
+                'inserted': inserted
+            }), 400
+        total += 1
+        error = str(row) if isinstance(row, ValueError) else _validate_row(row)
+        if error is None:
+            row = {'username': row['username'].strip(), 'email': row['email'].strip()}
+            if row['username'] in seen_usernames:
+                error = 'duplicate username in import'
+            elif row['email'] in seen_emails:
+                error = 'duplicate email in import'
+        if error:
+            errors.append({'line': line_number, 'error': error})
+            continue
+
+        seen_usernames.add(row['username'])
+        seen_emails.add(row['email'])
+        chunk.append((line_number, row))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            inserted += _insert_chunk(chunk, errors)
+            chunk = []
+
+    if chunk:
+        inserted += _insert_chunk(chunk, errors)
+
+    if inserted:
+        _invalidate_counts()
+
+    return jsonify({
+        'success': True,
+        'total_rows': total,
+        'inserted': inserted,
+        'failed': errors.count,
+        'errors': errors.reported(),
+        'errors_truncated': errors.count > errors.limit
+    })
+
+def _iter_user_pages(page_size=EXPORT_PAGE_SIZE):
+    """Walk the user table in id order, one keyset page at a time"""
+    after = 0
+    while True:
+        rows = db.session.execute(
+            db.select(User.id, User.username, User.email)
+            .where(User.id > after)
+            .order_by(User.id)
+            .limit(page_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1].id
+
+def _export_ndjson():
+    for rows in _iter_user_pages():
+        yield ''.join(
+            json.dumps({'id': r.id, 'username': r.username, 'email': r.email}) + '\n'
+            for r in rows
+        )
+
+def _export_csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['id', 'username', 'email'])
+    yield buffer.getvalue()
+    for rows in _iter_user_pages():
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows((r.id, r.username, r.email) for r in rows)
+        yield buffer.getvalue()
+
+@user_bp.route('/users/export', methods=['GET'])
+def export_users():
+    """Stream every user as NDJSON (default) or CSV without loading the table"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt == 'csv':
+        generator, mimetype = _export_csv(), 'text/csv'
+    elif fmt == 'ndjson':
+        generator, mimetype = _export_ndjson(), 'application/x-ndjson'
+    else:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+
+    return Response(
+        stream_with_context(generator),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=users.{fmt}'}
+    )
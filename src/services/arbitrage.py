@@ -0,0 +1,312 @@
+"""
+Cross-venue and triangular arbitrage scanner over a rate graph
+
+Every (asset, venue) is a node. A quote for base/quote on a venue adds two
+edges: selling base at the bid and buying it at the ask, each net of the
+venue's taker fee. Transfer edges link the same asset across venues, net
+of a transfer fee. An edge weighs ``-log(rate)``, so a round trip that
+ends with more than it started is a negative cycle:
+
+- a cross-venue spread is the 4-cycle USD@A -> BTC@A -> BTC@B -> USD@B ->
+  USD@A
+- a triangular opportunity is a 3-cycle within one venue
+
+Short cycles (up to ``max_cycle_length`` edges) are enumerated once per
+topology. Each is stored as a row of edge ids and indexed by edge. When a
+single quote changes, only the rows through its two edges are re-summed.
+``scan()`` runs a vectorized Bellman-Ford over the dense weight matrix to
+catch longer cycles.
+
+    scanner = ArbitrageScanner({'binance': 0.001, 'coingecko': 0.002})
+    scanner.update_quote('binance', 'BTC', 'USD', bid, ask)
+    scanner.best()           # most profitable short cycle, or None
+"""
+
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.services.metrics import REGISTRY
+
+ARBITRAGE_SCAN_SECONDS = REGISTRY.histogram(
+    'arbitrage_scan_duration_seconds', 'Time to re-evaluate arbitrage cycles', ['mode']
+)
+
+# Taker fees per venue (fraction of notional); venues not listed pay DEFAULT_FEE
+VENUE_FEES = {
+    'binance': float(os.environ.get('BINANCE_TAKER_FEE', 0.001)),
+    'coingecko': float(os.environ.get('COINGECKO_TAKER_FEE', 0.002)),
+}
+DEFAULT_FEE = 0.002
+TRANSFER_FEE = float(os.environ.get('ARBITRAGE_TRANSFER_FEE', 0.0005))
+
+# A cycle must beat its threshold by this much log-weight (~1e-5 bps), so
+# rounding in a round trip that breaks even is not reported as a profit
+CYCLE_EPSILON = 1e-9
+
+class Opportunity:
+    __slots__ = ('route', 'profit_bps', 'kind')
+
+    def __init__(self, route, profit_bps, kind):
+        self.route = route
+        self.profit_bps = profit_bps
+        self.kind = kind
+
+    @property
+    def symbol(self):
+        """The first non-USD asset on the route"""
+        return next((asset for asset, _ in self.route if asset != 'USD'), 'USD')
+
+    def to_dict(self):
+        return {
+            'route': [f'{asset}@{venue}' for asset, venue in self.route],
+            'profit_bps': round(self.profit_bps, 3),
+            'kind': self.kind
+        }
+
+class ArbitrageScanner:
+    """Rate graph over (asset, venue) nodes with incremental short-cycle evaluation"""
+
+    def __init__(self, fees=None, transfer_fee=TRANSFER_FEE, max_cycle_length=4):
+        self.fees = dict(VENUE_FEES if fees is None else fees)
+        self.transfer_fee = transfer_fee
+        self.max_cycle_length = max_cycle_length
+        self.nodes = []                  # (asset, venue)
+        self._node_index = {}
+        self._edge_index = {}            # (src, dst) -> edge id
+        self._src = []
+        self._dst = []
+        self._transfer = []
+        self._quoted_at = []             # edge id -> time.monotonic() of its quote (inf for transfers)
+        # Edge log-weights; the extra last slot is a zero-weight pad for short cycles
+        self._weights = np.zeros(1)
+        self._dirty = True               # topology changed: cycles need re-enumerating
+        self._cycle_edges = np.zeros((0, max_cycle_length), dtype=np.intp)
+        self._cycle_nodes = []
+        self._cycle_weights = np.zeros(0)
+        self._edge_cycles = []           # edge id -> array of cycle rows through it
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------ graph updates
+
+    def _node(self, asset, venue):
+        key = (asset, venue)
+        index = self._node_index.get(key)
+        if index is None:
+            index = self._node_index[key] = len(self.nodes)
+            self.nodes.append(key)
+            # Link the asset to its other venues
+            for other_asset, other_venue in self.nodes[:-1]:
+                if other_asset == asset:
+                    other = self._node_index[(other_asset, other_venue)]
+                    rate = 1 - self.transfer_fee
+                    self._set_edge(index, other, rate, transfer=True)
+                    self._set_edge(other, index, rate, transfer=True)
+        return index
+
+    def _set_edge(self, src, dst, rate, transfer=False):
+        """Set an edge's rate; returns (edge id, whether the topology changed)"""
+        weight = -math.log(rate) if rate > 0 else math.inf
+        quoted_at = math.inf if transfer else time.monotonic()
+        edge = self._edge_index.get((src, dst))
+        if edge is not None:
+            self._weights[edge] = weight
+            self._quoted_at[edge] = quoted_at
+            return edge, False
+        edge = self._edge_index[(src, dst)] = len(self._src)
+        self._src.append(src)
+        self._dst.append(dst)
+        self._transfer.append(transfer)
+        self._quoted_at.append(quoted_at)
+        # Keep the zero pad at the end
+        self._weights = np.append(self._weights[:-1], [weight, 0.0])
+        self._dirty = True
+        return edge, True
+
+    def update_quote(self, venue, base, quote, bid, ask=None):
+        """Apply one pair quote; returns the short cycles it made profitable"""
+        ask = bid if ask is None else ask
+        if not bid or not ask or bid <= 0 or ask <= 0:
+            return []
+        fee = self.fees.get(venue, DEFAULT_FEE)
+        with self._lock:
+            base_node, quote_node = self._node(base, venue), self._node(quote, venue)
+            sell, _ = self._set_edge(base_node, quote_node, bid * (1 - fee))
+            buy, _ = self._set_edge(quote_node, base_node, (1 - fee) / ask)
+            if self._dirty:
+                return []
+            with ARBITRAGE_SCAN_SECONDS.labels('incremental').time():
+                rows = self._resum([sell, buy])
+                return self._opportunities(rows[self._cycle_weights[rows] < -CYCLE_EPSILON])
+
+    def _resum(self, edges):
+        """Re-evaluate the cycles through ``edges``; returns their rows"""
+        rows = np.unique(np.concatenate([self._edge_cycles[edge] for edge in edges]))
+        if len(rows):
+            self._cycle_weights[rows] = self._weights[self._cycle_edges[rows]].sum(axis=1)
+        return rows
+
+    def expire(self, max_age):
+        """Disable quotes older than ``max_age`` seconds until they are quoted again"""
+        with self._lock:
+            cutoff = time.monotonic() - max_age
+            stale = [edge for edge, quoted_at in enumerate(self._quoted_at)
+                     if quoted_at < cutoff and self._weights[edge] != math.inf]
+            if not stale:
+                return 0
+            self._weights[stale] = math.inf
+            if not self._dirty:
+                self._resum(stale)
+            return len(stale)
+
+    def venues(self, max_age=None):
+        """Venues with at least one quote (younger than ``max_age`` seconds)"""
+        cutoff = time.monotonic() - max_age if max_age is not None else -math.inf
+        with self._lock:
+            return {self.nodes[src][1] for src, transfer, quoted_at in zip(self._src, self._transfer, self._quoted_at)
+                    if not transfer and quoted_at >= cutoff}
+
+    def update_quotes(self, venue, quotes, quote_asset='USD'):
+        """Apply a ``{symbol: {'price'|'bid'|'ask': ...}}`` batch (one incremental pass per quote)"""
+        for symbol, values in quotes.items():
+            price = values.get('price')
+            self.update_quote(venue, symbol.upper(), quote_asset,
+                              values.get('bid') or price, values.get('ask') or price)
+
+    # ------------------------------------------------------------ short cycles
+
+    def _rebuild(self):
+        """Enumerate every simple cycle up to max_cycle_length edges and index it by edge"""
+        adjacency = [[] for _ in self.nodes]
+        for edge, (src, dst) in enumerate(zip(self._src, self._dst)):
+            adjacency[src].append((dst, edge))
+
+        pad = len(self._src)
+        cycles, cycle_nodes = [], []
+        for start in range(len(self.nodes)):
+            # Only cycles whose smallest node is ``start``, so each is found once
+            stack = [(start, [start], [])]
+            while stack:
+                node, path, edges = stack.pop()
+                for nxt, edge in adjacency[node]:
+                    if nxt == start and len(edges) >= 1:
+                        # Skip pure transfer loops, they can only lose the fees
+                        if not all(self._transfer[e] for e in edges + [edge]):
+                            cycle = edges + [edge]
+                            cycles.append(cycle + [pad] * (self.max_cycle_length - len(cycle)))
+                            cycle_nodes.append(path)
+                    elif nxt > start and nxt not in path and len(edges) + 1 < self.max_cycle_length:
+                        stack.append((nxt, path + [nxt], edges + [edge]))
+
+        self._cycle_edges = np.array(cycles, dtype=np.intp).reshape(-1, self.max_cycle_length)
+        self._cycle_nodes = cycle_nodes
+        self._cycle_weights = self._weights[self._cycle_edges].sum(axis=1)
+
+        # Edge -> cycle rows, from one argsort over the flattened edge matrix
+        rows = np.repeat(np.arange(len(cycles)), self.max_cycle_length)
+        flat = self._cycle_edges.ravel()
+        order = np.argsort(flat, kind='stable')
+        bounds = np.searchsorted(flat[order], np.arange(pad + 2))
+        self._edge_cycles = [np.unique(rows[order[bounds[e]:bounds[e + 1]]]) for e in range(pad + 1)]
+        self._dirty = False
+
+    def _kind(self, nodes):
+        venues = {self.nodes[n][1] for n in nodes}
+        return 'triangular' if len(venues) == 1 else 'cross_venue'
+
+    def _opportunities(self, rows):
+        found = []
+        for row in rows:
+            nodes = self._cycle_nodes[row]
+            # Start the route from USD when it passes through it
+            usd = next((i for i, n in enumerate(nodes) if self.nodes[n][0] == 'USD'), 0)
+            nodes = nodes[usd:] + nodes[:usd]
+            profit = math.expm1(-self._cycle_weights[row]) * 10000
+            found.append(Opportunity([self.nodes[n] for n in nodes], profit, self._kind(nodes)))
+        found.sort(key=lambda o: o.profit_bps, reverse=True)
+        return found
+
+    def opportunities(self, min_profit_bps=0.0):
+        """Profitable short cycles, best first"""
+        with self._lock:
+            if self._dirty:
+                with ARBITRAGE_SCAN_SECONDS.labels('rebuild').time():
+                    self._rebuild()
+            threshold = -math.log1p(min_profit_bps / 10000)
+            return self._opportunities(np.flatnonzero(self._cycle_weights < threshold - CYCLE_EPSILON))
+
+    def best(self, min_profit_bps=0.0):
+        found = self.opportunities(min_profit_bps)
+        return found[0] if found else None
+
+    # ------------------------------------------------------------ full scan
+
+    def scan(self, max_cycles=10):
+        """Negative cycles of any length via vectorized Bellman-Ford (all nodes as sources)"""
+        with self._lock:
+            size = len(self.nodes)
+            if not size:
+                return []
+            with ARBITRAGE_SCAN_SECONDS.labels('bellman_ford').time():
+                weights = np.full((size, size), np.inf)
+                src, dst = np.array(self._src, dtype=np.intp), np.array(self._dst, dtype=np.intp)
+                weights[src, dst] = self._weights[:-1]
+                return self._bellman_ford(weights, max_cycles)
+
+    def _bellman_ford(self, weights, max_cycles):
+        size = len(weights)
+        dist = np.zeros(size)
+        pred = np.full(size + 1, size, dtype=np.intp)    # index ``size`` is a root sentinel
+        columns = np.arange(size)
+        for iteration in range(1, size + 1):
+            candidates = dist[:, None] + weights        # via every predecessor at once
+            best_pred = candidates.argmin(axis=0)
+            best = candidates[best_pred, columns]
+            improved = best < dist - 1e-12
+            if not improved.any():
+                return []
+            dist = np.where(improved, best, dist)
+            pred[:size] = np.where(improved, best_pred, pred[:size])
+            # A cycle in the predecessor graph is always negative, so stop as soon as one forms
+            if iteration % 4 == 0 or iteration == size:
+                on_cycle = _predecessor_cycle_nodes(pred, size)
+                if len(on_cycle):
+                    return self._extract_cycles(on_cycle, pred, weights, max_cycles)
+        return []
+
+    def _extract_cycles(self, starts, pred, weights, max_cycles):
+        found, seen = [], set()
+        for node in starts:
+            cycle, current = [node], pred[node]
+            while current != node:
+                cycle.append(current)
+                current = pred[current]
+            cycle.reverse()                             # predecessors run backwards
+            key = frozenset(cycle)
+            if key in seen:
+                continue
+            seen.add(key)
+            rate = sum(weights[a, b] for a, b in zip(cycle, cycle[1:] + cycle[:1]))
+            if rate >= -CYCLE_EPSILON:
+                continue
+            usd = next((i for i, n in enumerate(cycle) if self.nodes[n][0] == 'USD'), 0)
+            cycle = cycle[usd:] + cycle[:usd]
+            found.append(Opportunity([self.nodes[n] for n in cycle], math.expm1(-rate) * 10000, self._kind(cycle)))
+            if len(found) >= max_cycles:
+                break
+        found.sort(key=lambda o: o.profit_bps, reverse=True)
+        return found
+
+def _predecessor_cycle_nodes(pred, size):
+    """Nodes on cycles of the predecessor graph, by pointer doubling past ``size`` hops"""
+    ancestors = pred
+    for _ in range(max(size, 1).bit_length() + 1):
+        ancestors = ancestors[ancestors]
+    landing = np.unique(ancestors[:size])
+    return landing[landing < size]
+
+# Process-wide scanner fed by every venue's quotes
+arbitrage_scanner = ArbitrageScanner()
@@ -0,0 +1,192 @@
+"""
+Coin registry and batched quote fetching
+
+The tracked assets live in src/data/coins.json (symbol, provider ids,
+reference price, whether it is tracked), so adding a coin is a data change.
+Quote fetches split the tracked ids into URL-size-safe chunks, run the
+chunks concurrently (each still goes through the shared rate limiter) and
+parse the provider responses generically into ``{symbol: quote}``.
+
+    quotes = fetch_coingecko_quotes(coin_registry.tracked())
+    quotes['btc']['price']
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.rate_limit import PRIORITY_LIVE
+from src.services.upstream import fetch
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+COINS_PATH = os.environ.get('COINS_FILE', os.path.join(DATA_DIR, 'coins.json'))
+
+COINGECKO_BASE = 'https://api.coingecko.com/api/v3'
+BINANCE_BASE = 'https://api.binance.com/api/v3'
+
+# Keep query strings well below the ~8 KB request-line limits of common proxies
+MAX_PARAM_CHARS = int(os.environ.get('QUOTE_MAX_PARAM_CHARS', 1800))
+MAX_IDS_PER_REQUEST = int(os.environ.get('QUOTE_MAX_IDS_PER_REQUEST', 250))
+MAX_CONCURRENT_CHUNKS = 4
+
+class Coin:
+    __slots__ = ('symbol', 'name', 'coingecko_id', 'binance_symbol', 'reference_price', 'tracked', 'fallback')
+
+    def __init__(self, symbol, name, coingecko_id=None, binance_symbol=None, reference_price=0.0,
+                 tracked=False, fallback=None):
+        self.symbol = symbol.lower()
+        self.name = name
+        self.coingecko_id = coingecko_id
+        self.binance_symbol = binance_symbol
+        self.reference_price = float(reference_price)
+        self.tracked = tracked
+        self.fallback = fallback or {
+            'price': self.reference_price, 'change_24h': 0, 'volume_24h': 0, 'market_cap': 0
+        }
+
+class CoinRegistry:
+    """Lookup of known coins by symbol and by provider id"""
+
+    def __init__(self, coins):
+        self._coins = {coin.symbol: coin for coin in coins}
+        self._by_coingecko = {coin.coingecko_id: coin for coin in coins if coin.coingecko_id}
+        self._by_binance = {coin.binance_symbol: coin for coin in coins if coin.binance_symbol}
+
+    @classmethod
+    def from_file(cls, path=COINS_PATH):
+        with open(path) as f:
+            return cls([Coin(**entry) for entry in json.load(f)])
+
+    def get(self, symbol):
+        """Coin for a symbol (any case), or None"""
+        return self._coins.get(symbol.lower()) if symbol else None
+
+    def by_coingecko_id(self, coingecko_id):
+        return self._by_coingecko.get(coingecko_id)
+
+    def by_binance_symbol(self, binance_symbol):
+        return self._by_binance.get(binance_symbol)
+
+    def all(self):
+        return list(self._coins.values())
+
+    def tracked(self):
+        return [coin for coin in self._coins.values() if coin.tracked]
+
+    def fallback_prices(self, coins=None):
+        """Static quotes for when every provider is unavailable"""
+        return {coin.symbol: dict(coin.fallback) for coin in (coins if coins is not None else self.tracked())}
+
+def chunk_values(values, max_chars=MAX_PARAM_CHARS, max_items=MAX_IDS_PER_REQUEST, overhead=3):
+    """Split values into lists whose encoded size and count stay within the limits.
+
+    Each value costs its length plus ``overhead`` (its URL-encoded separator
+    and quoting, e.g. 3 for a ``%2C`` comma).
+    """
+    chunks = []
+    current, size = [], 0
+    for value in values:
+        cost = len(value) + overhead
+        if current and (size + cost > max_chars or len(current) >= max_items):
+            chunks.append(current)
+            current, size = [], 0
+        current.append(value)
+        size += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+def fetch_chunks(fetch_chunk, chunks):
+    """Run ``fetch_chunk(chunk) -> dict`` for every chunk concurrently and merge the results.
+
+    Chunks that fail are skipped; if all of them fail the first error is raised.
+    """
+    if not chunks:
+        return {}
+    if len(chunks) == 1:
+        return fetch_chunk(chunks[0])
+
+    merged, errors = {}, []
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_CHUNKS, len(chunks)),
+                            thread_name_prefix='quote-chunk') as pool:
+        for future in [pool.submit(fetch_chunk, chunk) for chunk in chunks]:
+            try:
+                merged.update(future.result())
+            except Exception as e:
+                errors.append(e)
+    if errors:
+        if not merged:
+            raise errors[0]
+        logger.warning("Error fetching %d of %d quote chunks: %s", len(errors), len(chunks), errors[0])
+    return merged
+
+def parse_coingecko_simple_price(data, registry):
+    """``/simple/price`` response -> {symbol: quote} for the coins it contains"""
+    quotes = {}
+    for coingecko_id, values in data.items():
+        coin = registry.by_coingecko_id(coingecko_id)
+        if coin is None or 'usd' not in values:
+            continue
+        quotes[coin.symbol] = {
+            'price': values['usd'],
+            'change_24h': values.get('usd_24h_change', 0),
+            'volume_24h': values.get('usd_24h_vol', 0),
+            'market_cap': values.get('usd_market_cap', 0)
+        }
+    return quotes
+
+def parse_binance_tickers(rows, registry):
+    """``/ticker/24hr?symbols=`` response -> {symbol: quote} for the coins it contains"""
+    quotes = {}
+    for row in rows:
+        coin = registry.by_binance_symbol(row.get('symbol'))
+        if coin is None:
+            continue
+        quotes[coin.symbol] = {
+            'price': float(row.get('lastPrice', 0)),
+            'change_24h': float(row.get('priceChangePercent', 0)),
+            'volume_24h': float(row.get('volume', 0)),
+            'market_cap': 0  # Not available from Binance
+        }
+    return quotes
+
+def fetch_coingecko_quotes(coins, registry=None, base_url=COINGECKO_BASE, timeout=10, priority=PRIORITY_LIVE):
+    """Quotes for ``coins`` from CoinGecko in as few requests as the URL limit allows"""
+    registry = registry or coin_registry
+    ids = [coin.coingecko_id for coin in coins if coin.coingecko_id]
+
+    def fetch_chunk(chunk):
+        response = fetch('coingecko', 'simple_price', f'{base_url}/simple/price', params={
+            'ids': ','.join(chunk),
+            'vs_currencies': 'usd',
+            'include_24hr_change': 'true',
+            'include_24hr_vol': 'true',
+            'include_market_cap': 'true'
+        }, timeout=timeout, priority=priority)
+        if response.status_code != 200:
+            raise RuntimeError(f"CoinGecko API error: {response.status_code}")
+        return parse_coingecko_simple_price(response.json(), registry)
+
+    return fetch_chunks(fetch_chunk, chunk_values(ids))
+
+def fetch_binance_quotes(coins, registry=None, base_url=BINANCE_BASE, timeout=10, priority=PRIORITY_LIVE):
+    """Quotes for ``coins`` from Binance's multi-symbol 24h ticker"""
+    registry = registry or coin_registry
+    symbols = [coin.binance_symbol for coin in coins if coin.binance_symbol]
+
+    def fetch_chunk(chunk):
+        response = fetch('binance', 'ticker_24hr', f'{base_url}/ticker/24hr', params={
+            'symbols': json.dumps(chunk, separators=(',', ':'))
+        }, timeout=timeout, priority=priority)
+        if response.status_code != 200:
+            raise RuntimeError(f"Binance API error: {response.status_code}")
+        return parse_binance_tickers(response.json(), registry)
+
+    # A JSON-encoded symbol adds two %22 quotes and a %2C comma once URL-encoded
+    return fetch_chunks(fetch_chunk, chunk_values(symbols, overhead=9))
+
+# Process-wide registry loaded from the data file
+coin_registry = CoinRegistry.from_file()
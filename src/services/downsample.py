@@ -0,0 +1,89 @@
+"""
+Downsampling of time series for charts
+
+Both methods return the indices of the points to keep, sorted, always
+including the first and last point, so callers can pick whole records
+(timestamp, price, volume) rather than just (x, y):
+
+- ``lttb``: Largest-Triangle-Three-Buckets. In each bucket it keeps the
+  point that forms the largest triangle with the previously kept point and
+  the next bucket's average, which preserves the visual shape of the line.
+- ``minmax``: keeps each bucket's lowest and highest point, so no spike is
+  lost.
+
+Series are split into buckets once, as a padded (buckets x width) index
+matrix, so averages, extremes and triangle areas are NumPy row operations.
+LTTB's only sequential step is carrying the kept point from bucket to bucket.
+
+    keep = lttb(timestamps, prices, 500)
+    chart = [records[i] for i in keep]
+"""
+
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+
+def _buckets(edges):
+    """(index matrix, valid mask) for buckets [edges[i], edges[i + 1])"""
+    starts, ends = edges[:-1], edges[1:]
+    width = int((ends - starts).max())
+    idx = starts[:, None] + np.arange(width)[None, :]
+    valid = idx < ends[:, None]
+    # Padding repeats the bucket's first point, so argmax/argmin always land on a real point
+    return np.where(valid, idx, starts[:, None]), valid
+
+def lttb(x, y, threshold):
+    """Indices of ``threshold`` points chosen by Largest-Triangle-Three-Buckets"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    # First and last points are always kept; the rest is split into threshold - 2 buckets
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.intp)
+    idx, valid = _buckets(edges)
+    bx, by = x[idx], y[idx]
+    counts = valid.sum(axis=1)
+    avg_x = np.where(valid, bx, 0.0).sum(axis=1) / counts
+    avg_y = np.where(valid, by, 0.0).sum(axis=1) / counts
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    # Twice the triangle area (a, point, c) is |(ax - cx) * y + (cy - ay) * x + (cx * ay - ax * cy)|
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, size - 1
+    anchor = 0
+    for bucket in range(threshold - 2):
+        ax, ay = x[anchor], y[anchor]
+        cx, cy = next_x[bucket], next_y[bucket]
+        area = np.abs((ax - cx) * by[bucket] + (cy - ay) * bx[bucket] + (cx * ay - ax * cy))
+        anchor = idx[bucket, area.argmax()]
+        selected[bucket + 1] = anchor
+    return selected
+
+def minmax(y, threshold):
+    """Indices of at most ``threshold`` points: each bucket's minimum and maximum"""
+    y = np.asarray(y, dtype=float)
+    size = len(y)
+    if threshold >= size or threshold < 4:
+        return np.arange(size)
+
+    # Two points per bucket between the fixed first and last point
+    buckets = (threshold - 2) // 2
+    edges = np.linspace(1, size - 1, buckets + 1).astype(np.intp)
+    idx, _ = _buckets(edges)
+    values = y[idx]
+    rows = np.arange(buckets)
+    lows = idx[rows, values.argmin(axis=1)]
+    highs = idx[rows, values.argmax(axis=1)]
+    # Flat buckets have the same point as minimum and maximum
+    return np.unique(np.concatenate(([0], lows, highs, [size - 1])))
+
+def downsample(x, y, threshold, method='lttb'):
+    """Indices to keep for ``method`` (one of METHODS)"""
+    if method == 'lttb':
+        return lttb(x, y, threshold)
+    if method == 'minmax':
+        return minmax(y, threshold)
+    raise ValueError(f"Unknown downsampling method {method!r}; expected one of {', '.join(METHODS)}")
@@ -0,0 +1,115 @@
+"""
+Compression and conditional GET for API responses
+
+- ``install_compression(app)`` gzips (or brotli-compresses) JSON and text
+  bodies above COMPRESS_MIN_SIZE for clients that accept it.
+- ``@conditional(tag)`` gives a view a weak ETag built from state version
+  counters, never from the body, and answers a matching If-None-Match with
+  304 before the view runs. An idle poller costs a tag lookup and headers.
+
+Tags start with a per-process boot id, so counters that restart at zero
+cannot match a copy a client kept from an earlier process:
+
+    @bp.route('/api/bots/status')
+    @conditional(lambda: state_etag('bots', bots_version()))
+    def get_bots_status():
+        ...
+"""
+
+import os
+from functools import wraps
+
+from flask import current_app, request
+
+from src.services.metrics import REGISTRY
+from src.services.static_assets import available_encodings, compress
+
+COMPRESSED_RESPONSES = REGISTRY.counter(
+    'http_compressed_responses_total', 'Responses compressed on the fly', ['encoding']
+)
+COMPRESSION_SAVED_BYTES = REGISTRY.counter(
+    'http_compression_saved_bytes_total', 'Body bytes saved by on-the-fly compression'
+)
+NOT_MODIFIED_RESPONSES = REGISTRY.counter(
+    'http_not_modified_responses_total', '304 responses sent instead of a body', ['endpoint']
+)
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/javascript', 'image/svg+xml'}
+
+BOOT_ID = os.urandom(4).hex()
+
+def state_etag(*parts):
+    """ETag value for the state behind a response, e.g. state_etag('bot', 3, bot.version)"""
+    return '-'.join([BOOT_ID, *map(str, parts)])
+
+def _compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype in COMPRESSIBLE_MIMETYPES or mimetype.startswith('text/')
+
+def _negotiate():
+    accepted = request.accept_encodings
+    for encoding in available_encodings():
+        if accepted[encoding] > 0:
+            return encoding
+    return None
+
+def not_modified(etag):
+    """Bodyless 304 carrying the client's (weak) validator"""
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    NOT_MODIFIED_RESPONSES.labels(request.endpoint or 'unmatched').inc()
+    return response
+
+def conditional(tag):
+    """Validate a view with ``tag(**view_args)``, an ETag value or None for "no validator".
+
+    The tag is taken before the view runs, so a change that lands in between
+    only ever makes the client download once more, never keep a stale copy.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = tag(*args, **kwargs)
+            if etag is not None and request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+            response = current_app.make_response(view(*args, **kwargs))
+            if etag is not None and response.status_code == 200:
+                response.set_etag(etag, weak=True)
+                response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def install_compression(app, min_size=COMPRESS_MIN_SIZE):
+    """Compress text and JSON responses of at least ``min_size`` bytes"""
+
+    @app.after_request
+    def _compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or not _compressible(response)):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = _negotiate()
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        compressed = compress(data, encoding)
+        if compressed is None or len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        # The bytes changed, so a strong validator becomes weak (the representation is the same)
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        COMPRESSED_RESPONSES.labels(encoding).inc()
+        COMPRESSION_SAVED_BYTES.inc(len(data) - len(compressed))
+        return response
+
+    return app
@@ -0,0 +1,343 @@
+"""
+Durable background job queue backed by SQLite
+
+Request handlers enqueue a job and return at once; a bounded pool of worker
+threads claims due jobs, runs the registered handler and records the
+result. Failed attempts are retried with exponential backoff and jitter
+until ``max_attempts``. Jobs live in an SQLite file, one per entry point
+(``jobs_path('main')``), so anything queued or in flight survives a restart
+of that app and is never picked up by another: a claimed job holds a lease,
+and a job whose lease ran out (its worker died) is claimed again. A handler
+can ``checkpoint()`` what it has done so far, and later attempts read it
+back from ``job['checkpoint']``.
+
+    jobs = JobQueue(jobs_path('main'))
+    jobs.register('send_email', send_email)
+    job = jobs.enqueue('send_email', {'to': 'user@example.com'})
+    jobs.get(job['id'])['status']   # queued -> running -> succeeded | failed
+"""
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from src.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database')
+DEFAULT_JOBS_PATH = os.path.join(DATABASE_DIR, 'jobs.db')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+RETRYING = 'retrying'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    result TEXT,
+    error TEXT,
+    checkpoint TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_after);
+"""
+
+JOB_TRANSITIONS = REGISTRY.counter(
+    'jobs_total', 'Background job state transitions', ['kind', 'status']
+)
+JOB_DURATION_SECONDS = REGISTRY.histogram(
+    'job_duration_seconds', 'Background job attempt duration', ['kind']
+)
+JOB_QUEUE_DEPTH = REGISTRY.gauge(
+    'job_queue_depth', 'Jobs waiting to run (queued or retrying)', ['queue']
+)
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help; the job fails at once"""
+
+class JobPending(Exception):
+    """Raised by a handler whose work is still settling elsewhere.
+
+    The job is checked again after a backoff without using up an attempt,
+    so work with an unknown outcome is never given up on and failed.
+    """
+
+def _row_to_job(row):
+    return {
+        'id': row['id'],
+        'kind': row['kind'],
+        'payload': json.loads(row['payload']),
+        'status': row['status'],
+        'attempts': row['attempts'],
+        'max_attempts': row['max_attempts'],
+        'next_attempt_at': row['run_after'] if row['status'] in (QUEUED, RETRYING) else None,
+        'result': json.loads(row['result']) if row['result'] is not None else None,
+        'error': row['error'],
+        'checkpoint': json.loads(row['checkpoint']) if row['checkpoint'] is not None else {},
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+    }
+
+class JobQueue:
+    """SQLite-backed job queue with a bounded worker pool.
+
+    ``register(kind, handler)`` maps a job kind to ``handler(payload, job)``,
+    whose return value (JSON-serializable) becomes the job result. Listeners
+    added with ``add_listener(fn)`` are called with the job dict on every
+    state change.
+    """
+
+    def __init__(self, path=DEFAULT_JOBS_PATH, workers=4, max_attempts=5,
+                 backoff_base=1.0, backoff_max=60.0, lease_seconds=300.0, poll_interval=1.0, name=None):
+        self.path = path
+        # 'main' for jobs_path('main'); the depth gauge is labelled with it
+        self.name = name or os.path.basename(path).split('.')[0]
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._listeners = []
+        self._local = threading.local()
+        self._wake = threading.Condition()
+        self._threads = []
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._schema_ready = False
+        JOB_QUEUE_DEPTH.labels(self.name).set_function(self.depth)
+
+    # ------------------------------------------------------------ storage
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._migrate(conn)
+                self._schema_ready = True
+        return conn
+
+    def _migrate(self, conn):
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+        if 'checkpoint' not in columns:
+            conn.execute('ALTER TABLE jobs ADD COLUMN checkpoint TEXT')
+
+    def _fetch(self, job_id):
+        row = self._conn().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    # ------------------------------------------------------------ public API
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+        return handler
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+        return listener
+
+    def enqueue(self, kind, payload, idempotency_key=None, max_attempts=None):
+        """Persist a job and wake a worker; a repeated idempotency key returns the original job.
+
+        Workers only run once ``start()`` was called; until then jobs wait in the database.
+        """
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        conn = self._conn()
+        try:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, payload, status, attempts, max_attempts, run_after, '
+                'idempotency_key, created_at, updated_at) VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?, ?)',
+                (job_id, kind, json.dumps(payload), QUEUED, max_attempts or self.max_attempts,
+                 now, idempotency_key, now, now)
+            )
+        except sqlite3.IntegrityError:
+            row = conn.execute('SELECT * FROM jobs WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+            return _row_to_job(row)
+
+        job = self._fetch(job_id)
+        self._notify(job)
+        with self._wake:
+            self._wake.notify()
+        return job
+
+    def get(self, job_id):
+        return self._fetch(job_id)
+
+    def checkpoint(self, job_id, **values):
+        """Durably merge ``values`` into the job's checkpoint, for its later attempts"""
+        self._conn().execute(
+            "UPDATE jobs SET checkpoint = json_patch(COALESCE(checkpoint, '{}'), ?), updated_at = ? WHERE id = ?",
+            (json.dumps(values), time.time(), job_id)
+        )
+
+    def depth(self):
+        row = self._conn().execute(
+            'SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', (QUEUED, RETRYING)
+        ).fetchone()
+        return row[0]
+
+    def start(self):
+        """Start the worker pool (idempotent); jobs left over from a previous run are picked up"""
+        if self._threads:
+            return self
+        with self._start_lock:
+            if not self._threads:
+                self._stop.clear()
+                self._conn()
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        with self._wake:
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # ------------------------------------------------------------ workers
+
+    def _kinds_clause(self):
+        kinds = tuple(self._handlers)
+        return f"kind IN ({','.join('?' * len(kinds))})", kinds
+
+    def _claim(self):
+        """Atomically move the next due job to running and take a lease on it"""
+        if not self._handlers:
+            return None
+        conn = self._conn()
+        now = time.time()
+        kinds_clause, kinds = self._kinds_clause()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                f'SELECT id FROM jobs WHERE status IN (?, ?, ?) AND run_after <= ? AND {kinds_clause} '
+                'ORDER BY run_after LIMIT 1',
+                (QUEUED, RETRYING, RUNNING, now) + kinds
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                'UPDATE jobs SET status = ?, attempts = attempts + 1, run_after = ?, updated_at = ? WHERE id = ?',
+                (RUNNING, now + self.lease_seconds, now, row['id'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return self._fetch(row['id'])
+
+    def _next_wakeup(self):
+        if not self._handlers:
+            return self.poll_interval
+        kinds_clause, kinds = self._kinds_clause()
+        row = self._conn().execute(
+            f'SELECT MIN(run_after) FROM jobs WHERE status IN (?, ?, ?) AND {kinds_clause}',
+            (QUEUED, RETRYING, RUNNING) + kinds
+        ).fetchone()
+        if row[0] is None:
+            return self.poll_interval
+        return min(max(row[0] - time.time(), 0.01), self.poll_interval)
+
+    def _next_wakeup_or_poll(self):
+        try:
+            return self._next_wakeup()
+        except sqlite3.Error:
+            logger.exception("Error reading the next job due time")
+            return self.poll_interval
+
+    def _finish(self, job, status, result=None, error=None, run_after=None, attempts=None):
+        now = time.time()
+        self._conn().execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, run_after = ?, attempts = ?, updated_at = ? '
+            'WHERE id = ?',
+            (status, json.dumps(result) if result is not None else None, error,
+             run_after if run_after is not None else now,
+             attempts if attempts is not None else job['attempts'], now, job['id'])
+        )
+        self._notify(self._fetch(job['id']))
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _execute(self, job):
+        self._notify(job)
+        handler = self._handlers[job['kind']]
+        start = time.perf_counter()
+        try:
+            result = handler(job['payload'], job)
+        except PermanentJobError as e:
+            self._finish(job, FAILED, error=str(e))
+        except JobPending as e:
+            self._finish(job, RETRYING, error=str(e), attempts=job['attempts'] - 1,
+                         run_after=time.time() + self._backoff(job['attempts']))
+        except Exception as e:
+            if job['attempts'] >= job['max_attempts']:
+                self._finish(job, FAILED, error=str(e))
+            else:
+                self._finish(job, RETRYING, error=str(e), run_after=time.time() + self._backoff(job['attempts']))
+        else:
+            self._finish(job, SUCCEEDED, result=result)
+        finally:
+            JOB_DURATION_SECONDS.labels(job['kind']).observe(time.perf_counter() - start)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+                if job is not None:
+                    self._execute(job)
+                    continue
+            except Exception:
+                # Never lose a worker: a job left running is reclaimed when its lease runs out
+                logger.exception("Job worker error")
+            with self._wake:
+                self._wake.wait(self._next_wakeup_or_poll())
+
+    def _notify(self, job):
+        JOB_TRANSITIONS.labels(job['kind'], job['status']).inc()
+        for listener in self._listeners:
+            try:
+                listener(job)
+            except Exception:
+                logger.exception("Error in job listener")
+
+# Worker pool settings shared by the entry points
+JOBS_DIR = os.environ.get('JOBS_DIR', DATABASE_DIR)
+
+def jobs_path(name):
+    """Each entry point's own jobs file, so no app pays out another's withdrawals"""
+    return os.path.join(JOBS_DIR, f'{name}.jobs.db')
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
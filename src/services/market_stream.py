@@ -0,0 +1,259 @@
+"""
+Push-based market data over a persistent WebSocket subscription
+
+Instead of polling REST every 30 seconds, a MarketStream holds a
+subscription to the exchange's combined ticker stream (Binance by default)
+and hands every quote to its listeners the moment it arrives. The price
+cache and the trading engine therefore see quotes that are milliseconds
+old. The reader thread reconnects with jittered exponential backoff. It
+watches each symbol for gaps: a sequence jump, events arriving further
+apart than the feed's push interval, or a lost connection. On a gap,
+``on_gap`` listeners can resync from a REST snapshot.
+
+    market_stream.add_listener(lambda quotes: price_cache.update(quotes))
+    market_stream.start()
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import simple_websocket
+
+from src.services.coins import coin_registry
+from src.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BINANCE_STREAM_BASE = 'wss://stream.binance.com:9443'
+
+STREAM_MESSAGES = REGISTRY.counter(
+    'market_stream_messages_total', 'Messages received on the market data stream', ['stream']
+)
+STREAM_GAPS = REGISTRY.counter(
+    'market_stream_gaps_total', 'Detected gaps in the market data stream', ['stream', 'reason']
+)
+STREAM_RECONNECTS = REGISTRY.counter(
+    'market_stream_reconnects_total', 'Market data stream connection attempts after the first', ['stream']
+)
+STREAM_CONNECTED = REGISTRY.gauge(
+    'market_stream_connected', 'Whether the market data stream is connected (1) or not (0)', ['stream']
+)
+STREAM_LATENCY_SECONDS = REGISTRY.histogram(
+    'market_stream_latency_seconds', 'Exchange event time to local delivery of a streamed quote', ['stream']
+)
+
+def binance_stream_url(coins, base=BINANCE_STREAM_BASE):
+    """Combined 24h-ticker stream URL for the coins Binance lists"""
+    streams = '/'.join(f'{coin.binance_symbol.lower()}@ticker' for coin in coins if coin.binance_symbol)
+    return f'{base}/stream?streams={streams}'
+
+def binance_ticker_parser(registry=None):
+    """``parse(message)`` for Binance (combined or raw) 24h ticker events.
+
+    Returns ``[(symbol, quote, event_time, seq)]``. Ticker events carry no
+    contiguous sequence number, so ``seq`` is None and gaps are found from
+    event times.
+    """
+    def parse(message):
+        data = json.loads(message)
+        data = data.get('data', data) if isinstance(data, dict) else data
+        events = []
+        for event in data if isinstance(data, list) else [data]:
+            if event.get('e') != '24hrTicker':
+                continue
+            coin = (registry or coin_registry).by_binance_symbol(event.get('s'))
+            if coin is None:
+                continue
+            events.append((coin.symbol, {
+                'price': float(event['c']),
+                'change_24h': float(event.get('P', 0)),
+                'volume_24h': float(event.get('q', 0)),
+                'market_cap': 0  # Not available from Binance
+            }, event.get('E', 0) / 1000, None))
+        return events
+    return parse
+
+def _close(ws):
+    try:
+        ws.close()
+    except simple_websocket.ConnectionClosed:
+        pass  # the peer already closed it
+
+class MarketStream:
+    """Reader thread for one streaming URL, fanning quotes out to listeners.
+
+    ``parse(message)`` turns a text frame into ``(symbol, quote, event_time,
+    seq)`` tuples. Listeners get ``{symbol: quote}`` per message.
+    ``on_gap(symbols, reason)`` listeners run on the reader thread after a
+    reconnect or when a symbol's events skip (``seq`` not contiguous) or
+    arrive more than ``gap_seconds`` apart. No message for ``idle_timeout``
+    seconds counts as a dead connection.
+    """
+
+    def __init__(self, url, parse, name='market', gap_seconds=5.0, idle_timeout=30.0,
+                 backoff_initial=0.5, backoff_max=30.0, ping_interval=20.0):
+        self.url = url
+        self.parse = parse
+        self.name = name
+        self.gap_seconds = gap_seconds
+        self.idle_timeout = idle_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.ping_interval = ping_interval
+        self.quotes = {}            # symbol -> latest quote
+        self.received_at = {}       # symbol -> local time.time() of the latest quote
+        self._last_event = {}       # symbol -> (event_time, seq)
+        self._listeners = []
+        self._gap_listeners = []
+        self._ws = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.connected = False
+        self.connects = 0
+        STREAM_CONNECTED.labels(name).set_function(lambda: 1.0 if self.connected else 0.0)
+
+    # ------------------------------------------------------------ public API
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+        return listener
+
+    def on_gap(self, listener):
+        self._gap_listeners.append(listener)
+        return listener
+
+    def fresh(self, symbols=None, max_age=None):
+        """Whether the stream is connected and has a recent quote for every symbol"""
+        if not self.connected:
+            return False
+        max_age = self.gap_seconds if max_age is None else max_age
+        now = time.time()
+        for symbol in (symbols if symbols is not None else self.quotes):
+            received = self.received_at.get(symbol)
+            if received is None or now - received > max_age:
+                return False
+        return bool(self.quotes)
+
+    def snapshot(self):
+        return {symbol: dict(quote) for symbol, quote in self.quotes.items()}
+
+    def start(self):
+        """Start the reader thread (idempotent); a blank URL leaves the stream off"""
+        if not self.url or (self._thread is not None and self._thread.is_alive()):
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'{self.name}-stream', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            _close(ws)
+
+    # ------------------------------------------------------------ internals
+
+    def _run(self):
+        delay = self.backoff_initial
+        while not self._stop.is_set():
+            if self.connects:
+                STREAM_RECONNECTS.labels(self.name).inc()
+            self.connects += 1
+            try:
+                self._ws = simple_websocket.Client.connect(self.url, ping_interval=self.ping_interval)
+            except Exception as e:
+                logger.warning("Error connecting to %s stream: %s", self.name, e)
+            else:
+                self.connected = True
+                self._last_event.clear()
+                # Whatever happened while we were away is unknown: resync first
+                if self.quotes:
+                    self._gap(list(self.quotes), 'reconnect')
+                try:
+                    if self._read(self._ws):
+                        delay = self.backoff_initial  # the connection was healthy for a while
+                except Exception:
+                    logger.exception("Error reading %s stream", self.name)
+                finally:
+                    self.connected = False
+                    _close(self._ws)
+                    self._ws = None
+            # Jitter keeps a fleet of workers from reconnecting in lockstep
+            if self._stop.wait(delay * (0.5 + random.random() / 2)):
+                return
+            delay = min(delay * 2, self.backoff_max)
+
+    def _read(self, ws):
+        """Deliver messages until the connection drops; True if any message arrived"""
+        received = False
+        while not self._stop.is_set():
+            try:
+                message = ws.receive(timeout=self.idle_timeout)
+            except simple_websocket.ConnectionClosed:
+                return received
+            if message is None:
+                logger.warning("%s stream idle for %ss, reconnecting", self.name, self.idle_timeout)
+                STREAM_GAPS.labels(self.name, 'idle').inc()
+                return received
+            received = True
+            STREAM_MESSAGES.labels(self.name).inc()
+            try:
+                events = self.parse(message)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning("Error parsing %s stream message: %s", self.name, e)
+                continue
+            self._deliver(events)
+        return received
+
+    def _deliver(self, events):
+        now = time.time()
+        quotes, gaps = {}, []
+        for symbol, quote, event_time, seq in events:
+            last = self._last_event.get(symbol)
+            if last is not None:
+                last_time, last_seq = last
+                if seq is not None and last_seq is not None:
+                    if seq <= last_seq:
+                        continue  # duplicate or replayed event
+                    if seq != last_seq + 1:
+                        gaps.append((symbol, 'sequence'))
+                elif event_time and last_time:
+                    if event_time < last_time:
+                        continue  # out of order, a newer quote is already applied
+                    if event_time - last_time > self.gap_seconds:
+                        gaps.append((symbol, 'interval'))
+            self._last_event[symbol] = (event_time, seq)
+            if event_time:
+                STREAM_LATENCY_SECONDS.labels(self.name).observe(max(now - event_time, 0.0))
+            self.quotes[symbol] = quote
+            self.received_at[symbol] = now
+            quotes[symbol] = quote
+
+        for reason in {reason for _, reason in gaps}:
+            self._gap([symbol for symbol, r in gaps if r == reason], reason)
+        if quotes:
+            for listener in self._listeners:
+                try:
+                    listener(quotes)
+                except Exception:
+                    logger.exception("Error in %s stream listener", self.name)
+
+    def _gap(self, symbols, reason):
+        STREAM_GAPS.labels(self.name, reason).inc()
+        for listener in self._gap_listeners:
+            try:
+                listener(symbols, reason)
+            except Exception:
+                logger.exception("Error in %s stream gap listener", self.name)
+
+# Process-wide stream of the tracked coins; MARKET_STREAM_URL='' turns it off
+MARKET_STREAM_URL = os.environ.get('MARKET_STREAM_URL', binance_stream_url(coin_registry.tracked()))
+market_stream = MarketStream(
+    MARKET_STREAM_URL, binance_ticker_parser(),
+    gap_seconds=float(os.environ.get('MARKET_STREAM_GAP_SECONDS', 5))
+)
@@ -0,0 +1,352 @@
+"""
+In-process metrics registry with Prometheus text exposition
+
+Counters, gauges and fixed-bucket histograms with labels. Label children
+are created once and cached, so recording a sample is a dict lookup, a lock
+and an addition. ``REGISTRY.render()`` produces the text format served at
+/metrics.
+
+    TRADES = REGISTRY.counter('trades_total', 'Executed trades', ['bot'])
+    TRADES.labels(bot='alpha').inc()
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets in seconds, from sub-millisecond work up to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _label_string(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}  # label values as strings -> child, used for rendering
+        self._lookup = {}    # label values as passed by callers -> child
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labels):
+        """Child metric for one label combination (cached after first use)"""
+        if labels:
+            values = tuple(labels[n] for n in self.labelnames)
+        child = self._lookup.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            key = tuple(str(v) for v in values)
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+                self._lookup[values] = child
+        return child
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield f'{self.name}{_label_string(self.labelnames, values)} {_format_value(child.value)}'
+
+class _GaugeChild:
+    __slots__ = ('value', 'function', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Compute the value at scrape time instead of storing it"""
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return math.nan
+        return self.value
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default.dec(amount)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield f'{self.name}{_label_string(self.labelnames, values)} {_format_value(child.get())}'
+
+class _Timer:
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(b for b in buckets if b != math.inf))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total, count = child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds + (math.inf,), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                yield f'{self.name}_bucket{_label_string(self.labelnames, values, le)} {cumulative}'
+            labels = _label_string(self.labelnames, values)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {count}'
+
+class Registry:
+    """Named collection of metrics; creating an existing name returns it"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f'{name} already registered as a {metric.kind}')
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+REGISTRY = Registry()
+
+# Metrics shared across entry points
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ['method', 'route', 'status']
+)
+TRADE_EXECUTION_SECONDS = REGISTRY.histogram(
+    'trade_execution_duration_seconds', 'TradingBot.execute_trade duration', ['strategy']
+)
+ENGINE_TICK_SECONDS = REGISTRY.histogram(
+    'engine_tick_duration_seconds', 'Time spent in one engine loop iteration', ['engine']
+)
+ENGINE_TICK_JITTER_SECONDS = REGISTRY.histogram(
+    'engine_tick_jitter_seconds', 'Delay between the scheduled and actual start of an engine tick', ['engine']
+)
+PROVIDER_REQUEST_SECONDS = REGISTRY.histogram(
+    'provider_request_duration_seconds', 'Upstream market-data request latency', ['provider', 'endpoint']
+)
+PROVIDER_FAILURES = REGISTRY.counter(
+    'provider_failures_total', 'Failed upstream market-data requests', ['provider', 'endpoint', 'reason']
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    'cache_requests_total', 'Cache lookups by outcome', ['cache', 'result']
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    'cache_hit_ratio', 'Hits over lookups since start', ['cache']
+)
+SOCKETIO_EMIT_SECONDS = REGISTRY.histogram(
+    'socketio_emit_duration_seconds', 'Time to fan one broadcast out to all clients', ['event']
+)
+SOCKETIO_CLIENTS = REGISTRY.gauge(
+    'socketio_connected_clients', 'Currently connected Socket.IO clients'
+)
+
+def record_cache(cache, hit):
+    """Count a cache lookup and keep the cache's hit-ratio gauge wired up"""
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+    gauge = CACHE_HIT_RATIO.labels(cache)
+    if gauge.function is None:
+        hits = CACHE_REQUESTS.labels(cache, 'hit')
+        misses = CACHE_REQUESTS.labels(cache, 'miss')
+        gauge.set_function(lambda: hits.value / max(hits.value + misses.value, 1))
+
+class TickTimer:
+    """Records tick duration and jitter for a loop that sleeps between ticks"""
+
+    def __init__(self, engine):
+        self._duration = ENGINE_TICK_SECONDS.labels(engine)
+        self._jitter = ENGINE_TICK_JITTER_SECONDS.labels(engine)
+        self._due = None
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+        if self._due is not None:
+            self._jitter.observe(max(self._start - self._due, 0.0))
+
+    def finish(self, sleep_seconds):
+        """Call right before sleeping ``sleep_seconds`` until the next tick"""
+        end = time.perf_counter()
+        self._duration.observe(end - self._start)
+        self._due = end + sleep_seconds
+
+def timed_emit(socketio, event, *args, **kwargs):
+    """socketio.emit() that records broadcast fan-out time"""
+    start = time.perf_counter()
+    socketio.emit(event, *args, **kwargs)
+    SOCKETIO_EMIT_SECONDS.labels(event).observe(time.perf_counter() - start)
+
+def install_request_metrics(app):
+    """Time every request by its route pattern (not the raw path).
+
+    The observation is made at teardown, which runs even when a view or
+    another after_request hook raises; such requests count as 500s.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _capture_response_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _record_request_latency(exc):
+        start = g.pop('_metrics_start', None)
+        status = g.pop('_metrics_status', None)
+        if start is not None:
+            if exc is not None or status is None:
+                status = 500
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.labels(request.method, route, status).observe(
+                time.perf_counter() - start
+            )
+
+    return app
@@ -0,0 +1,256 @@
+"""
+Shared, proactively refreshed OAuth access tokens
+
+A TokenManager holds one access token per credential set and renews it on a
+background thread a jittered margin before it expires, so callers always
+get a valid token from memory. Refreshes are single-flight: within a
+process only one thread ever talks to the token endpoint, and across worker
+processes a file lock plus a shared cache file make sure one process
+refreshes and the others adopt its token.
+
+    tokens = TokenManager(client_credentials_fetcher(url, client_id, secret), name='paypal').start()
+    headers = {'Authorization': f'Bearer {tokens.get()}'}
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks on this platform; the cache still works per process
+    fcntl = None
+
+import requests
+
+from src.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database')
+
+TOKEN_REFRESHES = REGISTRY.counter(
+    'oauth_token_refreshes_total', 'Access token refresh attempts', ['name', 'result']
+)
+TOKEN_TTL_SECONDS = REGISTRY.gauge(
+    'oauth_token_ttl_seconds', 'Seconds until the current access token expires', ['name']
+)
+
+class Token:
+    __slots__ = ('access_token', 'expires_at', 'issued_at')
+
+    def __init__(self, access_token, expires_at, issued_at=None):
+        self.access_token = access_token
+        self.expires_at = expires_at
+        self.issued_at = issued_at if issued_at is not None else time.time()
+
+    def ttl(self, now=None):
+        return self.expires_at - (now if now is not None else time.time())
+
+    def to_dict(self):
+        return {'access_token': self.access_token, 'expires_at': self.expires_at, 'issued_at': self.issued_at}
+
+def client_credentials_fetcher(token_url, client_id, client_secret, timeout=10):
+    """``fetch()`` for TokenManager doing an OAuth2 client-credentials grant"""
+    def fetch():
+        response = requests.post(
+            token_url, data={'grant_type': 'client_credentials'}, auth=(client_id, client_secret),
+            headers={'Accept': 'application/json'}, timeout=timeout
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data['access_token'], float(data.get('expires_in', 3600))
+    return fetch
+
+class TokenManager:
+    """Keeps a valid access token in memory and renews it before expiry.
+
+    ``fetch()`` returns ``(access_token, expires_in_seconds)``. Renewal is
+    due ``refresh_margin`` seconds before expiry, moved earlier by up to
+    ``jitter`` of the margin so processes sharing a credential do not all
+    wake at once. ``on_refresh(token)`` listeners see every new token.
+
+    ``start()`` returns at once; the first token is fetched on the refresher
+    thread, and ``get()`` waits up to ``first_token_timeout`` seconds for
+    that attempt before fetching inline.
+    """
+
+    def __init__(self, fetch, name='default', cache_path=None, refresh_margin=300.0, jitter=0.2,
+                 retry_initial=1.0, retry_max=60.0, first_token_timeout=15.0):
+        self.fetch = fetch
+        self.name = name
+        self.cache_path = cache_path if cache_path is not None else os.path.join(DATABASE_DIR, f'oauth-{name}.json')
+        self.refresh_margin = refresh_margin
+        self.jitter = jitter
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self.first_token_timeout = first_token_timeout
+        self._token = None
+        self._first_attempt = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._listeners = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._renew_at = None
+        TOKEN_TTL_SECONDS.labels(name).set_function(lambda: self._token.ttl() if self._token else 0.0)
+
+    # ------------------------------------------------------------ public API
+
+    def get(self):
+        """Current access token; only blocks if no token was ever obtained"""
+        token = self._token
+        if token is not None and token.ttl() > 0:
+            return token.access_token
+        if self._thread is not None and self._thread.is_alive():
+            # The refresher is fetching the first token: share its call instead of starting another
+            self._first_attempt.wait(self.first_token_timeout)
+        return self.refresh(force=False).access_token
+
+    def on_refresh(self, listener):
+        self._listeners.append(listener)
+        if self._token is not None:
+            listener(self._token)
+        return listener
+
+    def start(self):
+        """Start the background refresher, which fetches the first token right away (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'oauth-refresh-{self.name}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def refresh(self, force=True):
+        """Single-flight refresh: concurrent callers share one token endpoint call.
+
+        With ``force=False`` a token that is still outside its renewal window
+        (ours or one another process cached) is returned without fetching.
+        """
+        seen = self._token
+        with self._refresh_lock:
+            # Someone else refreshed while we waited for the lock
+            if self._token is not None and self._token is not seen and self._token.ttl() > 0:
+                return self._token
+            if not force and self._fresh(self._token):
+                return self._token
+            with self._file_lock():
+                cached = self._read_cache()
+                if cached is not None and self._fresh(cached) and (
+                    not force or seen is None or cached.issued_at > seen.issued_at
+                ):
+                    self._install(cached)
+                    TOKEN_REFRESHES.labels(self.name, 'shared').inc()
+                    return cached
+                try:
+                    access_token, expires_in = self.fetch()
+                except Exception:
+                    TOKEN_REFRESHES.labels(self.name, 'error').inc()
+                    raise
+                now = time.time()
+                token = Token(access_token, now + expires_in, now)
+                self._write_cache(token)
+            self._install(token)
+            TOKEN_REFRESHES.labels(self.name, 'fetched').inc()
+            return token
+
+    # ------------------------------------------------------------ internals
+
+    def _fresh(self, token):
+        return token is not None and token.ttl() > self.refresh_margin
+
+    def _install(self, token):
+        self._token = token
+        margin = self.refresh_margin * (1 + self.jitter * random.random())
+        # Tokens shorter-lived than the margin renew at half their lifetime instead
+        self._renew_at = token.expires_at - min(margin, (token.expires_at - token.issued_at) / 2)
+        for listener in self._listeners:
+            try:
+                listener(token)
+            except Exception:
+                logger.exception("Error in %s token listener", self.name)
+
+    def _run(self):
+        delay = self.retry_initial
+        wait = 0  # the first token is fetched at once, off the thread that called start()
+        while not self._stop.wait(wait):
+            try:
+                # The first fetch adopts a token that is still fresh; renewals always fetch
+                self.refresh(force=self._token is not None)
+            except Exception:
+                logger.exception("Error refreshing %s access token", self.name)
+                # Retry with backoff; callers keep using the current token while it is valid
+                wait = delay
+                delay = min(delay * 2, self.retry_max)
+            else:
+                delay = self.retry_initial
+                wait = max(self._renew_at - time.time(), 0)
+            finally:
+                self._first_attempt.set()
+
+    def _file_lock(self):
+        return _FileLock(self.cache_path + '.lock')
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            return Token(data['access_token'], data['expires_at'], data['issued_at'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_cache(self, token):
+        tmp = f'{self.cache_path}.{os.getpid()}.tmp'
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(token.to_dict(), f)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            logger.exception("Error caching %s access token", self.name)
+
+class _FileLock:
+    """Exclusive advisory lock on a file, a no-op where fcntl is unavailable"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except OSError:
+            self._fd = None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        return False
+
+def install_sdk_token(api, manager):
+    """Feed a TokenManager's tokens into a paypalrestsdk Api so it never fetches inline"""
+    import datetime
+
+    def apply(token):
+        api.token_hash = {
+            'access_token': token.access_token,
+            'token_type': 'Bearer',
+            'expires_in': max(int(token.ttl()), 0)
+        }
+        api.token_request_at = datetime.datetime.now()
+
+    manager.on_refresh(apply)
+    return manager
@@ -0,0 +1,328 @@
+"""
+Per-symbol L2 limit order books fed by snapshot + delta depth streams
+
+Each side keeps its price levels in a sorted list plus a price -> size
+dict. Changing a level's size is a dict store (O(1)) and the best bid and
+ask are the ends of the lists (O(1)). Adding or removing a level is a
+bisect plus a list insert or delete, which is O(n) in the number of levels.
+At the 1000 levels of a Binance snapshot that is a memmove of a few KiB.
+Depth, imbalance and microprice only touch the top levels, so strategies
+can query every tick.
+
+Books follow the exchange's diff-depth protocol. Deltas that arrive before
+the REST snapshot are buffered. Once the snapshot lands, the buffered
+deltas already covered by it are dropped and the rest replayed. After
+that, every delta must continue the update-id sequence. A gap marks the
+book unsynced until a fresh snapshot arrives.
+
+    book = order_books.get('eth')
+    if book.synced:
+        book.best_bid(), book.imbalance(levels=5), book.microprice()
+"""
+
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+
+from src.services.coins import BINANCE_BASE, coin_registry
+from src.services.market_stream import BINANCE_STREAM_BASE, MarketStream
+from src.services.metrics import REGISTRY
+from src.services.rate_limit import PRIORITY_DEFAULT
+from src.services.upstream import fetch
+
+logger = logging.getLogger(__name__)
+
+BOOK_UPDATES = REGISTRY.counter(
+    'order_book_updates_total', 'Depth deltas applied to order books', ['symbol']
+)
+BOOK_RESYNCS = REGISTRY.counter(
+    'order_book_resyncs_total', 'Order book snapshot reloads', ['symbol', 'reason']
+)
+
+class BookGap(Exception):
+    """A delta does not continue the book's update-id sequence"""
+
+class BookSide:
+    """Price levels of one side; ``descending`` for bids, so the best level is always ``best()``"""
+
+    __slots__ = ('descending', 'prices', 'sizes')
+
+    def __init__(self, descending):
+        self.descending = descending
+        self.prices = []    # ascending
+        self.sizes = {}
+
+    def clear(self):
+        self.prices = []
+        self.sizes = {}
+
+    def set(self, price, size):
+        """Set a level's size; zero removes it. Adding or removing a level is O(n) in the depth"""
+        if size:
+            if price not in self.sizes:
+                insort(self.prices, price)
+            self.sizes[price] = size
+        elif self.sizes.pop(price, None) is not None:
+            del self.prices[bisect_left(self.prices, price)]
+
+    def best(self):
+        if not self.prices:
+            return None
+        price = self.prices[-1] if self.descending else self.prices[0]
+        return price, self.sizes[price]
+
+    def top(self, levels):
+        """Best ``levels`` as (price, size), best first"""
+        prices = self.prices[-levels:][::-1] if self.descending else self.prices[:levels]
+        return [(price, self.sizes[price]) for price in prices]
+
+    def volume(self, levels):
+        prices = self.prices[-levels:] if self.descending else self.prices[:levels]
+        return sum(self.sizes[price] for price in prices)
+
+    def volume_to(self, limit):
+        """Total size at prices at least as good as ``limit``"""
+        if self.descending:
+            prices = self.prices[bisect_left(self.prices, limit):]
+        else:
+            prices = self.prices[:bisect_right(self.prices, limit)]
+        return sum(self.sizes[price] for price in prices)
+
+    def __len__(self):
+        return len(self.prices)
+
+class OrderBook:
+    def __init__(self, symbol, max_buffer=1000):
+        self.symbol = symbol
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.last_update_id = 0
+        self.synced = False
+        self._buffer = deque(maxlen=max_buffer)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------ updates
+
+    def apply_snapshot(self, bids, asks, last_update_id):
+        """Replace the book with a REST snapshot and replay buffered deltas it does not cover"""
+        with self._lock:
+            self.bids.clear()
+            self.asks.clear()
+            for price, size in bids:
+                self.bids.set(float(price), float(size))
+            for price, size in asks:
+                self.asks.set(float(price), float(size))
+            self.last_update_id = last_update_id
+            self.synced = True
+            buffered, self._buffer = list(self._buffer), deque(maxlen=self._buffer.maxlen)
+            try:
+                for delta in buffered:
+                    self._apply(*delta)
+            except BookGap:
+                return False
+            return True
+
+    def apply_delta(self, bids, asks, first_update_id, final_update_id):
+        """Apply one diff-depth event; False if it was buffered or already covered.
+
+        Raises BookGap (and marks the book unsynced) when updates were missed.
+        """
+        with self._lock:
+            if not self.synced:
+                self._buffer.append((bids, asks, first_update_id, final_update_id))
+                return False
+            try:
+                return self._apply(bids, asks, first_update_id, final_update_id)
+            except BookGap:
+                # Keep it for the replay after the next snapshot
+                self._buffer.append((bids, asks, first_update_id, final_update_id))
+                raise
+
+    def _apply(self, bids, asks, first_update_id, final_update_id):
+        if final_update_id <= self.last_update_id:
+            return False
+        if first_update_id > self.last_update_id + 1:
+            self.synced = False
+            raise BookGap(
+                f'{self.symbol}: expected update {self.last_update_id + 1}, got {first_update_id}'
+            )
+        for price, size in bids:
+            self.bids.set(float(price), float(size))
+        for price, size in asks:
+            self.asks.set(float(price), float(size))
+        self.last_update_id = final_update_id
+        BOOK_UPDATES.labels(self.symbol).inc()
+        return True
+
+    def reset(self):
+        """Forget the levels and buffer deltas until the next snapshot"""
+        with self._lock:
+            self.synced = False
+            self.bids.clear()
+            self.asks.clear()
+
+    # ------------------------------------------------------------ queries
+
+    def _touch(self):
+        with self._lock:
+            return self.bids.best(), self.asks.best()
+
+    def best_bid(self):
+        return self._touch()[0]
+
+    def best_ask(self):
+        return self._touch()[1]
+
+    def mid(self):
+        bid, ask = self._touch()
+        if bid is None or ask is None:
+            return None
+        return (bid[0] + ask[0]) / 2
+
+    def spread(self):
+        bid, ask = self._touch()
+        if bid is None or ask is None:
+            return None
+        return ask[0] - bid[0]
+
+    def spread_bps(self):
+        bid, ask = self._touch()
+        if bid is None or ask is None:
+            return None
+        return (ask[0] - bid[0]) / (bid[0] + ask[0]) * 20000
+
+    def depth(self, levels=10):
+        with self._lock:
+            return {'bids': self.bids.top(levels), 'asks': self.asks.top(levels)}
+
+    def volume_within(self, bps):
+        """(bid size, ask size) within ``bps`` basis points of the mid"""
+        with self._lock:
+            bid, ask = self.bids.best(), self.asks.best()
+            if bid is None or ask is None:
+                return 0.0, 0.0
+            mid = (bid[0] + ask[0]) / 2
+            band = mid * bps / 10000
+            return self.bids.volume_to(mid - band), self.asks.volume_to(mid + band)
+
+    def imbalance(self, levels=5):
+        """(bid volume - ask volume) / total over the top levels, in [-1, 1]"""
+        with self._lock:
+            bid_volume, ask_volume = self.bids.volume(levels), self.asks.volume(levels)
+        total = bid_volume + ask_volume
+        return (bid_volume - ask_volume) / total if total else 0.0
+
+    def microprice(self):
+        """Mid weighted towards the side with less size at the touch"""
+        bid, ask = self._touch()
+        if bid is None or ask is None:
+            return None
+        (bid_price, bid_size), (ask_price, ask_size) = bid, ask
+        return (bid_price * ask_size + ask_price * bid_size) / (bid_size + ask_size)
+
+    def top_of_book(self):
+        bid, ask = self._touch()
+        if bid is None or ask is None:
+            return {'bid': None, 'ask': None, 'mid': None, 'microprice': None,
+                    'last_update_id': self.last_update_id}
+        (bid_price, bid_size), (ask_price, ask_size) = bid, ask
+        return {
+            'bid': bid_price,
+            'ask': ask_price,
+            'mid': (bid_price + ask_price) / 2,
+            'microprice': (bid_price * ask_size + ask_price * bid_size) / (bid_size + ask_size),
+            'last_update_id': self.last_update_id
+        }
+
+def fetch_binance_depth_snapshot(symbol, limit=1000):
+    """(bids, asks, last_update_id) from Binance's REST depth endpoint"""
+    coin = coin_registry.get(symbol)
+    response = fetch('binance', 'depth', f'{BINANCE_BASE}/depth', params={
+        'symbol': coin.binance_symbol, 'limit': limit
+    }, timeout=10, priority=PRIORITY_DEFAULT)
+    if response.status_code != 200:
+        raise RuntimeError(f"Binance depth API error: {response.status_code}")
+    data = response.json()
+    return data['bids'], data['asks'], data['lastUpdateId']
+
+class OrderBooks:
+    """Books by symbol, each reloaded from a snapshot (one fetch at a time) whenever it desyncs"""
+
+    def __init__(self, fetch_snapshot=fetch_binance_depth_snapshot):
+        self.fetch_snapshot = fetch_snapshot
+        self._books = {}
+        self._resyncing = set()
+        self._lock = threading.Lock()
+
+    def get(self, symbol):
+        book = self._books.get(symbol)
+        if book is None:
+            with self._lock:
+                book = self._books.setdefault(symbol, OrderBook(symbol))
+        return book
+
+    def resync(self, symbol, reason='gap'):
+        """Reload a book from a snapshot in the background; deltas buffer meanwhile"""
+        with self._lock:
+            if symbol in self._resyncing:
+                return
+            self._resyncing.add(symbol)
+        book = self.get(symbol)
+        book.reset()
+        BOOK_RESYNCS.labels(symbol, reason).inc()
+
+        def load():
+            try:
+                if not book.apply_snapshot(*self.fetch_snapshot(symbol)):
+                    logger.warning("Order book %s still behind after snapshot, reloading", symbol)
+                    threading.Timer(1.0, self.resync, (symbol, 'gap')).start()
+            except Exception:
+                logger.exception("Error loading %s order book snapshot", symbol)
+            finally:
+                with self._lock:
+                    self._resyncing.discard(symbol)
+
+        threading.Thread(target=load, name=f'order-book-{symbol}', daemon=True).start()
+
+    def binance_depth_parser(self):
+        """``parse(message)`` for MarketStream that applies diff-depth events to these books"""
+        def parse(message):
+            data = json.loads(message)
+            event = data.get('data', data)
+            if event.get('e') != 'depthUpdate':
+                return []
+            coin = coin_registry.by_binance_symbol(event.get('s'))
+            if coin is None:
+                return []
+            book = self.get(coin.symbol)
+            try:
+                book.apply_delta(event['b'], event['a'], event['U'], event['u'])
+            except BookGap as e:
+                logger.warning("Order book gap: %s", e)
+                self.resync(coin.symbol)
+                return []
+            if not book.synced:
+                if coin.symbol not in self._resyncing:
+                    self.resync(coin.symbol, 'initial')
+                return []
+            return [(coin.symbol, book.top_of_book(), event.get('E', 0) / 1000, None)]
+        return parse
+
+def binance_depth_url(coins, base=BINANCE_STREAM_BASE):
+    """Combined diff-depth (100 ms) stream URL for the coins Binance lists"""
+    streams = '/'.join(f'{coin.binance_symbol.lower()}@depth@100ms' for coin in coins if coin.binance_symbol)
+    return f'{base}/stream?streams={streams}'
+
+# Process-wide books for the tracked coins and the depth stream that maintains them;
+# DEPTH_STREAM_URL='' turns the stream off
+order_books = OrderBooks()
+DEPTH_STREAM_URL = os.environ.get('DEPTH_STREAM_URL', binance_depth_url(coin_registry.tracked()))
+depth_stream = MarketStream(DEPTH_STREAM_URL, order_books.binance_depth_parser(), name='depth')
+
+@depth_stream.on_gap
+def _resync_books(symbols, reason):
+    for symbol in symbols:
+        order_books.resync(symbol, reason)
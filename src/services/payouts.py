@@ -0,0 +1,441 @@
+"""
+Batched payout pipeline
+
+Withdrawals are queued as individual payout items and a worker thread
+coalesces everything that arrives within a short window (or until the batch
+is full) into one multi-item payout call. Callers wait on their own item and
+read its status, which the worker fills in from the batch response.
+
+Payouts are made safe to retry by reusing IDs, never by minting new ones:
+- An item's ``sender_item_id`` is derived from the caller's idempotency key,
+  so every attempt for the same withdrawal, even after a restart, carries
+  the same ID.
+- A batch's ``sender_batch_id`` is derived from its items' IDs and doubles
+  as the request's idempotency key (PayPal-Request-Id). The provider only
+  deduplicates per batch, not per item across batches, so a caller that
+  may resubmit an item after a restart records the batch ID before the
+  first call (``on_batched``) and passes it back (``batch_id=``): the item
+  is then resent alone under its original batch ID.
+- A batch call that raises has an unknown outcome: the provider may have
+  paid it before the connection broke. Its items move to ``unknown`` and
+  the same batch is resent with the same IDs until the service answers, so
+  a provider that saw the first call replays its result instead of paying
+  again. Only ``PayoutRejected``, a definite refusal from the provider,
+  fails the batch's items.
+
+    queue = PayoutQueue(LocalPayoutService())
+    item = queue.submit('user@example.com', 25.0, idempotency_key='withdrawal-42')
+    item.wait(5)
+    item.status   # 'success'
+"""
+
+import hashlib
+import heapq
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from src.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Item lifecycle: queued -> submitted -> success | failed, with unknown while a
+# batch is being resent (submitted may be final for real PayPal batches, which
+# complete asynchronously on PayPal's side)
+QUEUED = 'queued'
+SUBMITTED = 'submitted'
+UNKNOWN = 'unknown'
+SUCCESS = 'success'
+FAILED = 'failed'
+
+PAYOUT_BATCH_SIZE = REGISTRY.histogram(
+    'payout_batch_size', 'Items per submitted payout batch', buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+PAYOUT_BATCH_SECONDS = REGISTRY.histogram(
+    'payout_batch_duration_seconds', 'Payout service call duration per batch'
+)
+PAYOUT_ITEMS = REGISTRY.counter(
+    'payout_items_total', 'Payout items by final status', ['status']
+)
+PAYOUT_RESENDS = REGISTRY.counter(
+    'payout_batch_resends_total', 'Payout batches resent after a call with an unknown outcome'
+)
+
+class PayoutRejected(Exception):
+    """The payout service answered and refused the whole batch, so nothing was paid"""
+
+def parse_amount(value):
+    """A withdrawal amount as a positive, finite float rounded to cents, or None"""
+    if isinstance(value, bool):
+        return None
+    try:
+        amount = round(float(value), 2)
+    except (TypeError, ValueError):
+        return None
+    return amount if math.isfinite(amount) and amount > 0 else None
+
+def _stable_id(prefix, *parts):
+    digest = hashlib.blake2b('\x1f'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+    return f'{prefix}_{digest}'
+
+def item_id_for(idempotency_key):
+    """The sender_item_id every attempt for ``idempotency_key`` uses"""
+    return _stable_id('item', str(idempotency_key))
+
+def batch_id_for(items):
+    """The sender_batch_id of a batch, the same whenever the same items are sent together"""
+    return _stable_id('batch', *sorted(item.id for item in items))
+
+class PayoutItem:
+    """One withdrawal inside a payout batch"""
+
+    def __init__(self, email, amount, currency='USD', note=None, idempotency_key=None, batch_id=None):
+        # sender_item_id: stable per idempotency key, random for one-off payouts
+        self.id = item_id_for(idempotency_key) if idempotency_key is not None else uuid.uuid4().hex
+        self.email = email
+        self.amount = round(float(amount), 2)
+        self.currency = currency
+        self.note = note or 'Withdrawal from Black Sultan OS Trading Platform'
+        self.idempotency_key = idempotency_key
+        self.status = QUEUED
+        self.batch_id = batch_id            # our sender_batch_id
+        self.payout_batch_id = None         # provider's batch id
+        self.payout_item_id = None          # provider's item id, when it reports one
+        self.error = None
+        self.created_at = time.time()
+        self.completed_at = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._batched_callbacks = []
+        self._batch_recorded = batch_id is not None
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the item's batch has been processed; False on timeout"""
+        return self._done.wait(timeout)
+
+    def _record_batch(self):
+        """Run the on_batched callbacks once; an exception propagates and they run again next time"""
+        if not self._batch_recorded:
+            for callback in self._batched_callbacks:
+                callback(self)
+            self._batch_recorded = True
+
+    def _complete(self, status, error=None, payout_item_id=None):
+        self.status = status
+        self.error = error
+        self.payout_item_id = payout_item_id
+        self.completed_at = time.time()
+        PAYOUT_ITEMS.labels(status).inc()
+        # Callbacks run before waiters wake, so they see the settled state
+        for callback in self._callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logger.exception("Error in payout completion callback")
+        self._done.set()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'email': self.email,
+            'amount': self.amount,
+            'currency': self.currency,
+            'status': self.status,
+            'batch_id': self.batch_id,
+            'payout_batch_id': self.payout_batch_id,
+            'payout_item_id': self.payout_item_id,
+            'error': self.error,
+            'created_at': self.created_at,
+            'completed_at': self.completed_at,
+        }
+
+class LocalPayoutService:
+    """In-process stand-in for a payout API, for tests and benchmarks.
+
+    Every call costs ``latency`` seconds regardless of batch size (like an
+    API round trip); receivers in ``fail_emails`` are rejected. Like PayPal,
+    it is idempotent per batch only: a sender_batch_id it has already
+    processed gets the first response back, but an item sent again in a new
+    batch is paid again. ``lose_responses`` makes that many calls process
+    the batch and then raise, as if the response was lost.
+    """
+
+    def __init__(self, latency=0.05, fail_emails=(), lose_responses=0):
+        self.latency = latency
+        self.fail_emails = set(fail_emails)
+        self.lose_responses = lose_responses
+        self.batches = []
+        self.payments = []                  # (sender_item_id, email, amount), one per actual payment
+        self._responses = {}                # sender_batch_id -> response to its first call
+
+    def submit_batch(self, sender_batch_id, items):
+        time.sleep(self.latency)
+        self.batches.append((sender_batch_id, [item.id for item in items]))
+        response = self._responses.get(sender_batch_id)
+        if response is None:
+            payout_batch_id = f'LOCAL_{sender_batch_id[-12:].upper()}'
+            results = {}
+            for item in items:
+                if item.email in self.fail_emails:
+                    results[item.id] = {'status': FAILED, 'error': 'Receiver rejected'}
+                else:
+                    self.payments.append((item.id, item.email, item.amount))
+                    results[item.id] = {'status': SUCCESS, 'payout_item_id': f'{payout_batch_id}_{item.id[-8:]}'}
+            response = self._responses[sender_batch_id] = {
+                'payout_batch_id': payout_batch_id, 'batch_status': 'SUCCESS', 'items': results
+            }
+        if self.lose_responses > 0:
+            self.lose_responses -= 1
+            raise ConnectionError('Response lost after the batch was processed')
+        return response
+
+def _paypal_error_message(error):
+    if isinstance(error, dict):
+        name, message = error.get('name'), error.get('message')
+        if name or message:
+            return ': '.join(part for part in (name, message) if part)
+    return str(error) or 'Payout rejected'
+
+class PayPalSDKPayoutService:
+    """Batch payouts through paypalrestsdk's Payout resource.
+
+    ``load_sdk()`` returns the configured paypalrestsdk module. It is first
+    called when the first batch is sent, so the SDK is never imported by a
+    process that pays nothing out.
+    """
+
+    def __init__(self, load_sdk, email_subject='Black Sultan OS - Withdrawal Payout'):
+        self.load_sdk = load_sdk
+        self.email_subject = email_subject
+
+    def submit_batch(self, sender_batch_id, items):
+        payout = self.load_sdk().Payout({
+            'sender_batch_header': {
+                'sender_batch_id': sender_batch_id,
+                'email_subject': self.email_subject
+            },
+            'items': [{
+                'recipient_type': 'EMAIL',
+                'amount': {'value': f'{item.amount:.2f}', 'currency': item.currency},
+                'receiver': item.email,
+                'note': item.note,
+                'sender_item_id': item.id
+            } for item in items]
+        })
+        # Sent as PayPal-Request-Id: resending an unanswered batch replays PayPal's first response
+        payout.request_id = sender_batch_id
+        # The SDK raises on transport errors and 5xx; a 400 comes back as payout.error
+        if not payout.create():
+            raise PayoutRejected(_paypal_error_message(payout.error))
+        # PayPal processes the batch asynchronously; items stay 'submitted' until it does
+        return {
+            'payout_batch_id': payout.batch_header.payout_batch_id,
+            'batch_status': payout.batch_header.batch_status,
+            'items': {item.id: {'status': SUBMITTED} for item in items}
+        }
+
+class PayoutQueue:
+    """Coalesces payout requests into batches of up to ``max_batch`` items.
+
+    A batch is sent ``window`` seconds after its first item arrived, or as
+    soon as it is full. ``service.submit_batch(sender_batch_id, items)``
+    returns ``{'payout_batch_id', 'batch_status', 'items': {item.id: {...}}}``
+    and must be idempotent on its IDs. ``PayoutRejected`` fails every item
+    in the batch. Any other exception leaves the batch's outcome unknown:
+    its items stay unsettled (``unknown``) and the same batch is resent
+    after ``resend_delay`` seconds, doubling up to ``resend_max_delay``,
+    until the service answers.
+    """
+
+    def __init__(self, service, window=0.25, max_batch=100, name='payouts', remember=10000,
+                 resend_delay=1.0, resend_max_delay=60.0):
+        self.service = service
+        self.window = window
+        self.max_batch = max_batch
+        self.name = name
+        self.resend_delay = resend_delay
+        self.resend_max_delay = resend_max_delay
+        self._pending = deque()
+        self._resends = []                  # heap of (due, seq, sender_batch_id, items, resends)
+        self._resend_seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._items = OrderedDict()         # item id -> item, most recent `remember`
+        self._by_key = {}                   # idempotency key -> item id
+        self._remember = remember
+        self.batches_sent = 0
+
+    def submit(self, email, amount, currency='USD', note=None, idempotency_key=None, on_complete=None,
+               batch_id=None, on_batched=None):
+        """Queue one payout; a repeated idempotency key returns the original item.
+
+        The key also fixes the item's sender_item_id. ``on_batched(item)``
+        runs on the batcher thread once ``item.batch_id`` is known and before
+        the batch is first sent; if it raises, the batch is held back and
+        retried. A process that has forgotten the item passes that
+        ``batch_id`` back, and the item is resent alone under it, so the
+        provider replays its first answer instead of paying again.
+        ``on_complete(item)`` runs on the batcher thread once the item has
+        its final status. Both are only registered for newly created items,
+        so a retried request cannot settle the same withdrawal twice.
+        """
+        with self._cond:
+            if idempotency_key is not None:
+                existing = self._items.get(self._by_key.get(idempotency_key))
+                if existing is not None:
+                    return existing
+            item = PayoutItem(email, amount, currency, note, idempotency_key, batch_id)
+            if on_complete is not None:
+                item._callbacks.append(on_complete)
+            if on_batched is not None:
+                item._batched_callbacks.append(on_batched)
+            self._remember_item(item)
+            if batch_id is not None:
+                heapq.heappush(self._resends, (time.time(), next(self._resend_seq), batch_id, [item], 0))
+            else:
+                self._pending.append(item)
+            self._cond.notify()
+        self._ensure_worker()
+        return item
+
+    def get(self, item_id):
+        return self._items.get(item_id)
+
+    def abandon(self, item, reason):
+        """Stop sending an unsettled item and fail it; False if it is settled or being sent right now.
+
+        An item whose batch outcome was unknown may still have been paid, so
+        this is for giving up after a long outage, not for routine retries.
+        """
+        with self._cond:
+            if item.done:
+                return False
+            if item in self._pending:
+                self._pending.remove(item)
+            else:
+                entry = next((entry for entry in self._resends if item in entry[3]), None)
+                if entry is None:
+                    return False
+                entry[3].remove(item)
+                if not entry[3]:
+                    self._resends.remove(entry)
+                    heapq.heapify(self._resends)
+        if item.status == UNKNOWN:
+            logger.error("Abandoning payout item %s in batch %s with an unknown outcome; "
+                         "check the provider before paying it again", item.id, item.batch_id)
+        item._complete(FAILED, reason)
+        return True
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'resending': sum(len(entry[3]) for entry in self._resends),
+            'batches_sent': self.batches_sent,
+            'tracked_items': len(self._items)
+        }
+
+    def _remember_item(self, item):
+        self._items[item.id] = item
+        if item.idempotency_key is not None:
+            self._by_key[item.idempotency_key] = item.id
+        while len(self._items) > self._remember:
+            _, old = self._items.popitem(last=False)
+            if old.idempotency_key is not None:
+                self._by_key.pop(old.idempotency_key, None)
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._cond:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name=f'{self.name}-batcher', daemon=True)
+                    self._thread.start()
+
+    def _next_batch(self):
+        """(sender_batch_id, items, resends): a due resend first, else the next window's items"""
+        with self._cond:
+            while True:
+                if self._resends and self._resends[0][0] <= time.time():
+                    _, _, sender_batch_id, items, resends = heapq.heappop(self._resends)
+                    return sender_batch_id, items, resends
+                if self._pending:
+                    break
+                self._cond.wait(self._resends[0][0] - time.time() if self._resends else None)
+            deadline = self._pending[0].created_at + self.window
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._pending), self.max_batch)
+            items = [self._pending.popleft() for _ in range(count)]
+            return batch_id_for(items), items, 0
+
+    def _run(self):
+        while True:
+            sender_batch_id, items, resends = self._next_batch()
+            try:
+                self._send(sender_batch_id, items, resends)
+            except Exception:
+                logger.exception("Error processing payout batch %s", sender_batch_id)
+
+    def _schedule_resend(self, sender_batch_id, items, resends):
+        delay = min(self.resend_max_delay, self.resend_delay * 2 ** resends)
+        with self._cond:
+            heapq.heappush(self._resends, (time.time() + delay, next(self._resend_seq), sender_batch_id, items, resends + 1))
+            self._cond.notify()
+
+    def _send(self, sender_batch_id, items, resends=0):
+        for item in items:
+            item.batch_id = sender_batch_id
+        try:
+            for item in items:
+                item._record_batch()
+        except Exception:
+            # Nothing was sent yet; hold the batch back rather than send an ID nobody recorded
+            logger.exception("Error recording payout batch %s, sending it later", sender_batch_id)
+            self._schedule_resend(sender_batch_id, items, resends)
+            return
+        PAYOUT_BATCH_SIZE.observe(len(items))
+        self.batches_sent += 1
+        if resends:
+            PAYOUT_RESENDS.inc()
+
+        start = time.perf_counter()
+        try:
+            response = self.service.submit_batch(sender_batch_id, items)
+        except PayoutRejected as e:
+            logger.warning("Payout batch %s rejected: %s", sender_batch_id, e)
+            for item in items:
+                item._complete(FAILED, str(e))
+            return
+        except Exception as e:
+            # The provider may have paid before the call failed: never settle these items as failed
+            logger.warning("Payout batch %s outcome unknown, resending with the same IDs: %s", sender_batch_id, e)
+            for item in items:
+                item.status = UNKNOWN
+                item.error = str(e)
+            self._schedule_resend(sender_batch_id, items, resends)
+            return
+        finally:
+            PAYOUT_BATCH_SECONDS.observe(time.perf_counter() - start)
+
+        results = response.get('items', {})
+        for item in items:
+            item.payout_batch_id = response.get('payout_batch_id')
+            result = results.get(item.id, {'status': FAILED, 'error': 'Missing from batch response'})
+            item._complete(result['status'], result.get('error'), result.get('payout_item_id'))
+
+# Batching knobs shared by the entry points
+PAYOUT_BATCH_WINDOW = float(os.environ.get('PAYOUT_BATCH_WINDOW', 0.25))
+PAYOUT_MAX_BATCH = int(os.environ.get('PAYOUT_MAX_BATCH', 100))
+# How long a withdrawal may wait on an unanswered payout before it is failed and refunded
+PAYOUT_MAX_PENDING_SECONDS = float(os.environ.get('PAYOUT_MAX_PENDING_SECONDS', 86400))
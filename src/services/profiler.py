@@ -0,0 +1,134 @@
+"""
+On-demand stack-sampling profiler
+
+While a profile is running, a dedicated thread snapshots every thread's
+stack through sys._current_frames() at a fixed interval and counts the
+collapsed stacks. Nothing is installed while no profile is running, so the
+profiler costs nothing when it is off. Output is the collapsed format that
+flamegraph.pl and speedscope read, plus a per-thread summary.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+MAX_PROFILE_SECONDS = 120
+MIN_INTERVAL = 0.001
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+_profile_lock = threading.Lock()
+
+def _frame_label(code):
+    path = code.co_filename
+    short = os.sep.join(path.split(os.sep)[-2:])
+    return f'{code.co_name} ({short}:{code.co_firstlineno})'
+
+class ProfileResult:
+    def __init__(self, duration, interval, samples, stacks, thread_names):
+        self.duration = duration
+        self.interval = interval
+        self.samples = samples              # number of sampling passes
+        self.stacks = stacks                # (thread_name, frame labels root-first) -> count
+        self.thread_names = thread_names
+
+    def collapsed(self):
+        """Collapsed stacks, one ``thread;frame;frame count`` line each"""
+        lines = [
+            ';'.join((thread,) + frames) + f' {count}'
+            for (thread, frames), count in self.stacks.most_common()
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def by_thread(self, top=15):
+        """Per-thread sample counts with the hottest leaf and inclusive frames"""
+        threads = defaultdict(lambda: {'samples': 0, 'self': Counter(), 'total': Counter()})
+        for (thread, frames), count in self.stacks.items():
+            entry = threads[thread]
+            entry['samples'] += count
+            if frames:
+                entry['self'][frames[-1]] += count
+            for frame in set(frames):
+                entry['total'][frame] += count
+
+        return {
+            thread: {
+                'samples': entry['samples'],
+                'share': round(entry['samples'] / max(self.samples, 1), 4),
+                'top_self': entry['self'].most_common(top),
+                'top_total': entry['total'].most_common(top),
+            }
+            for thread, entry in sorted(threads.items(), key=lambda item: -item[1]['samples'])
+        }
+
+    def to_dict(self, top=15):
+        return {
+            'duration': round(self.duration, 3),
+            'interval': self.interval,
+            'samples': self.samples,
+            'threads': self.by_thread(top),
+        }
+
+class StackSampler:
+    """Samples all thread stacks every ``interval`` seconds for ``seconds`` seconds"""
+
+    def __init__(self, interval=0.005, max_depth=128):
+        self.interval = max(interval, MIN_INTERVAL)
+        self.max_depth = max_depth
+
+    def _sample_once(self, stacks, names, skip):
+        for ident, frame in sys._current_frames().items():
+            if ident in skip:
+                continue
+            frames = []
+            while frame is not None and len(frames) < self.max_depth:
+                frames.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            frames.reverse()
+            stacks[(names.get(ident, f'thread-{ident}'), tuple(frames))] += 1
+
+    def _run(self, seconds, result_holder, skip):
+        stacks = Counter()
+        samples = 0
+        names = {}
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_sample = start
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if samples % 50 == 0:  # threads come and go, refresh names periodically
+                names = {t.ident: t.name for t in threading.enumerate()}
+            self._sample_once(stacks, names, skip | {threading.get_ident()})
+            samples += 1
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.perf_counter()  # fell behind, don't burst
+        result_holder.append(ProfileResult(
+            time.perf_counter() - start, self.interval, samples, stacks,
+            sorted({name for name, _ in stacks})
+        ))
+
+    def profile(self, seconds):
+        """Run a profile and block until it finishes; only one may run at a time"""
+        seconds = min(max(seconds, self.interval), MAX_PROFILE_SECONDS)
+        if not _profile_lock.acquire(blocking=False):
+            raise ProfilerBusy('A profile is already running')
+        try:
+            result = []
+            thread = threading.Thread(
+                target=self._run, args=(seconds, result, {threading.get_ident()}),
+                name='stack-sampler', daemon=True
+            )
+            thread.start()
+            thread.join()
+            return result[0]
+        finally:
+            _profile_lock.release()
@@ -0,0 +1,214 @@
+"""
+Hedged multi-source quote fetching with per-provider circuit breakers
+
+The primary source is asked first. If it has not answered by the time its
+own recent latency percentile (p95 by default) has passed, the same request
+goes to the next healthy source, and whichever valid answer arrives first
+wins. A source that fails outright hands over at once instead of waiting
+for its timeout. Each source has a circuit breaker that opens when its
+recent error rate crosses a threshold. While the breaker is open the
+source is skipped, and after a cooldown one trial call probes whether it
+recovered.
+
+    fetcher = HedgedQuoteFetcher([QuoteSource('coingecko', cg), QuoteSource('binance', bn)])
+    result = fetcher.fetch()     # result.prices, result.source, result.hedged
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+QUOTE_FETCH_SECONDS = REGISTRY.histogram(
+    'quote_fetch_duration_seconds', 'Time until the first valid quote arrived', ['source']
+)
+QUOTE_HEDGES = REGISTRY.counter(
+    'quote_hedged_requests_total', 'Hedge requests sent because the previous source was slow or failed', ['source']
+)
+CIRCUIT_STATE = REGISTRY.gauge(
+    'circuit_breaker_state', 'Circuit breaker state (0 closed, 1 half-open, 2 open)', ['name']
+)
+
+class AllSourcesFailed(Exception):
+    """No source produced a valid quote in time"""
+
+class LatencyTracker:
+    """Recent successful-call latencies and their percentiles"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction, default):
+        samples = sorted(self._samples)
+        if len(samples) < 5:
+            return default
+        return samples[min(int(fraction * len(samples)), len(samples) - 1)]
+
+class CircuitBreaker:
+    """Opens when the error rate over the last ``window`` calls reaches ``error_threshold``"""
+
+    def __init__(self, name, window=20, min_calls=5, error_threshold=0.5, cooldown=30.0):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self._results = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.labels(name).set_function(lambda: STATE_VALUES[self.state])
+
+    @property
+    def state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            return HALF_OPEN
+        return self._state
+
+    def allow(self):
+        """Whether a call may go out now; half-open lets a single trial through"""
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_running:
+                self._state = HALF_OPEN
+                self._trial_running = True
+                return True
+            return False
+
+    def record(self, success):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trial_running = False
+                if success:
+                    self._state = CLOSED
+                    self._results.clear()
+                else:
+                    self._trip()
+                return
+            self._results.append(success)
+            failures = self._results.count(False)
+            if len(self._results) >= self.min_calls and failures / len(self._results) >= self.error_threshold:
+                self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._results.clear()
+        logger.warning("Circuit breaker %s opened", self.name)
+
+class QuoteSource:
+    """A named quote provider: ``fetch()`` returns prices or raises"""
+
+    def __init__(self, name, fetch, breaker=None, latency=None):
+        self.name = name
+        self.fetch = fetch
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = latency or LatencyTracker()
+
+def valid_prices(prices):
+    """A usable answer: at least one coin with a non-zero price"""
+    return bool(prices) and any(p.get('price') for p in prices.values())
+
+class QuoteResult:
+    __slots__ = ('prices', 'source', 'latency', 'hedged', 'errors')
+
+    def __init__(self, prices, source, latency, hedged, errors):
+        self.prices = prices
+        self.source = source
+        self.latency = latency
+        self.hedged = hedged
+        self.errors = errors
+
+class HedgedQuoteFetcher:
+    """Asks sources in order, hedging to the next one when the current one is slow"""
+
+    def __init__(self, sources, hedge_quantile=0.95, default_hedge_delay=1.0, min_hedge_delay=0.05,
+                 timeout=5.0, max_workers=8):
+        self.sources = sources
+        self.hedge_quantile = hedge_quantile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quote-fetch')
+
+    def _call(self, source):
+        """Run one source, feeding its breaker and latency tracker (even if it loses the race)"""
+        start = time.perf_counter()
+        try:
+            prices = source.fetch()
+            if not valid_prices(prices):
+                raise ValueError('empty or zero quote')
+        except Exception:
+            source.breaker.record(False)
+            raise
+        elapsed = time.perf_counter() - start
+        source.breaker.record(True)
+        source.latency.record(elapsed)
+        return prices
+
+    def _hedge_delay(self, source):
+        delay = source.latency.percentile(self.hedge_quantile, self.default_hedge_delay)
+        return max(delay, self.min_hedge_delay)
+
+    def fetch(self):
+        """First valid quote from the healthy sources, within ``timeout`` seconds"""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        queue = list(self.sources)
+        pending = {}
+        errors = {}
+        launched = 0
+        while True:
+            # Every pass after the first means the newest source failed or is slow: hedge.
+            # Breakers are asked only at launch, so a half-open trial is never left dangling.
+            while queue:
+                source = queue.pop(0)
+                if not source.breaker.allow():
+                    errors[source.name] = 'circuit open'
+                    continue
+                if launched:
+                    QUOTE_HEDGES.labels(source.name).inc()
+                pending[self._pool.submit(self._call, source)] = source
+                launched += 1
+                break
+
+            now = time.perf_counter()
+            if now >= deadline or not pending:
+                break
+            # With a source still in reserve, wait only as long as the newest one usually takes
+            newest = list(pending.values())[-1]
+            budget = deadline - now
+            if queue:
+                budget = min(budget, self._hedge_delay(newest))
+            done, _ = wait(pending, timeout=budget, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    prices = future.result()
+                except Exception as e:
+                    errors[source.name] = str(e) or type(e).__name__
+                    continue
+                latency = time.perf_counter() - start
+                QUOTE_FETCH_SECONDS.labels(source.name).observe(latency)
+                return QuoteResult(prices, source.name, latency, launched > 1, errors)
+
+        for source in pending.values():
+            errors.setdefault(source.name, 'timed out')
+        raise AllSourcesFailed('; '.join(f'{name}: {error}' for name, error in errors.items()) or 'no sources')
@@ -0,0 +1,125 @@
+"""
+Process-wide token-bucket rate limiting for upstream APIs
+
+Every upstream host gets one bucket shared by all callers in the process,
+so the price updater, the enhanced provider and the market routes draw on
+the same budget. Callers that find the bucket empty queue up and are served
+by priority (live quotes before history backfill), then arrival order. The
+queue is bounded: when it is full, or a caller would wait longer than its
+timeout, the call fails fast with RateLimited instead of piling up threads.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from src.services.metrics import REGISTRY
+
+# Lower values are served first
+PRIORITY_LIVE = 0
+PRIORITY_DEFAULT = 5
+PRIORITY_BACKFILL = 10
+PRIORITY_NAMES = {PRIORITY_LIVE: 'live', PRIORITY_DEFAULT: 'default', PRIORITY_BACKFILL: 'backfill'}
+
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram(
+    'rate_limit_wait_seconds', 'Time callers spent throttled before an upstream request', ['host', 'priority']
+)
+RATE_LIMIT_REJECTED = REGISTRY.counter(
+    'rate_limit_rejected_total', 'Upstream requests refused by the rate limiter', ['host', 'reason']
+)
+RATE_LIMIT_WAITERS = REGISTRY.gauge(
+    'rate_limit_waiters', 'Callers currently queued for an upstream token', ['host']
+)
+
+class RateLimited(Exception):
+    """The request could not get a token in time (or the wait queue was full)"""
+
+class TokenBucket:
+    """``rate`` tokens per second with room for ``burst``, and a priority wait queue"""
+
+    def __init__(self, name, rate, burst, max_waiters=32):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_waiters = max_waiters
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._waiters = []                  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        RATE_LIMIT_WAITERS.labels(name).set_function(lambda: len(self._waiters))
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=PRIORITY_DEFAULT, timeout=None):
+        """Take one token, waiting behind higher-priority callers; returns seconds waited"""
+        start = time.monotonic()
+        with self._cond:
+            self._refill(start)
+            if not self._waiters and self._tokens >= 1:
+                self._tokens -= 1
+                self._observe(priority, 0.0)
+                return 0.0
+            if len(self._waiters) >= self.max_waiters:
+                RATE_LIMIT_REJECTED.labels(self.name, 'queue_full').inc()
+                raise RateLimited(f'{self.name}: {len(self._waiters)} requests already waiting')
+
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] == entry and self._tokens >= 1:
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1
+                        self._cond.notify_all()  # the next head may be able to go too
+                        waited = now - start
+                        self._observe(priority, waited)
+                        return waited
+
+                    # The head sleeps until its token is due; everyone else until woken
+                    wait = (1 - self._tokens) / self.rate if self._waiters[0] == entry else None
+                    if timeout is not None:
+                        remaining = start + timeout - now
+                        if remaining <= 0 or (wait is not None and wait > remaining):
+                            RATE_LIMIT_REJECTED.labels(self.name, 'timeout').inc()
+                            raise RateLimited(f'{self.name}: no token within {timeout}s')
+                        wait = remaining if wait is None else wait
+                    self._cond.wait(wait)
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    def _observe(self, priority, waited):
+        RATE_LIMIT_WAIT_SECONDS.labels(self.name, PRIORITY_NAMES.get(priority, str(priority))).observe(waited)
+
+# Budgets per upstream host as (requests per second, burst). CoinGecko's free
+# tier allows roughly 30 calls a minute; Binance's weight limit is far higher.
+HOST_LIMITS = {
+    'api.coingecko.com': (float(os.environ.get('COINGECKO_RATE_PER_MIN', 30)) / 60, 5),
+    'api.binance.com': (float(os.environ.get('BINANCE_RATE_PER_SEC', 10)), 20),
+}
+DEFAULT_LIMIT = (10.0, 20)
+MAX_WAITERS = int(os.environ.get('RATE_LIMIT_MAX_WAITERS', 32))
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def limiter_for(host):
+    """The process-wide bucket for an upstream host"""
+    bucket = _buckets.get(host)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(host)
+            if bucket is None:
+                rate, burst = HOST_LIMITS.get(host, DEFAULT_LIMIT)
+                bucket = _buckets[host] = TokenBucket(host, rate, burst, MAX_WAITERS)
+    return bucket
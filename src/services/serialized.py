@@ -0,0 +1,98 @@
+"""
+Pre-serialized payloads shared between REST responses and Socket.IO emits
+
+A producer (the trading engine tick) publishes a payload once; readers get
+the same immutable snapshot, including its JSON text and a version ETag, so
+neither an HTTP poll nor a broadcast has to rebuild or re-encode it.
+"""
+
+import json
+import threading
+import time
+
+from src.services.http_cache import BOOT_ID
+from src.services.metrics import record_cache
+
+class RawJSON:
+    """Already-encoded JSON that packet_json splices into Socket.IO packets verbatim"""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __reduce__(self):  # keep it picklable for message-queue client managers
+        return (RawJSON, (self.text,))
+
+class packet_json:
+    """JSON module for ``SocketIO(json=packet_json)`` that understands RawJSON"""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        if isinstance(obj, RawJSON):
+            return obj.text
+        if isinstance(obj, list) and any(isinstance(item, RawJSON) for item in obj):
+            return '[' + ','.join(
+                item.text if isinstance(item, RawJSON) else json.dumps(item, **kwargs)
+                for item in obj
+            ) + ']'
+        return json.dumps(obj, **kwargs)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return json.loads(s, **kwargs)
+
+class SerializedSnapshot:
+    """One immutable, versioned payload with its JSON encoding"""
+
+    __slots__ = ('version', 'source_version', 'created_at', 'text', 'body', 'etag', 'raw')
+
+    def __init__(self, version, source_version, payload):
+        self.version = version
+        self.source_version = source_version
+        self.created_at = time.time()
+        self.text = json.dumps(payload, separators=(',', ':'))
+        self.body = self.text.encode('utf-8')
+        # Versions restart at 1 in every process: the boot id keeps old ETags from matching
+        self.etag = f'{BOOT_ID}-v{version}'
+        self.raw = RawJSON(self.text)
+
+class SnapshotPublisher:
+    """Holds the latest snapshot and rebuilds it only when its source changed.
+
+    ``build`` returns the payload dict; ``source_version`` returns a counter
+    that moves whenever the state behind the payload changes outside a tick.
+    """
+
+    def __init__(self, build, source_version=lambda: 0, name='snapshot'):
+        self.name = name
+        self._build = build
+        self._source_version = source_version
+        self._lock = threading.Lock()
+        self._version = 0
+        self._snapshot = None
+
+    def publish(self, *args, **kwargs):
+        """Build and publish a new snapshot (called from the engine tick)"""
+        with self._lock:
+            return self._publish_locked(*args, **kwargs)
+
+    def _publish_locked(self, *args, **kwargs):
+        source_version = self._source_version()
+        payload = self._build(*args, **kwargs)
+        self._version += 1
+        self._snapshot = SerializedSnapshot(self._version, source_version, payload)
+        return self._snapshot
+
+    def current(self):
+        """Latest snapshot, republished first if the source state moved on"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.source_version == self._source_version():
+            record_cache(self.name, True)
+            return snapshot
+        record_cache(self.name, False)
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.source_version != self._source_version():
+                snapshot = self._publish_locked()
+            return snapshot
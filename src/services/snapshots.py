@@ -0,0 +1,160 @@
+"""
+Periodic snapshots of in-memory engine state, restored on boot
+
+An entry point describes its state with two callables:
+- ``capture()`` returns plain data: dicts, lists, numbers, strings and datetimes.
+- ``restore(state)`` puts the data back.
+
+A background thread captures every ``interval`` seconds and writes the
+snapshot only when its bytes changed. Each write is a zlib-compressed pickle
+behind a magic header, made atomic by writing a temp file and renaming it.
+
+Capturing is a handful of shallow copies (``capture_fields``). The engine
+threads never wait on the encoding or the disk, and objects they replace
+later do not disturb a snapshot already taken. A restarted process calls
+``restore()`` before its threads start and resumes from the last write, at
+most ``interval`` seconds behind (or exactly, after a clean shutdown).
+
+    snapshots = StateSnapshotter(state_path('main'), capture_state, restore_state)
+    snapshots.restore()
+    snapshots.start()
+"""
+
+import atexit
+import io
+import logging
+import os
+import pickle
+import threading
+import zlib
+from datetime import date, datetime, timedelta
+
+from src.services.jobs import DATABASE_DIR
+from src.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_WRITE_SECONDS = REGISTRY.histogram(
+    'snapshot_write_duration_seconds', 'Time to capture, encode and write a state snapshot', ['name']
+)
+SNAPSHOT_BYTES = REGISTRY.gauge(
+    'snapshot_bytes', 'Size of the last state snapshot written', ['name']
+)
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', DATABASE_DIR)
+SNAPSHOT_INTERVAL = float(os.environ.get('SNAPSHOT_INTERVAL', 1.0))
+
+MAGIC = b'BSS1'
+_PLAIN = (type(None), bool, int, float, str, bytes, datetime, date, timedelta, list, tuple, dict, set)
+_ALLOWED_CLASSES = {('datetime', 'datetime'), ('datetime', 'date'), ('datetime', 'timedelta')}
+
+def state_path(name):
+    return os.path.join(SNAPSHOT_DIR, f'{name}.state')
+
+def capture_fields(obj):
+    """An object's plain-data attributes, containers shallow-copied.
+
+    Random streams, locks, samplers and similar are skipped. They are
+    rebuilt by the constructor.
+    """
+    state = {}
+    for field, value in vars(obj).copy().items():
+        if isinstance(value, _PLAIN):
+            state[field] = value.copy() if isinstance(value, (list, dict, set)) else value
+    return state
+
+def restore_fields(obj, state):
+    """Put captured attributes back, ignoring any the object no longer has"""
+    for field, value in state.items():
+        if hasattr(obj, field):
+            setattr(obj, field, value)
+
+def encode(state):
+    return MAGIC + zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+class _PlainUnpickler(pickle.Unpickler):
+    """Only rebuilds builtins and datetimes, so a snapshot file cannot run code"""
+
+    def find_class(self, module, name):
+        if (module, name) in _ALLOWED_CLASSES:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f'{module}.{name} is not allowed in a state snapshot')
+
+def decode(data):
+    if not data.startswith(MAGIC):
+        raise ValueError('not a state snapshot')
+    return _PlainUnpickler(io.BytesIO(zlib.decompress(data[len(MAGIC):]))).load()
+
+class StateSnapshotter:
+    def __init__(self, path, capture, restore, interval=SNAPSHOT_INTERVAL, name=None):
+        self.path = path
+        self.capture = capture
+        self.restore_state = restore
+        self.interval = interval
+        self.name = name or os.path.splitext(os.path.basename(path))[0]
+        self.restored_at = None
+        self._last_checksum = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def save(self):
+        """Capture and write a snapshot now; False if nothing changed since the last write"""
+        with self._lock, SNAPSHOT_WRITE_SECONDS.labels(self.name).time():
+            data = encode(self.capture())
+            checksum = zlib.crc32(data)
+            if checksum == self._last_checksum:
+                return False
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp = f'{self.path}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._last_checksum = checksum
+            SNAPSHOT_BYTES.labels(self.name).set(len(data))
+            return True
+
+    def restore(self):
+        """Load the last snapshot into the engine; False if there is none or it is unreadable"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        try:
+            self.restore_state(decode(data))
+        except Exception:
+            logger.exception("Error restoring %s state snapshot, starting fresh", self.name)
+            return False
+        self._last_checksum = zlib.crc32(data)
+        self.restored_at = datetime.fromtimestamp(os.path.getmtime(self.path))
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.save()
+            except Exception:
+                logger.exception("Error writing %s state snapshot", self.name)
+
+    def start(self):
+        """Snapshot every ``interval`` seconds (0 disables) and once more at exit"""
+        if not self.interval or self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._run, name=f'snapshot-{self.name}', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+        self._thread = None
+        try:
+            self.save()
+        except Exception:
+            logger.exception("Error writing final %s state snapshot", self.name)
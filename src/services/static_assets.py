@@ -0,0 +1,192 @@
+"""
+Precompressed static asset serving
+
+Loads the static folder once (when attached to an app), keeps gzip and brotli variants of every
+compressible file, negotiates them by Accept-Encoding and answers
+If-None-Match with 304. Content-hashed bundles (index-CxSsinNs.js) are sent
+with a one-year immutable Cache-Control; everything else is revalidated.
+
+Variants can also be built ahead of time so startup only reads them:
+
+    python -m src.services.static_assets src/static
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import sys
+
+from flask import Response, request, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = {'.js', '.mjs', '.css', '.html', '.json', '.svg', '.txt', '.map', '.ico', '.xml', '.wasm'}
+MIN_COMPRESS_SIZE = 1024  # bytes
+IMMUTABLE_MAX_AGE = 31536000  # one year
+HASHED_NAME = re.compile(r'^assets/.+[-.][0-9A-Za-z_-]{8}\.[0-9A-Za-z]+$')  # Vite build output
+SIDECAR_EXTENSIONS = {'gzip': '.gz', 'br': '.br'}
+
+class StaticAsset:
+    """One static file with its precomputed encodings"""
+
+    __slots__ = ('path', 'mimetype', 'digest', 'variants', 'cache_control')
+
+    def __init__(self, path, mimetype, digest, variants, cache_control):
+        self.path = path
+        self.mimetype = mimetype
+        self.digest = digest
+        self.variants = variants  # encoding -> bytes, always includes 'identity'
+        self.cache_control = cache_control
+
+    def etag(self, encoding):
+        return self.digest if encoding == 'identity' else f'{self.digest}-{encoding}'
+
+def _read_sidecar(source_path, encoding):
+    sidecar = source_path + SIDECAR_EXTENSIONS[encoding]
+    try:
+        if os.path.getmtime(sidecar) >= os.path.getmtime(source_path):
+            with open(sidecar, 'rb') as f:
+                return f.read()
+    except OSError:
+        pass
+    return None
+
+def compress(data, encoding, best=False):
+    """Compress bytes; ``best`` trades build time for size (use it for sidecars)"""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11 if best else 6)
+    return None
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+class StaticAssetServer:
+    """Serves a static folder from memory with content negotiation and validators"""
+
+    def __init__(self, static_folder, enabled=None):
+        self.static_folder = os.path.abspath(static_folder)
+        if enabled is None:
+            enabled = os.environ.get('STATIC_PRECOMPRESS', '1').lower() not in ('0', 'false', 'no')
+        self.enabled = enabled
+        self.assets = {}
+
+    def load(self):
+        """Read every file under the static folder and prepare its variants"""
+        assets = {}
+        saved = 0
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                if os.path.splitext(name)[1] in SIDECAR_EXTENSIONS.values():
+                    continue
+                full_path = os.path.join(root, name)
+                rel_path = os.path.relpath(full_path, self.static_folder).replace(os.sep, '/')
+                asset = self._load_asset(full_path, rel_path)
+                assets[rel_path] = asset
+                smallest = min(len(v) for v in asset.variants.values())
+                saved += len(asset.variants['identity']) - smallest
+
+        self.assets = assets
+        logger.info(
+            "Static assets loaded: %d files, %.1f KB saved by precompression",
+            len(assets), saved / 1024
+        )
+
+    def _load_asset(self, full_path, rel_path):
+        with open(full_path, 'rb') as f:
+            data = f.read()
+
+        variants = {'identity': data}
+        if os.path.splitext(rel_path)[1] in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+            for encoding in available_encodings():
+                compressed = _read_sidecar(full_path, encoding) or compress(data, encoding)
+                if compressed is not None and len(compressed) < len(data):
+                    variants[encoding] = compressed
+
+        if HASHED_NAME.search(rel_path):
+            cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            cache_control = 'no-cache'
+
+        mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        digest = hashlib.blake2b(data, digest_size=12).hexdigest()
+        return StaticAsset(rel_path, mimetype, digest, variants, cache_control)
+
+    def _negotiate(self, asset):
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in asset.variants and accepted[encoding] > 0:
+                return encoding
+        return 'identity'
+
+    def send(self, path):
+        """Flask view: send ``path`` from the static folder"""
+        asset = self.assets.get(path) if self.enabled else None
+        if asset is None:
+            # Not preloaded (added after startup, or precompression disabled)
+            if safe_join(self.static_folder, path) is None:
+                raise NotFound()
+            return send_from_directory(self.static_folder, path)
+
+        encoding = self._negotiate(asset)
+        etag = asset.etag(encoding)
+        headers = {
+            'Cache-Control': asset.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304, headers=headers)
+        else:
+            response = Response(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    def init_app(self, app):
+        """Load the folder (once) and route Flask's built-in static endpoint through this server"""
+        if self.enabled and not self.assets:
+            self.load()
+        if 'static' in app.view_functions:
+            app.view_functions['static'] = lambda filename: self.send(filename)
+        return self
+
+def build_sidecars(static_folder):
+    """Write .gz/.br files next to every compressible asset (build step)"""
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            ext = os.path.splitext(name)[1]
+            if ext not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            source_path = os.path.join(root, name)
+            with open(source_path, 'rb') as f:
+                data = f.read()
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            for encoding in available_encodings():
+                compressed = compress(data, encoding, best=True)
+                if compressed is None or len(compressed) >= len(data):
+                    continue
+                with open(source_path + SIDECAR_EXTENSIONS[encoding], 'wb') as f:
+                    f.write(compressed)
+                written += 1
+                print(f"{source_path}{SIDECAR_EXTENSIONS[encoding]}: {len(data)} -> {len(compressed)} bytes")
+    return written
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static')
+    count = build_sidecars(folder)
+    print(f"Wrote {count} precompressed files")
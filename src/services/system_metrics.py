@@ -0,0 +1,179 @@
+"""
+Process and host resource sampler
+
+A daemon thread reads CPU, memory, thread, socket, GC and network counters
+from /proc at a fixed interval and keeps the derived samples in a fixed-size
+ring buffer. Readers only look at the latest sample, so reporting costs
+nothing beyond a dict lookup. On systems without /proc the /proc-derived
+values stay at zero.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+PROC = '/proc'
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read().decode('ascii', 'replace')
+    except OSError:
+        return ''
+
+def read_process_stat(pid='self'):
+    """(cpu_seconds, num_threads, rss_bytes) for a process from /proc/<pid>/stat"""
+    stat = _read(f'{PROC}/{pid}/stat')
+    if not stat:
+        return 0.0, threading.active_count() if pid == 'self' else 0, 0
+    # The command name may contain spaces, so split after the closing parenthesis
+    fields = stat[stat.rfind(')') + 2:].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return cpu_seconds, int(fields[17]), int(fields[21]) * PAGE_SIZE
+
+def read_host_cpu():
+    """(busy_ticks, total_ticks) from the aggregate cpu line of /proc/stat"""
+    for line in _read(f'{PROC}/stat').splitlines():
+        if line.startswith('cpu '):
+            values = [int(v) for v in line.split()[1:]]
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            total = sum(values[:8])
+            return total - idle, total
+    return 0, 0
+
+def read_meminfo():
+    """(total_bytes, available_bytes) from /proc/meminfo"""
+    info = {}
+    for line in _read(f'{PROC}/meminfo').splitlines():
+        key, _, value = line.partition(':')
+        if key in ('MemTotal', 'MemAvailable'):
+            info[key] = int(value.split()[0]) * 1024
+    return info.get('MemTotal', 0), info.get('MemAvailable', 0)
+
+def read_network_bytes():
+    """(rx_bytes, tx_bytes) summed over every interface except loopback"""
+    rx = tx = 0
+    for line in _read(f'{PROC}/net/dev').splitlines()[2:]:
+        name, _, data = line.partition(':')
+        if name.strip() == 'lo':
+            continue
+        fields = data.split()
+        if len(fields) >= 9:
+            rx += int(fields[0])
+            tx += int(fields[8])
+    return rx, tx
+
+def count_open_sockets(pid='self'):
+    fd_dir = f'{PROC}/{pid}/fd'
+    count = 0
+    try:
+        for fd in os.listdir(fd_dir):
+            try:
+                if os.readlink(f'{fd_dir}/{fd}').startswith('socket:'):
+                    count += 1
+            except OSError:
+                continue
+    except OSError:
+        pass
+    return count
+
+class SystemSampler:
+    """Samples real resource usage into a ring buffer from a background thread"""
+
+    def __init__(self, interval=1.0, history_size=3600):
+        self.interval = interval
+        self.samples = deque(maxlen=history_size)
+        self._previous = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _raw(self):
+        cpu_seconds, threads, rss = read_process_stat()
+        return {
+            'time': time.time(),
+            'process_cpu_seconds': cpu_seconds,
+            'threads': threads,
+            'rss': rss,
+            'host_cpu': read_host_cpu(),
+            'memory': read_meminfo(),
+            'network': read_network_bytes(),
+        }
+
+    def sample(self):
+        """Take one sample, derive rates against the previous one and store it"""
+        with self._lock:
+            raw = self._raw()
+            previous = self._previous or raw
+            elapsed = max(raw['time'] - previous['time'], 1e-9)
+
+            busy_delta = raw['host_cpu'][0] - previous['host_cpu'][0]
+            total_delta = raw['host_cpu'][1] - previous['host_cpu'][1]
+            mem_total, mem_available = raw['memory']
+            rx_rate = (raw['network'][0] - previous['network'][0]) / elapsed
+            tx_rate = (raw['network'][1] - previous['network'][1]) / elapsed
+
+            sample = {
+                'timestamp': raw['time'],
+                'process_cpu_percent': round(
+                    (raw['process_cpu_seconds'] - previous['process_cpu_seconds']) / elapsed * 100, 2
+                ) if raw is not previous else 0.0,
+                'host_cpu_percent': round(busy_delta / total_delta * 100, 2) if total_delta > 0 else 0.0,
+                'rss_bytes': raw['rss'],
+                'memory_percent': round((mem_total - mem_available) / mem_total * 100, 2) if mem_total else 0.0,
+                'memory_total_bytes': mem_total,
+                'threads': raw['threads'],
+                'open_sockets': count_open_sockets(),
+                'net_rx_bytes_per_sec': round(rx_rate, 1),
+                'net_tx_bytes_per_sec': round(tx_rate, 1),
+                'gc_counts': list(gc.get_count()),
+                'gc_collections': sum(gen['collections'] for gen in gc.get_stats()),
+            }
+            self._previous = raw
+            self.samples.append(sample)
+            return sample
+
+    def latest(self):
+        """Most recent sample (samples synchronously if the thread is not running)"""
+        if self.samples:
+            return self.samples[-1]
+        return self.sample()
+
+    def history(self, seconds=None):
+        """Samples from the last ``seconds`` seconds, oldest first"""
+        samples = list(self.samples)
+        if seconds is None:
+            return samples
+        cutoff = time.time() - seconds
+        return [s for s in samples if s['timestamp'] >= cutoff]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Error sampling system metrics")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self.sample()
+            self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+# Process-wide sampler shared by every entry point
+system_sampler = SystemSampler(
+    interval=float(os.environ.get('METRICS_SAMPLE_INTERVAL', 1.0)),
+    history_size=int(os.environ.get('METRICS_HISTORY_SIZE', 3600))
+)
@@ -0,0 +1,46 @@
+"""
+Single choke point for upstream HTTP calls to market-data providers
+
+Every request first takes a token from its host's process-wide rate limiter,
+then is timed, and failures are counted per provider and endpoint, so
+provider health and throttling show up on /metrics without touching each
+call site.
+"""
+
+import os
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from src.services.metrics import PROVIDER_FAILURES, PROVIDER_REQUEST_SECONDS
+from src.services.rate_limit import PRIORITY_LIVE, RateLimited, limiter_for
+
+# Longest a caller may queue for a rate-limit token before failing fast
+RATE_LIMIT_MAX_WAIT = float(os.environ.get('RATE_LIMIT_MAX_WAIT', 10))
+
+def fetch(provider, endpoint, url, priority=PRIORITY_LIVE, max_wait=RATE_LIMIT_MAX_WAIT, **kwargs):
+    """requests.get() behind the host's rate limiter, with latency and failure accounting.
+
+    Raises whatever requests raises, or RateLimited when no token was
+    available within ``max_wait``; non-200 responses are returned as-is
+    (callers already branch on status_code) but counted as failures.
+    """
+    try:
+        limiter_for(urlsplit(url).hostname).acquire(priority, timeout=max_wait)
+    except RateLimited:
+        PROVIDER_FAILURES.labels(provider, endpoint, 'RateLimited').inc()
+        raise
+
+    start = time.perf_counter()
+    try:
+        response = requests.get(url, **kwargs)
+    except requests.RequestException as e:
+        PROVIDER_FAILURES.labels(provider, endpoint, type(e).__name__).inc()
+        raise
+    finally:
+        PROVIDER_REQUEST_SECONDS.labels(provider, endpoint).observe(time.perf_counter() - start)
+
+    if response.status_code != 200:
+        PROVIDER_FAILURES.labels(provider, endpoint, f'http_{response.status_code}').inc()
+    return response
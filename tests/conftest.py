@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Tests import services as `src.services.x`, like the entry points do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Entry points keep their jobs and snapshots out of src/database and stay off the network
+_scratch = tempfile.mkdtemp(prefix='black-sultan-tests-')
+for _name, _value in (('JOBS_DIR', _scratch), ('SNAPSHOT_DIR', _scratch),
+                      ('MARKET_STREAM_URL', ''), ('DEPTH_STREAM_URL', '')):
+    os.environ.setdefault(_name, _value)
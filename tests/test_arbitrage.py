@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from src.services.arbitrage import ArbitrageScanner
+
+def scanner(**kwargs):
+    kwargs.setdefault('transfer_fee', 0.0)
+    return ArbitrageScanner(fees={'a': 0.0, 'b': 0.0, 'c': 0.0, 'x': 0.0}, **kwargs)
+
+def route(opportunity):
+    return [f'{asset}@{venue}' for asset, venue in opportunity.route]
+
+def test_cross_venue_spread_is_a_profitable_cycle():
+    arb = scanner()
+    arb.update_quote('a', 'BTC', 'USD', 100.0, 100.0)
+    arb.update_quote('b', 'BTC', 'USD', 101.0, 101.0)
+    best = arb.best()
+    assert best.kind == 'cross_venue'
+    assert best.symbol == 'BTC'
+    assert route(best) == ['USD@b', 'USD@a', 'BTC@a', 'BTC@b']
+    assert best.profit_bps == pytest.approx(100.0)
+    assert arb.best(min_profit_bps=150) is None
+
+def test_break_even_cycles_are_not_reported():
+    arb = scanner()
+    arb.update_quote('a', 'BTC', 'USD', 0.1 + 0.2, 0.1 + 0.2)
+    arb.update_quote('b', 'BTC', 'USD', 0.3, 0.3)
+    assert arb.opportunities(0.0) == []
+    assert arb.scan() == []
+
+def test_quote_update_re_sums_only_the_cycles_through_it():
+    arb = scanner()
+    arb.update_quote('a', 'BTC', 'USD', 100.0, 100.0)
+    arb.update_quote('b', 'BTC', 'USD', 100.0, 100.0)
+    assert arb.opportunities() == []
+    found = arb.update_quote('b', 'BTC', 'USD', 102.0, 102.0)
+    assert [route(o) for o in found] == [['USD@b', 'USD@a', 'BTC@a', 'BTC@b']]
+    assert found[0].profit_bps == pytest.approx(200.0)
+    assert arb.update_quote('b', 'BTC', 'USD', 100.0, 100.0) == []
+    assert arb.opportunities() == []
+
+def test_new_venue_re_indexes_the_cycles():
+    arb = scanner()
+    arb.update_quote('a', 'BTC', 'USD', 100.0, 100.0)
+    arb.update_quote('b', 'BTC', 'USD', 101.0, 101.0)
+    assert len(arb.opportunities()) == 1
+    # A third venue changes the topology: the next query enumerates cycles again
+    arb.update_quote('c', 'BTC', 'USD', 99.0, 99.0)
+    best = arb.best()
+    assert route(best) == ['USD@b', 'USD@c', 'BTC@c', 'BTC@b']
+    assert best.profit_bps == pytest.approx((101 / 99 - 1) * 10000)
+    # Incremental updates use the new edge -> cycle index
+    found = arb.update_quote('a', 'BTC', 'USD', 98.0, 98.0)
+    assert route(found[0]) == ['USD@b', 'USD@a', 'BTC@a', 'BTC@b']
+    assert found[0].profit_bps == pytest.approx((101 / 98 - 1) * 10000)
+
+def test_triangular_cycle_within_one_venue():
+    arb = scanner()
+    arb.update_quote('x', 'BTC', 'USD', 100.0, 100.0)
+    arb.update_quote('x', 'ETH', 'USD', 10.0, 10.0)
+    # 1 ETH buys 0.11 BTC = 11 USD, but costs 10 USD directly
+    arb.update_quote('x', 'ETH', 'BTC', 0.11, 0.11)
+    best = arb.best()
+    assert best.kind == 'triangular'
+    assert route(best) == ['USD@x', 'ETH@x', 'BTC@x']
+    assert best.profit_bps == pytest.approx(1000.0)
+
+def test_bellman_ford_recovers_cycles_longer_than_the_enumerated_ones():
+    arb = scanner(max_cycle_length=3)
+    arb.update_quote('a', 'BTC', 'USD', 100.0, 100.0)
+    arb.update_quote('b', 'BTC', 'USD', 101.0, 101.0)
+    # The cross-venue round trip takes 4 edges, so only the full scan sees it
+    assert arb.opportunities() == []
+    found = arb.scan()
+    assert len(found) == 1
+    assert route(found[0]) == ['USD@b', 'USD@a', 'BTC@a', 'BTC@b']
+    assert found[0].profit_bps == pytest.approx(100.0)
+
+def test_expired_quotes_drop_out_until_quoted_again():
+    arb = scanner()
+    arb.update_quote('a', 'BTC', 'USD', 100.0, 100.0)
+    arb.update_quote('b', 'BTC', 'USD', 101.0, 101.0)
+    assert arb.best() is not None
+    time.sleep(0.02)
+    arb.update_quote('b', 'BTC', 'USD', 101.0, 101.0)
+    assert arb.expire(0.01) == 2          # venue a's buy and sell edges
+    assert arb.venues(0.01) == {'b'}
+    assert arb.opportunities() == []
+    assert arb.scan() == []
+    found = arb.update_quote('a', 'BTC', 'USD', 100.0, 100.0)
+    assert route(found[0]) == ['USD@b', 'USD@a', 'BTC@a', 'BTC@b']
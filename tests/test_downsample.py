@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from src.services.downsample import downsample, lttb, minmax
+
+SIZES = (5, 10, 37, 100, 1001)
+THRESHOLDS = (3, 4, 7, 50, 500)
+
+def series(size, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(size, dtype=float) * 5, np.cumsum(rng.normal(0, 1, size))
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('threshold', THRESHOLDS)
+def test_lttb_keeps_exactly_threshold_sorted_points_with_both_ends(size, threshold):
+    x, y = series(size)
+    keep = lttb(x, y, threshold)
+    if threshold >= size:
+        assert list(keep) == list(range(size))
+        return
+    assert len(keep) == threshold
+    assert keep[0] == 0 and keep[-1] == size - 1
+    assert np.all(np.diff(keep) > 0)
+
+def test_lttb_picks_the_spike_in_its_bucket():
+    x = np.arange(100, dtype=float)
+    y = np.zeros(100)
+    y[42] = 50.0
+    assert 42 in lttb(x, y, 10)
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('threshold', THRESHOLDS)
+def test_minmax_keeps_the_extremes_within_threshold(size, threshold):
+    _, y = series(size, seed=size)
+    keep = minmax(y, threshold)
+    if threshold >= size or threshold < 4:
+        assert list(keep) == list(range(size))
+        return
+    assert len(keep) <= threshold
+    assert keep[0] == 0 and keep[-1] == size - 1
+    assert np.all(np.diff(keep) > 0)
+    assert y.argmin() in keep and y.argmax() in keep
+
+def test_flat_series_keeps_one_point_per_bucket():
+    keep = minmax(np.ones(100), 10)
+    assert len(keep) == 6
+    assert keep[0] == 0 and keep[-1] == 99
+
+def test_unknown_method_is_rejected():
+    x, y = series(10)
+    with pytest.raises(ValueError):
+        downsample(x, y, 5, method='average')
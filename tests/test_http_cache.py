@@ -0,0 +1,96 @@
+import gzip
+
+import pytest
+from flask import Flask, Response, jsonify
+
+from src.services.http_cache import COMPRESS_MIN_SIZE, conditional, install_compression, state_etag
+
+BIG = {'prices': [{'symbol': f'coin{i}', 'price': 100.0 + i} for i in range(200)]}
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.version = 1
+    app.calls = 0
+
+    @app.route('/state')
+    @conditional(lambda: state_etag('state', app.version))
+    def state():
+        app.calls += 1
+        return jsonify(BIG)
+
+    @app.route('/strong')
+    def strong():
+        response = jsonify(BIG)
+        response.set_etag('body-hash')
+        return response
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' * COMPRESS_MIN_SIZE, mimetype='image/png')
+
+    install_compression(app)
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_matching_weak_etag_is_answered_with_304_before_the_view(app, client):
+    first = client.get('/state')
+    etag = first.headers['ETag']
+    assert etag == f'W/"{state_etag("state", 1)}"'
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    again = client.get('/state', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+    assert 'Accept-Encoding' in again.headers['Vary']
+    # A strong copy of the same validator matches too (weak comparison)
+    assert client.get('/state', headers={'If-None-Match': etag[2:]}).status_code == 304
+    assert app.calls == 1
+
+    app.version = 2
+    changed = client.get('/state', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert app.calls == 2
+
+def test_compression_turns_a_strong_etag_weak(client):
+    plain = client.get('/strong', headers={'Accept-Encoding': 'identity'})
+    assert plain.headers['ETag'] == '"body-hash"'
+    assert 'Content-Encoding' not in plain.headers
+
+    compressed = client.get('/strong', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['ETag'] == 'W/"body-hash"'
+    assert gzip.decompress(compressed.data) == plain.data
+
+def test_compressible_responses_vary_on_accept_encoding(client):
+    for path in ('/strong', '/small', '/state'):
+        for accept in ('gzip', 'identity'):
+            response = client.get(path, headers={'Accept-Encoding': accept})
+            assert 'Accept-Encoding' in response.headers['Vary']
+    assert 'Vary' not in client.get('/image', headers={'Accept-Encoding': 'gzip'}).headers
+
+def test_small_bodies_and_binary_types_are_sent_as_they_are(client):
+    small = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert len(small.data) < COMPRESS_MIN_SIZE
+    assert 'Content-Encoding' not in small.headers
+    assert small.get_json() == {'ok': True}
+
+    image = client.get('/image', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in image.headers
+
+@pytest.mark.parametrize('min_size, encoded', [(COMPRESS_MIN_SIZE, False), (100, True)])
+def test_threshold_is_configurable(min_size, encoded):
+    app = Flask(__name__)
+    app.route('/medium')(lambda: jsonify({'note': 'x' * (COMPRESS_MIN_SIZE // 2)}))
+    install_compression(app, min_size=min_size)
+    response = app.test_client().get('/medium', headers={'Accept-Encoding': 'gzip'})
+    assert ('Content-Encoding' in response.headers) is encoded
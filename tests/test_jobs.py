@@ -0,0 +1,159 @@
+import sqlite3
+import time
+
+from src.services.jobs import (
+    FAILED, QUEUED, RUNNING, SCHEMA, SUCCEEDED, JobPending, JobQueue, PermanentJobError
+)
+
+def make_queue(tmp_path, **kwargs):
+    kwargs.setdefault('workers', 2)
+    kwargs.setdefault('backoff_base', 0.01)
+    kwargs.setdefault('backoff_max', 0.05)
+    kwargs.setdefault('poll_interval', 0.02)
+    return JobQueue(str(tmp_path / 'test.jobs.db'), **kwargs)
+
+def wait_for(jobs, job_id, statuses=(SUCCEEDED, FAILED), timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job still {jobs.get(job_id)["status"]}')
+
+def flaky(failures, calls):
+    def handler(payload, job):
+        calls.append(job['attempts'])
+        if len(calls) <= failures:
+            raise ConnectionError('upstream down')
+        return {'echo': payload['value']}
+    return handler
+
+def test_failed_attempts_are_retried_until_one_succeeds(tmp_path):
+    calls = []
+    jobs = make_queue(tmp_path)
+    jobs.register('flaky', flaky(2, calls))
+    job = jobs.enqueue('flaky', {'value': 3})
+    jobs.start()
+    try:
+        job = wait_for(jobs, job['id'])
+    finally:
+        jobs.stop()
+    assert job['status'] == SUCCEEDED
+    assert job['result'] == {'echo': 3}
+    assert calls == [1, 2, 3]
+
+def test_job_fails_after_max_attempts(tmp_path):
+    calls = []
+    jobs = make_queue(tmp_path, max_attempts=3)
+    jobs.register('flaky', flaky(10, calls))
+    job = jobs.enqueue('flaky', {'value': 1})
+    jobs.start()
+    try:
+        job = wait_for(jobs, job['id'])
+    finally:
+        jobs.stop()
+    assert job['status'] == FAILED
+    assert job['error'] == 'upstream down'
+    assert len(calls) == 3
+
+def test_permanent_error_fails_without_retrying(tmp_path):
+    calls = []
+
+    def reject(payload, job):
+        calls.append(job['attempts'])
+        raise PermanentJobError('bad payload')
+
+    jobs = make_queue(tmp_path)
+    jobs.register('reject', reject)
+    job = jobs.enqueue('reject', {})
+    jobs.start()
+    try:
+        job = wait_for(jobs, job['id'])
+    finally:
+        jobs.stop()
+    assert job['status'] == FAILED
+    assert calls == [1]
+
+def test_pending_work_is_checked_again_without_using_attempts(tmp_path):
+    calls = []
+
+    def settle(payload, job):
+        calls.append(job['attempts'])
+        if len(calls) <= 4:
+            raise JobPending('payout outcome unknown')
+        return 'settled'
+
+    jobs = make_queue(tmp_path, max_attempts=2)
+    jobs.register('settle', settle)
+    job = jobs.enqueue('settle', {})
+    jobs.start()
+    try:
+        job = wait_for(jobs, job['id'])
+    finally:
+        jobs.stop()
+    assert job['status'] == SUCCEEDED
+    assert calls == [1] * 5
+
+def test_job_of_a_dead_worker_is_reclaimed_when_its_lease_runs_out(tmp_path):
+    crashed = make_queue(tmp_path, lease_seconds=0.2)
+    crashed.register('flaky', flaky(0, []))
+    job = crashed.enqueue('flaky', {'value': 7})
+    claimed = crashed._claim()   # claimed, then the worker dies before finishing
+    assert claimed['id'] == job['id'] and claimed['status'] == RUNNING
+
+    calls = []
+    restarted = make_queue(tmp_path, lease_seconds=0.2)
+    restarted.register('flaky', flaky(0, calls))
+    started = time.time()
+    restarted.start()
+    try:
+        job = wait_for(restarted, job['id'])
+    finally:
+        restarted.stop()
+    assert job['status'] == SUCCEEDED
+    assert calls == [2]
+    assert time.time() - started >= 0.1
+
+def test_enqueue_is_idempotent_and_does_not_start_workers(tmp_path):
+    jobs = make_queue(tmp_path)
+    jobs.register('flaky', flaky(0, []))
+    first = jobs.enqueue('flaky', {'value': 1}, idempotency_key='withdrawal-1')
+    second = jobs.enqueue('flaky', {'value': 2}, idempotency_key='withdrawal-1')
+    assert second['id'] == first['id']
+    assert second['payload'] == {'value': 1}
+    time.sleep(0.05)
+    assert jobs.get(first['id'])['status'] == QUEUED
+    assert jobs.depth() == 1
+
+def test_checkpoint_is_seen_by_later_attempts(tmp_path):
+    seen = []
+
+    def handler(payload, job):
+        seen.append(dict(job['checkpoint']))
+        if job['attempts'] == 1:
+            jobs.checkpoint(job['id'], batch='b-1')
+            raise ConnectionError('lost')
+        jobs.checkpoint(job['id'], done=True)
+        return 'ok'
+
+    jobs = make_queue(tmp_path)
+    jobs.register('step', handler)
+    job = jobs.enqueue('step', {})
+    jobs.start()
+    try:
+        job = wait_for(jobs, job['id'])
+    finally:
+        jobs.stop()
+    assert seen == [{}, {'batch': 'b-1'}]
+    assert job['checkpoint'] == {'batch': 'b-1', 'done': True}
+
+def test_jobs_file_without_checkpoints_is_migrated(tmp_path):
+    path = tmp_path / 'test.jobs.db'
+    conn = sqlite3.connect(str(path))
+    conn.executescript(SCHEMA.replace('    checkpoint TEXT,\n', ''))
+    conn.close()
+    jobs = make_queue(tmp_path)
+    job = jobs.enqueue('step', {})
+    jobs.checkpoint(job['id'], batch='b-2')
+    assert jobs.get(job['id'])['checkpoint'] == {'batch': 'b-2'}
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from benchmarks.market_stream import StandInStreamServer
+from src.services.market_stream import MarketStream, binance_ticker_parser
+
+def make_stream(**kwargs):
+    stream = MarketStream('', lambda message: [], name='test', **kwargs)
+    gaps = []
+    stream.on_gap(lambda symbols, reason: gaps.append((sorted(symbols), reason)))
+    return stream, gaps
+
+def quote(price):
+    return {'price': price}
+
+def test_sequence_jump_is_a_gap_and_replays_are_dropped():
+    stream, gaps = make_stream()
+    delivered = []
+    stream.add_listener(delivered.append)
+    stream._deliver([('btc', quote(1), 0, 1), ('eth', quote(1), 0, 7)])
+    stream._deliver([('btc', quote(2), 0, 2), ('eth', quote(2), 0, 8)])
+    stream._deliver([('btc', quote(3), 0, 2)])
+    assert gaps == []
+    stream._deliver([('btc', quote(4), 0, 5), ('eth', quote(4), 0, 9)])
+    assert gaps == [(['btc'], 'sequence')]
+    assert stream.quotes['btc'] == quote(4)
+    # The replayed btc event reached no listener
+    assert [sorted(quotes) for quotes in delivered] == [['btc', 'eth'], ['btc', 'eth'], ['btc', 'eth']]
+
+def test_events_too_far_apart_are_a_gap_and_late_events_are_dropped():
+    stream, gaps = make_stream(gap_seconds=5.0)
+    stream._deliver([('btc', quote(1), 1000.0, None)])
+    stream._deliver([('btc', quote(2), 1004.0, None)])
+    stream._deliver([('btc', quote(3), 1003.0, None)])
+    assert gaps == []
+    assert stream.quotes['btc'] == quote(2)
+    stream._deliver([('btc', quote(4), 1010.0, None)])
+    assert gaps == [(['btc'], 'interval')]
+
+def test_dropped_connection_reconnects_and_asks_for_a_resync():
+    server = StandInStreamServer(0, interval=0.05, disconnect_every=0.3)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stream = MarketStream(server.url, binance_ticker_parser(), name='test-reconnect',
+                          backoff_initial=0.05, backoff_max=0.1)
+    resyncs = []
+    stream.on_gap(lambda symbols, reason: resyncs.append((set(symbols), reason)))
+    stream.start()
+    try:
+        deadline = time.time() + 5
+        while not resyncs and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        stream.stop()
+        server.shutdown()
+        server.server_close()
+
+    assert stream.connects >= 2
+    assert server.connections >= 2
+    symbols, reason = resyncs[0]
+    assert reason == 'reconnect'
+    assert symbols == {coin.symbol for coin in server.coins}
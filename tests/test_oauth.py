@@ -0,0 +1,54 @@
+import threading
+import time
+
+from src.services.oauth import TokenManager
+
+def slow_fetcher(delay, calls):
+    def fetch():
+        calls.append(time.time())
+        time.sleep(delay)
+        return f'token-{len(calls)}', 3600
+    return fetch
+
+def test_start_does_not_wait_for_the_token_endpoint(tmp_path):
+    calls = []
+    tokens = TokenManager(slow_fetcher(0.3, calls), name='slow', cache_path=str(tmp_path / 'token.json'))
+    started = time.perf_counter()
+    tokens.start()
+    assert time.perf_counter() - started < 0.1
+    tokens.stop()
+
+def test_get_shares_the_first_background_fetch(tmp_path):
+    calls = []
+    tokens = TokenManager(slow_fetcher(0.2, calls), name='shared', cache_path=str(tmp_path / 'token.json'))
+    tokens.start()
+    results = []
+    readers = [threading.Thread(target=lambda: results.append(tokens.get())) for _ in range(5)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join(2)
+    assert results == ['token-1'] * 5
+    assert len(calls) == 1
+    tokens.stop()
+
+def test_failed_refresh_retries_after_one_backoff(tmp_path):
+    calls = []
+
+    def fetch():
+        calls.append(time.time())
+        if len(calls) < 3:
+            raise ConnectionError('token endpoint down')
+        return 'token', 3600
+
+    tokens = TokenManager(fetch, name='flaky', cache_path=str(tmp_path / 'token.json'), retry_initial=0.1)
+    tokens.start()
+    deadline = time.time() + 2
+    while len(calls) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    tokens.stop()
+    assert len(calls) == 3
+    # Backoff doubles: about 0.1 s then 0.2 s, not twice that
+    gaps = [later - earlier for earlier, later in zip(calls, calls[1:])]
+    assert 0.08 < gaps[0] < 0.18
+    assert 0.18 < gaps[1] < 0.35
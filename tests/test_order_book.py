@@ -0,0 +1,46 @@
+import pytest
+
+from src.services.order_book import BookGap, OrderBook
+
+def test_snapshot_replays_only_the_buffered_deltas_it_does_not_cover():
+    book = OrderBook('btc')
+    assert book.apply_delta([['99', '1']], [], 95, 99) is False      # covered by the snapshot
+    assert book.apply_delta([['100', '2']], [['101', '0']], 100, 102) is False
+    assert book.apply_delta([], [['102', '4']], 103, 105) is False
+    assert not book.synced
+
+    assert book.apply_snapshot([['100', '1'], ['99', '5']], [['101', '3'], ['102', '1']], 100)
+    assert book.synced
+    assert book.last_update_id == 105
+    assert book.depth() == {'bids': [(100.0, 2.0), (99.0, 5.0)], 'asks': [(102.0, 4.0)]}
+    assert book.best_bid() == (100.0, 2.0)
+    assert book.best_ask() == (102.0, 4.0)
+
+def test_delta_continuing_the_sequence_applies_and_stale_ones_are_ignored():
+    book = OrderBook('eth')
+    book.apply_snapshot([['10', '1']], [['11', '1']], 50)
+    assert book.apply_delta([['10', '0'], ['9', '2']], [], 51, 53)
+    assert book.apply_delta([['8', '7']], [], 40, 53) is False
+    assert book.last_update_id == 53
+    assert book.depth()['bids'] == [(9.0, 2.0)]
+
+def test_gap_unsyncs_the_book_until_the_next_snapshot():
+    book = OrderBook('eth')
+    book.apply_snapshot([['10', '1']], [['11', '1']], 50)
+    with pytest.raises(BookGap):
+        book.apply_delta([['10', '3']], [], 55, 56)
+    assert not book.synced
+    assert book.apply_delta([], [['11', '2']], 57, 57) is False
+
+    # A snapshot that reaches past the missed updates replays the buffered deltas
+    assert book.apply_snapshot([['10', '1']], [['11', '1']], 55)
+    assert book.synced
+    assert book.last_update_id == 57
+    assert book.best_bid() == (10.0, 3.0)
+    assert book.best_ask() == (11.0, 2.0)
+
+def test_snapshot_older_than_the_buffered_deltas_reports_it_is_still_behind():
+    book = OrderBook('eth')
+    book.apply_delta([['10', '3']], [], 60, 61)
+    assert book.apply_snapshot([['10', '1']], [['11', '1']], 50) is False
+    assert not book.synced
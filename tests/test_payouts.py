@@ -0,0 +1,155 @@
+import threading
+import time
+import types
+
+from src.services.payouts import (
+    FAILED, SUBMITTED, SUCCESS, UNKNOWN, LocalPayoutService, PayPalSDKPayoutService, PayoutQueue,
+    batch_id_for, item_id_for
+)
+
+def make_queue(service, **kwargs):
+    kwargs.setdefault('window', 0.01)
+    kwargs.setdefault('resend_delay', 0.01)
+    return PayoutQueue(service, **kwargs)
+
+def test_items_arriving_together_share_one_batch():
+    service = LocalPayoutService(latency=0)
+    queue = make_queue(service, window=0.2)
+    items = [queue.submit(f'user{i}@example.com', 10 + i) for i in range(5)]
+    assert all(item.wait(2) for item in items)
+    assert len(service.batches) == 1
+    assert {item.status for item in items} == {SUCCESS}
+    assert items[0].batch_id == batch_id_for(items)
+
+def test_full_batch_is_sent_before_the_window_ends():
+    service = LocalPayoutService(latency=0)
+    queue = make_queue(service, window=60, max_batch=3)
+    items = [queue.submit(f'user{i}@example.com', 5) for i in range(3)]
+    assert all(item.wait(2) for item in items)
+    assert len(service.batches) == 1
+
+def test_partial_failure_settles_each_item_on_its_own():
+    service = LocalPayoutService(latency=0, fail_emails={'bad@example.com'})
+    queue = make_queue(service, window=0.2)
+    good = queue.submit('good@example.com', 20)
+    bad = queue.submit('bad@example.com', 30)
+    assert good.wait(2) and bad.wait(2)
+    assert good.status == SUCCESS
+    assert bad.status == FAILED and bad.error == 'Receiver rejected'
+    assert [email for _, email, _ in service.payments] == ['good@example.com']
+
+def test_repeated_idempotency_key_returns_the_original_item():
+    service = LocalPayoutService(latency=0)
+    queue = make_queue(service)
+    completions = []
+    first = queue.submit('user@example.com', 25, idempotency_key='job-1', on_complete=completions.append)
+    second = queue.submit('user@example.com', 25, idempotency_key='job-1', on_complete=completions.append)
+    assert second is first
+    assert first.wait(2)
+    assert completions == [first]
+    assert len(service.payments) == 1
+
+def test_restarted_item_is_resent_alone_under_its_recorded_batch_id():
+    # The provider deduplicates per batch: the item must not land in a batch with new neighbours
+    service = LocalPayoutService(latency=0)
+    recorded = {}
+    before = make_queue(service, window=0.2)
+    first = before.submit('user@example.com', 25, idempotency_key='job-1',
+                          on_batched=lambda item: recorded.setdefault('job-1', item.batch_id))
+    neighbour = before.submit('other@example.com', 5, idempotency_key='job-2')
+    assert first.wait(2) and neighbour.wait(2)
+    assert recorded['job-1'] == first.batch_id == batch_id_for([first, neighbour])
+
+    # A restarted process has forgotten the item but still has the batch ID
+    after = make_queue(service).submit('user@example.com', 25, idempotency_key='job-1',
+                                       batch_id=recorded['job-1'])
+    assert after.wait(2)
+    assert after.id == first.id == item_id_for('job-1')
+    assert after.status == SUCCESS
+    assert service.batches[-1] == (recorded['job-1'], [after.id])
+    assert len(service.payments) == 2
+
+def test_batch_is_held_back_until_its_id_is_recorded():
+    service = LocalPayoutService(latency=0)
+    attempts = []
+
+    def record(item):
+        attempts.append(item.batch_id)
+        if len(attempts) == 1:
+            raise OSError('disk full')
+
+    item = make_queue(service).submit('user@example.com', 25, idempotency_key='job-5', on_batched=record)
+    assert item.wait(2)
+    assert item.status == SUCCESS
+    assert attempts == [item.batch_id, item.batch_id]
+    assert service.batches == [(item.batch_id, [item.id])]
+
+def test_lost_response_is_resent_with_the_same_ids_and_pays_once():
+    service = LocalPayoutService(latency=0, lose_responses=2)
+    queue = make_queue(service)
+    item = queue.submit('user@example.com', 40, idempotency_key='job-7')
+    assert item.wait(2)
+    assert item.status == SUCCESS
+    assert len(service.batches) == 3
+    assert len({batch_id for batch_id, _ in service.batches}) == 1
+    assert len(service.payments) == 1
+
+def test_unanswered_batch_stays_unknown_until_the_service_answers():
+    answered = threading.Event()
+
+    class FlakyService(LocalPayoutService):
+        def submit_batch(self, sender_batch_id, items):
+            if not answered.is_set():
+                raise TimeoutError('read timed out')
+            return super().submit_batch(sender_batch_id, items)
+
+    service = FlakyService(latency=0)
+    queue = make_queue(service)
+    item = queue.submit('user@example.com', 15, idempotency_key='job-9')
+    assert not item.wait(0.1)
+    assert item.status == UNKNOWN
+    answered.set()
+    assert item.wait(2)
+    assert item.status == SUCCESS
+    assert len(service.payments) == 1
+
+def fake_paypal_sdk(outcomes):
+    """paypalrestsdk stand-in; each create() takes the next outcome: an error dict, an exception or None"""
+    calls = []
+
+    class Payout:
+        def __init__(self, attributes):
+            self.attributes = attributes
+            self.error = None
+
+        def create(self):
+            calls.append(self.request_id)
+            outcome = outcomes.pop(0) if outcomes else None
+            if isinstance(outcome, Exception):
+                raise outcome
+            if outcome is not None:
+                self.error = outcome
+                return False
+            self.batch_header = types.SimpleNamespace(payout_batch_id='PB-1', batch_status='PENDING')
+            return True
+
+    return types.SimpleNamespace(Payout=Payout), calls
+
+def test_batch_paypal_rejects_fails_at_once_instead_of_resending():
+    sdk, calls = fake_paypal_sdk([{'name': 'VALIDATION_ERROR', 'message': 'Invalid request'}])
+    queue = make_queue(PayPalSDKPayoutService(lambda: sdk))
+    item = queue.submit('not-an-email', 10, idempotency_key='job-3')
+    assert item.wait(2)
+    assert item.status == FAILED
+    assert item.error == 'VALIDATION_ERROR: Invalid request'
+    time.sleep(0.05)
+    assert len(calls) == 1
+
+def test_paypal_transport_error_is_resent_with_the_same_request_id():
+    sdk, calls = fake_paypal_sdk([ConnectionError('reset by peer')])
+    queue = make_queue(PayPalSDKPayoutService(lambda: sdk))
+    item = queue.submit('user@example.com', 10, idempotency_key='job-4')
+    assert item.wait(2)
+    assert item.status == SUBMITTED
+    assert item.payout_batch_id == 'PB-1'
+    assert calls == [item.batch_id, item.batch_id]
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from src.services.quotes import (
+    CLOSED, HALF_OPEN, OPEN, AllSourcesFailed, CircuitBreaker, HedgedQuoteFetcher, QuoteSource
+)
+
+PRICES = {'btc': {'price': 100.0}}
+
+def stub(prices=PRICES, delay=0.0, error=None):
+    """A fetcher that counts its calls, waits ``delay`` and then answers or raises"""
+    def fetch():
+        fetch.calls += 1
+        time.sleep(delay)
+        if error:
+            raise error
+        return prices
+    fetch.calls = 0
+    return fetch
+
+def source(name, fetch, **breaker):
+    return QuoteSource(name, fetch, CircuitBreaker(f'test-{name}-{id(fetch)}', **breaker))
+
+def test_fast_primary_answers_without_a_hedge():
+    primary, backup = stub(), stub()
+    fetcher = HedgedQuoteFetcher([source('primary', primary), source('backup', backup)])
+    result = fetcher.fetch()
+    assert (result.source, result.hedged, result.prices) == ('primary', False, PRICES)
+    assert backup.calls == 0
+
+def test_slow_primary_is_hedged_to_the_next_source():
+    release = threading.Event()
+    backup = stub({'btc': {'price': 101.0}})
+    fetcher = HedgedQuoteFetcher([source('primary', lambda: release.wait(2) and PRICES),
+                                  source('backup', backup)], default_hedge_delay=0.05)
+    try:
+        started = time.perf_counter()
+        result = fetcher.fetch()
+    finally:
+        release.set()
+    assert (result.source, result.hedged) == ('backup', True)
+    assert result.prices == {'btc': {'price': 101.0}}
+    assert 0.05 <= time.perf_counter() - started < 1.0
+
+def test_failing_primary_hands_over_at_once():
+    fetcher = HedgedQuoteFetcher([source('primary', stub(error=ConnectionError('refused'))),
+                                  source('backup', stub())], default_hedge_delay=5.0)
+    started = time.perf_counter()
+    result = fetcher.fetch()
+    assert time.perf_counter() - started < 1.0
+    assert (result.source, result.hedged) == ('backup', True)
+    assert result.errors == {'primary': 'refused'}
+
+def test_no_valid_quote_from_any_source_fails():
+    fetcher = HedgedQuoteFetcher([source('primary', stub(error=ConnectionError('refused'))),
+                                  source('backup', stub({'btc': {'price': 0}}))])
+    with pytest.raises(AllSourcesFailed, match='primary: refused; backup: empty or zero quote'):
+        fetcher.fetch()
+
+def test_breaker_opens_then_lets_one_trial_through_after_the_cooldown():
+    breaker = CircuitBreaker('test-breaker-cycle', window=4, min_calls=2, cooldown=0.05)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()          # a single trial at a time
+    breaker.record(False)               # the trial failed: open again
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+def test_open_source_is_skipped():
+    primary = stub(error=ConnectionError('refused'))
+    fetcher = HedgedQuoteFetcher([source('primary', primary, min_calls=1, cooldown=60),
+                                  source('backup', stub())])
+    fetcher.fetch()
+    result = fetcher.fetch()
+    assert primary.calls == 1
+    assert result.source == 'backup'
+    assert result.errors == {'primary': 'circuit open'}
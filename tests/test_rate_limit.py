@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+from src.services.rate_limit import PRIORITY_BACKFILL, PRIORITY_LIVE, RateLimited, TokenBucket
+
+def test_burst_is_served_at_once_then_tokens_arrive_at_the_rate():
+    bucket = TokenBucket('test-burst', rate=20, burst=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    waited = bucket.acquire()
+    assert 0.03 < waited < 0.1
+
+def test_waiter_that_cannot_be_served_in_time_fails_fast():
+    bucket = TokenBucket('test-timeout', rate=1, burst=1)
+    bucket.acquire()
+    started = time.monotonic()
+    with pytest.raises(RateLimited):
+        bucket.acquire(timeout=0.1)
+    # The token is a second away, so there is no point sleeping for the timeout
+    assert time.monotonic() - started < 0.05
+    assert bucket._waiters == []
+
+def test_full_wait_queue_rejects_new_callers():
+    bucket = TokenBucket('test-queue', rate=5, burst=1, max_waiters=1)
+    bucket.acquire()
+    waiter = threading.Thread(target=bucket.acquire)
+    waiter.start()
+    while not bucket._waiters:
+        time.sleep(0.001)
+    with pytest.raises(RateLimited):
+        bucket.acquire()
+    waiter.join(2)
+
+def test_higher_priority_waiters_are_served_first():
+    bucket = TokenBucket('test-priority', rate=5, burst=1)
+    bucket.acquire()
+    served = []
+
+    def take(name, priority):
+        bucket.acquire(priority=priority)
+        served.append(name)
+
+    # Both queue behind the empty bucket; the backfill caller queues first
+    backfill = threading.Thread(target=take, args=('backfill', PRIORITY_BACKFILL))
+    backfill.start()
+    while len(bucket._waiters) < 1:
+        time.sleep(0.001)
+    live = threading.Thread(target=take, args=('live', PRIORITY_LIVE))
+    live.start()
+    while len(bucket._waiters) < 2:
+        time.sleep(0.001)
+    backfill.join(2)
+    live.join(2)
+    assert served == ['live', 'backfill']
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from src.services.risk import RiskEngine
+
+STEP = timedelta(seconds=5)
+
+def history_from(returns, start_prices):
+    """History entries 5 seconds apart whose log returns are ``returns`` ({symbol: array})"""
+    started = datetime(2026, 1, 1)
+    paths = {s: start_prices[s] * np.exp(np.concatenate([[0.0], np.cumsum(r)])) for s, r in returns.items()}
+    length = len(next(iter(paths.values())))
+    return [{'timestamp': (started + i * STEP).isoformat(),
+             'prices': {s: {'price': float(p[i])} for s, p in paths.items()}}
+            for i in range(length)]
+
+def engine(**kwargs):
+    kwargs.setdefault('horizon_seconds', STEP.total_seconds())   # no horizon scaling
+    kwargs.setdefault('scenarios', {})
+    kwargs.setdefault('generator', np.random.default_rng(7))
+    return RiskEngine(**kwargs)
+
+def test_historical_var_is_the_observed_loss_quantile():
+    # 100 returns from -5% to +4.9%: the 5 worst are -5%..-4.6%
+    moves = np.random.default_rng(1).permutation(np.arange(-50, 50) / 1000)
+    history = history_from({'btc': np.log1p(moves)}, {'btc': 100.0})
+    report = engine(paths=1000).report(history, {'btc': 2.0})
+    value = report['portfolio_value']
+    assert report['observations'] == 100
+    assert report['horizon_scaling']['factor'] == 1.0
+    assert report['historical']['var'][0.95] == pytest.approx(0.046 * value)
+    assert report['historical']['cvar'][0.95] == pytest.approx(0.048 * value)
+    assert report['historical']['var'][0.99] == pytest.approx(0.050 * value)
+    assert report['stress']['worst_observed_move'] == pytest.approx(-0.050 * value)
+
+def test_monte_carlo_var_matches_the_normal_quantiles():
+    returns = np.random.default_rng(2).normal(0, 0.01, 500)
+    history = history_from({'btc': returns}, {'btc': 100.0})
+    report = engine(paths=200000).report(history, {'btc': 1.0})
+    value = report['portfolio_value']
+    sigma = returns.std(ddof=1)
+    for confidence in (0.95, 0.99):
+        z = NormalDist().inv_cdf(1 - confidence)
+        var = -np.expm1(sigma * z) * value
+        # Lognormal tail mean: E[exp(sigma Z) | Z <= z]
+        tail_mean = np.exp(sigma ** 2 / 2) * NormalDist().cdf(z - sigma) / (1 - confidence)
+        cvar = (1 - tail_mean) * value
+        assert report['monte_carlo']['var'][confidence] == pytest.approx(var, rel=0.02)
+        assert report['monte_carlo']['cvar'][confidence] == pytest.approx(cvar, rel=0.02)
+    assert report['contributions']['btc']['share'] == pytest.approx(1.0)
+
+def test_same_seed_gives_the_same_report():
+    returns = np.random.default_rng(3).normal(0, 0.01, (100, 2))
+    history = history_from({'btc': returns[:, 0], 'eth': returns[:, 1]}, {'btc': 100.0, 'eth': 10.0})
+    first = engine(paths=5000, generator=np.random.default_rng(11)).report(history, {'btc': 1, 'eth': 3})
+    second = engine(paths=5000, generator=np.random.default_rng(11)).report(history, {'btc': 1, 'eth': 3})
+    assert first['monte_carlo'] == second['monte_carlo']
+
+def test_report_is_cached_until_the_history_or_holdings_change():
+    returns = np.random.default_rng(4).normal(0, 0.01, 60)
+    history = history_from({'btc': returns}, {'btc': 100.0})
+    risk = engine(paths=1000)
+    computed = []
+    compute = risk._compute
+    risk._compute = lambda *args: computed.append(1) or compute(*args)
+
+    report = risk.report(history, {'btc': 1.0})
+    assert risk.report(list(history), {'btc': 1.0}) is report
+    assert len(computed) == 1
+
+    # A new price tick
+    longer = history + history_from({'btc': [0.01]}, {'btc': 100.0})[1:]
+    longer[-1]['timestamp'] = (datetime.fromisoformat(history[-1]['timestamp']) + STEP).isoformat()
+    assert risk.report(longer, {'btc': 1.0}) is not report
+    assert len(computed) == 2
+
+    # The same length but the last tick replaced (the history is a rolling window)
+    shifted = history[1:] + longer[-1:]
+    risk.report(shifted, {'btc': 1.0})
+    assert len(computed) == 3
+
+    risk.report(shifted, {'btc': 2.0})
+    assert len(computed) == 4
+    risk.report(shifted, {'btc': 2.0})
+    assert len(computed) == 4
+
+def test_short_history_has_no_report():
+    history = history_from({'btc': np.zeros(10)}, {'btc': 100.0})
+    assert engine().report(history, {'btc': 1.0}) is None
+
+def test_flat_price_correlates_zero_and_carries_no_risk():
+    returns = np.random.default_rng(5).normal(0, 0.01, 100)
+    history = history_from({'btc': returns, 'usdt': np.zeros(100)}, {'btc': 100.0, 'usdt': 1.0})
+    report = engine(paths=5000).report(history, {'btc': 1.0, 'usdt': 50.0})
+    assert report['correlation'] == [[1.0, 0.0], [0.0, 1.0]]
+    assert report['volatility']['usdt'] == 0.0
+    # Only the Cholesky ridge moves it
+    assert report['contributions']['usdt']['share'] == pytest.approx(0.0, abs=1e-4)
+    assert np.isfinite(report['monte_carlo']['var'][0.99])
@@ -0,0 +1,64 @@
+import json
+
+from src import main
+from src.services.serialized import RawJSON, SnapshotPublisher, packet_json
+
+def counting_build(calls):
+    def build(value=None):
+        calls.append(value)
+        return {'value': value, 'builds': len(calls)}
+    return build
+
+def test_snapshot_is_reused_until_the_source_version_moves():
+    calls = []
+    source = {'version': 0}
+    publisher = SnapshotPublisher(counting_build(calls), lambda: source['version'], name='test')
+    published = publisher.publish(42)
+    assert (published.version, published.source_version) == (1, 0)
+    assert json.loads(published.text) == {'value': 42, 'builds': 1}
+    assert publisher.current() is published
+    assert len(calls) == 1
+
+    # A change outside the tick republishes on the next read, once
+    source['version'] = 1
+    republished = publisher.current()
+    assert (republished.version, republished.source_version) == (2, 1)
+    assert republished.etag != published.etag
+    assert publisher.current() is republished
+    assert calls == [42, None]
+
+def test_first_read_publishes():
+    publisher = SnapshotPublisher(lambda: {'ok': True}, name='test')
+    assert publisher.current().body == b'{"ok":true}'
+
+def test_raw_json_is_spliced_into_packets_verbatim():
+    raw = RawJSON('{"a":1}')
+    assert packet_json.dumps(raw) == '{"a":1}'
+    assert json.loads(packet_json.dumps(['dashboard_update', raw])) == ['dashboard_update', {'a': 1}]
+
+def test_dashboard_answers_304_until_the_game_state_changes():
+    client = main.create_app().test_client()
+    first = client.get('/api/dashboard')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert json.loads(first.data) == json.loads(main.dashboard.current().text)
+
+    again = client.get('/api/dashboard', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+
+    main.game_state.touch()
+    changed = client.get('/api/dashboard', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+def test_weak_etag_of_the_compressed_dashboard_still_matches(monkeypatch):
+    payload = {'history': [{'tick': i, 'value': 100.0 + i} for i in range(200)]}
+    monkeypatch.setattr(main, 'dashboard', SnapshotPublisher(lambda: payload, lambda: main.game_state.version))
+    client = main.create_app().test_client()
+    first = client.get('/api/dashboard', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert first.headers['ETag'] == f'W/"{main.dashboard.current().etag}"'
+    again = client.get('/api/dashboard', headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
@@ -0,0 +1,85 @@
+import os
+import pickle
+import threading
+import zlib
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from src.services.snapshots import MAGIC, StateSnapshotter, capture_fields, decode, encode, restore_fields
+
+STATE = {
+    'balance': 1234.5,
+    'trades': [{'id': 1, 'at': datetime(2026, 5, 1, 12, 30), 'day': date(2026, 5, 1)}],
+    'cooldown': timedelta(seconds=90),
+    'symbols': {'btc', 'eth'},
+    'pair': ('btc', 'usd'),
+    'raw': b'\x00\x01',
+    'paused': None,
+}
+
+class Engine:
+    def __init__(self):
+        self.balance = 0.0
+        self.trades = []
+        self.lock = threading.Lock()
+
+def test_state_survives_an_encode_decode_round_trip():
+    data = encode(STATE)
+    assert data.startswith(MAGIC)
+    assert decode(data) == STATE
+
+def test_data_without_the_header_is_not_a_snapshot():
+    with pytest.raises(ValueError):
+        decode(zlib.compress(pickle.dumps(STATE)))
+
+class RunsCode:
+    def __reduce__(self):
+        return os.getpid, ()
+
+@pytest.mark.parametrize('value', [RunsCode(), threading.Event, Engine])
+def test_globals_outside_the_allowlist_are_rejected(value):
+    data = MAGIC + zlib.compress(pickle.dumps({'value': value}))
+    with pytest.raises(pickle.UnpicklingError, match='is not allowed in a state snapshot'):
+        decode(data)
+
+def test_capture_copies_containers_and_skips_runtime_objects():
+    engine = Engine()
+    engine.trades.append({'id': 1})
+    state = capture_fields(engine)
+    assert state == {'balance': 0.0, 'trades': [{'id': 1}]}
+    engine.trades.append({'id': 2})
+    assert state['trades'] == [{'id': 1}]
+
+    restored = Engine()
+    restore_fields(restored, {**state, 'removed_field': 1})
+    assert restored.trades == [{'id': 1}]
+    assert not hasattr(restored, 'removed_field')
+
+def test_snapshot_is_written_only_when_it_changed_and_restored_later(tmp_path):
+    path = str(tmp_path / 'engine.state')
+    engine = Engine()
+    engine.balance = 10.0
+    snapshots = StateSnapshotter(path, lambda: capture_fields(engine), None, interval=0)
+    assert snapshots.save()
+    assert not snapshots.save()
+    engine.trades.append({'id': 1, 'at': datetime(2026, 5, 1)})
+    assert snapshots.save()
+    assert os.listdir(tmp_path) == ['engine.state']
+
+    restarted = Engine()
+    restored = StateSnapshotter(path, None, lambda state: restore_fields(restarted, state), interval=0)
+    assert restored.restore()
+    assert (restarted.balance, restarted.trades) == (10.0, [{'id': 1, 'at': datetime(2026, 5, 1)}])
+    assert restored.restored_at is not None
+
+def test_missing_or_unreadable_snapshot_starts_fresh(tmp_path):
+    path = tmp_path / 'engine.state'
+    restored = []
+    snapshots = StateSnapshotter(str(path), None, restored.append, interval=0)
+    assert not snapshots.restore()
+    path.write_bytes(MAGIC + b'not zlib')
+    assert not snapshots.restore()
+    path.write_bytes(MAGIC + zlib.compress(pickle.dumps(RunsCode())))
+    assert not snapshots.restore()
+    assert restored == [] and snapshots.restored_at is None
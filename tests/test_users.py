@@ -0,0 +1,160 @@
+import json
+
+import pytest
+from flask import Flask
+from sqlalchemy import event, false
+
+from src.models.engine import configure_database
+from src.models.user import User, db
+from src.routes import user as user_routes
+from src.routes.user import _prefix_bounds, user_bp
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    configure_database(app)
+    app.register_blueprint(user_bp, url_prefix='/api')
+    user_routes._invalidate_counts()
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def add_users(*usernames):
+    db.session.add_all(User(username=name, email=f'{name}@example.com') for name in usernames)
+    db.session.commit()
+
+def usernames(response):
+    return [user['username'] for user in response.get_json()]
+
+def test_pages_follow_the_cursor_past_concurrent_changes(client):
+    add_users('ann', 'ben', 'cat', 'dan', 'eve')
+    first = client.get('/api/users?limit=2')
+    assert usernames(first) == ['ann', 'ben']
+    cursor = first.headers['X-Next-Cursor']
+    assert first.headers['Link'] == f'</api/users?after={cursor}&limit=2>; rel="next"'
+
+    # Rows removed before the cursor or added after it neither repeat nor skip a row
+    client.delete('/api/users/1')
+    client.post('/api/users', json={'username': 'fay', 'email': 'fay@example.com'})
+    second = client.get(f'/api/users?limit=2&after={cursor}')
+    assert usernames(second) == ['cat', 'dan']
+    third = client.get(f'/api/users?limit=2&after={second.headers["X-Next-Cursor"]}')
+    assert usernames(third) == ['eve', 'fay']
+    assert 'X-Next-Cursor' not in third.headers and 'Link' not in third.headers
+
+def test_prefix_filters_are_case_sensitive_ranges(client):
+    add_users('al', 'alice', 'alina', 'Alan', 'bob', 'am')
+    response = client.get('/api/users?username_prefix=al&limit=2')
+    assert usernames(response) == ['al', 'alice']
+    assert 'username_prefix=al' in response.headers['Link']
+    response = client.get(f'/api/users?username_prefix=al&after={response.headers["X-Next-Cursor"]}')
+    assert usernames(response) == ['alina']
+    assert usernames(client.get('/api/users?email_prefix=bob@')) == ['bob']
+
+def test_prefix_bounds_carry_past_the_last_code_point():
+    assert _prefix_bounds('al') == ('al', 'am')
+    assert _prefix_bounds('a\U0010ffff') == ('a\U0010ffff', 'b')
+    assert _prefix_bounds('\U0010ffff') == ('\U0010ffff', None)
+
+def test_total_count_is_cached_until_a_write_through_the_api(client):
+    add_users('ann', 'ben', 'amy')
+    assert client.get('/api/users?count=1').headers['X-Total-Count'] == '3'
+    assert client.get('/api/users?count=1&username_prefix=a').headers['X-Total-Count'] == '2'
+
+    # Written behind the API's back: the cached totals stand
+    add_users('abe')
+    assert client.get('/api/users?count=1').headers['X-Total-Count'] == '3'
+    assert 'X-Total-Count' not in client.get('/api/users').headers
+
+    client.post('/api/users', json={'username': 'al', 'email': 'al@example.com'})
+    assert client.get('/api/users?count=1').headers['X-Total-Count'] == '5'
+    assert client.get('/api/users?count=1&username_prefix=a').headers['X-Total-Count'] == '4'
+
+def ndjson(*rows):
+    return ''.join(json.dumps(row) + '\n' for row in rows)
+
+def user_row(name):
+    return {'username': name, 'email': f'{name}@example.com'}
+
+def test_import_inserts_in_chunks_with_one_executemany_each(client, monkeypatch):
+    monkeypatch.setattr(user_routes, 'IMPORT_CHUNK_SIZE', 2)
+    inserts = []
+
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT'):
+            inserts.append(len(parameters) if executemany else 1)
+    event.listen(db.engine, 'before_cursor_execute', count_inserts)
+    try:
+        response = client.post('/api/users/import', data=ndjson(*map(user_row, 'abcde')))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_inserts)
+    assert response.get_json()['inserted'] == 5
+    assert inserts == [2, 2, 1]
+
+def test_import_reports_bad_rows_by_line_and_keeps_the_rest(client):
+    add_users('taken')
+    body = ndjson(user_row('ann'), {'username': 'ben'}, user_row('taken'), user_row('ann')) + '{oops\n'
+    result = client.post('/api/users/import', data=body).get_json()
+    assert (result['total_rows'], result['inserted'], result['failed']) == (5, 1, 4)
+    assert [(e['line'], e['error']) for e in result['errors']] == [
+        (2, 'email is required'),
+        (3, 'username already exists'),
+        (4, 'duplicate username in import'),
+        (5, result['errors'][3]['error']),
+    ]
+    assert result['errors'][3]['error'].startswith('invalid JSON')
+
+def test_import_reads_csv(client):
+    body = 'username,email\nann,ann@example.com\nben,not-an-address\n'
+    result = client.post('/api/users/import', data=body, content_type='text/csv').get_json()
+    assert result['inserted'] == 1
+    assert result['errors'] == [{'line': 3, 'error': 'email is not a valid address'}]
+
+def test_conflict_missed_by_the_precheck_falls_back_to_savepoints(client, monkeypatch):
+    add_users('taken')
+    # As if another writer added the user between the check and the insert
+    monkeypatch.setattr(user_routes, 'or_', lambda *clauses: false())
+    body = ndjson(user_row('ann'), user_row('taken'), user_row('ben'))
+    result = client.post('/api/users/import', data=body).get_json()
+    assert result['inserted'] == 2
+    assert result['errors'] == [{'line': 2, 'error': 'username or email already exists'}]
+    assert sorted(u.username for u in User.query) == ['ann', 'ben', 'taken']
+
+def test_error_report_keeps_the_first_errors_and_counts_all(client):
+    body = '{"username": "x"}\n' * (user_routes.IMPORT_MAX_REPORTED_ERRORS + 5)
+    result = client.post('/api/users/import', data=body).get_json()
+    assert result['failed'] == user_routes.IMPORT_MAX_REPORTED_ERRORS + 5
+    assert result['errors_truncated'] is True
+    assert [e['line'] for e in result['errors']] == list(range(1, user_routes.IMPORT_MAX_REPORTED_ERRORS + 1))
+
+def test_non_utf8_body_stops_the_import(client):
+    response = client.post('/api/users/import', data=b'{"username": "\xff"}\n')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'request body must be UTF-8 text'
+
+def test_export_streams_one_chunk_per_page(client):
+    db.session.execute(db.insert(User), [user_row(f'user{i:04}') for i in range(user_routes.EXPORT_PAGE_SIZE + 1)])
+    db.session.commit()
+    response = client.get('/api/users/export')
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    chunks = list(response.iter_encoded())
+    assert len(chunks) == 2
+    rows = [json.loads(line) for line in b''.join(chunks).splitlines()]
+    assert len(rows) == user_routes.EXPORT_PAGE_SIZE + 1
+    assert rows[0] == {'id': 1, 'username': 'user0000', 'email': 'user0000@example.com'}
+
+def test_export_as_csv(client):
+    add_users('ann', 'ben')
+    response = client.get('/api/users/export?format=csv')
+    assert response.headers['Content-Disposition'] == 'attachment; filename=users.csv'
+    assert response.get_data(as_text=True).splitlines() == [
+        'id,username,email', '1,ann,ann@example.com', '2,ben,ben@example.com'
+    ]
+    assert client.get('/api/users/export?format=xml').status_code == 400
@@ -0,0 +1,67 @@
+import time
+import types
+
+import pytest
+
+from src import main
+from src.services.jobs import FAILED, SUCCEEDED
+from src.services.payouts import PayPalSDKPayoutService, PayoutQueue
+
+class RejectingPayout:
+    """paypalrestsdk Payout whose create() gets a 400 back"""
+
+    def __init__(self, attributes):
+        self.error = None
+
+    def create(self):
+        self.error = {'name': 'VALIDATION_ERROR', 'message': 'Receiver is invalid'}
+        return False
+
+class UnreachablePayouts:
+    def submit_batch(self, sender_batch_id, items):
+        raise ConnectionError('connection reset')
+
+@pytest.fixture
+def client():
+    main.jobs.start()
+    yield main.create_app().test_client()
+    main.jobs.stop()
+
+def withdraw(client, amount):
+    response = client.post('/api/paypal/withdraw', json={'email': 'user@example.com', 'amount': amount})
+    assert response.status_code == 202
+    return response.get_json()['job']['id']
+
+def wait_for(job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = main.jobs.get(job_id)
+        if job['status'] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"withdrawal still {main.jobs.get(job_id)['status']}")
+
+def test_rejected_payout_fails_the_withdrawal_and_refunds_it(client, monkeypatch):
+    sdk = types.SimpleNamespace(Payout=RejectingPayout)
+    monkeypatch.setattr(main, 'payout_queue', PayoutQueue(PayPalSDKPayoutService(lambda: sdk), window=0.01))
+    before = main.game_state.portfolio_value
+    job = wait_for(withdraw(client, 40))
+    assert job['status'] == FAILED
+    assert job['error'] == 'VALIDATION_ERROR: Receiver is invalid'
+    assert job['attempts'] == 1
+    assert main.game_state.portfolio_value == pytest.approx(before)
+
+def test_payout_left_unanswered_too_long_is_failed_and_refunded(client, monkeypatch):
+    queue = PayoutQueue(UnreachablePayouts(), window=0.01, resend_delay=0.01, resend_max_delay=0.02)
+    monkeypatch.setattr(main, 'payout_queue', queue)
+    monkeypatch.setattr(main, 'PAYOUT_WAIT_SECONDS', 0.05)
+    monkeypatch.setattr(main, 'PAYOUT_MAX_PENDING_SECONDS', 0.3)
+    monkeypatch.setattr(main.jobs, 'backoff_base', 0.05)
+    before = main.game_state.portfolio_value
+    job_id = withdraw(client, 25)
+    assert main.game_state.portfolio_value == pytest.approx(before - 25)
+    job = wait_for(job_id)
+    assert job['status'] == FAILED
+    assert job['error'].startswith('Payout still unknown after')
+    assert main.game_state.portfolio_value == pytest.approx(before)
+    assert queue.stats()['resending'] == 0